@@ -0,0 +1,61 @@
+"""Add folder-level ingest checkpoints and sharded ingest work units
+
+Revision ID: 20261017_0006
+Revises: 20260224_0005
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0006"
+down_revision: Union[str, None] = "20260224_0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("folders", sa.Column("last_max_received_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("folders", sa.Column("last_delta_link", sa.Text(), nullable=True))
+    op.add_column("folders", sa.Column("last_synced_at", sa.DateTime(timezone=True), nullable=True))
+
+    op.create_table(
+        "ingest_work_units",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("mailbox_id", sa.Integer(), nullable=False),
+        sa.Column("graph_folder_id", sa.String(length=256), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("lease_owner", sa.String(length=200), nullable=True),
+        sa.Column("leased_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("processed_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(["mailbox_id"], ["mailboxes.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("mailbox_id", "graph_folder_id", name="uq_ingest_work_mailbox_folder"),
+    )
+    op.create_index(op.f("ix_ingest_work_units_mailbox_id"), "ingest_work_units", ["mailbox_id"], unique=False)
+    op.create_index(op.f("ix_ingest_work_units_graph_folder_id"), "ingest_work_units", ["graph_folder_id"], unique=False)
+    op.create_index(op.f("ix_ingest_work_units_status"), "ingest_work_units", ["status"], unique=False)
+    op.create_index(op.f("ix_ingest_work_units_lease_owner"), "ingest_work_units", ["lease_owner"], unique=False)
+    op.create_index(op.f("ix_ingest_work_units_heartbeat_at"), "ingest_work_units", ["heartbeat_at"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_ingest_work_units_heartbeat_at"), table_name="ingest_work_units")
+    op.drop_index(op.f("ix_ingest_work_units_lease_owner"), table_name="ingest_work_units")
+    op.drop_index(op.f("ix_ingest_work_units_status"), table_name="ingest_work_units")
+    op.drop_index(op.f("ix_ingest_work_units_graph_folder_id"), table_name="ingest_work_units")
+    op.drop_index(op.f("ix_ingest_work_units_mailbox_id"), table_name="ingest_work_units")
+    op.drop_table("ingest_work_units")
+
+    op.drop_column("folders", "last_synced_at")
+    op.drop_column("folders", "last_delta_link")
+    op.drop_column("folders", "last_max_received_at")
@@ -0,0 +1,30 @@
+"""Add folder item counts recorded at last sync
+
+Revision ID: 20261017_0007
+Revises: 20261017_0006
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0007"
+down_revision: Union[str, None] = "20261017_0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("folders", sa.Column("unread_item_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("folders", sa.Column("last_synced_item_count", sa.Integer(), nullable=True))
+    op.add_column("folders", sa.Column("last_synced_unread_count", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("folders", "last_synced_unread_count")
+    op.drop_column("folders", "last_synced_item_count")
+    op.drop_column("folders", "unread_item_count")
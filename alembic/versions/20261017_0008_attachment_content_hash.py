@@ -0,0 +1,28 @@
+"""Add content hash to attachments
+
+Revision ID: 20261017_0008
+Revises: 20261017_0007
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0008"
+down_revision: Union[str, None] = "20261017_0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("attachments", sa.Column("content_sha256", sa.String(length=64), nullable=True))
+    op.create_index(op.f("ix_attachments_content_sha256"), "attachments", ["content_sha256"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_attachments_content_sha256"), table_name="attachments")
+    op.drop_column("attachments", "content_sha256")
@@ -0,0 +1,58 @@
+"""Add attachment download work items
+
+Revision ID: 20261017_0009
+Revises: 20261017_0008
+Create Date: 2026-10-17
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "20261017_0009"
+down_revision: Union[str, None] = "20261017_0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "attachment_work_items",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("mailbox_id", sa.Integer(), nullable=False),
+        sa.Column("message_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("lease_owner", sa.String(length=200), nullable=True),
+        sa.Column("leased_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("processed_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("error_message", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(["mailbox_id"], ["mailboxes.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["message_id"], ["messages.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("mailbox_id", "message_id", name="uq_attachment_work_mailbox_message"),
+    )
+    op.create_index(op.f("ix_attachment_work_items_mailbox_id"), "attachment_work_items", ["mailbox_id"], unique=False)
+    op.create_index(op.f("ix_attachment_work_items_message_id"), "attachment_work_items", ["message_id"], unique=False)
+    op.create_index(op.f("ix_attachment_work_items_status"), "attachment_work_items", ["status"], unique=False)
+    op.create_index(
+        op.f("ix_attachment_work_items_lease_owner"), "attachment_work_items", ["lease_owner"], unique=False
+    )
+    op.create_index(
+        op.f("ix_attachment_work_items_heartbeat_at"), "attachment_work_items", ["heartbeat_at"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_attachment_work_items_heartbeat_at"), table_name="attachment_work_items")
+    op.drop_index(op.f("ix_attachment_work_items_lease_owner"), table_name="attachment_work_items")
+    op.drop_index(op.f("ix_attachment_work_items_status"), table_name="attachment_work_items")
+    op.drop_index(op.f("ix_attachment_work_items_message_id"), table_name="attachment_work_items")
+    op.drop_index(op.f("ix_attachment_work_items_mailbox_id"), table_name="attachment_work_items")
+    op.drop_table("attachment_work_items")
@@ -2,6 +2,13 @@ import os, re, csv, json, sys, time, threading, shutil
 from pathlib import Path
 import fitz  # PyMuPDF
 
+SRC_PATH = Path(__file__).resolve().parent / "src"
+if SRC_PATH.exists() and str(SRC_PATH) not in sys.path:
+    sys.path.insert(0, str(SRC_PATH))
+
+from mail_scraper.extract_cache import ExtractionCache
+from mail_scraper.extract_pool import FILE_TIMEOUT_SECONDS, extract_parallel
+
 # ===========================
 # Matrix "digital rain" layer
 # ===========================
@@ -146,20 +153,62 @@ def find_all_pdfs(root: Path):
     # Support both legacy and new downloader layouts:
     # - legacy: raw_data/.../<graph_message_id>_attachments/*.pdf
     # - current: raw_data/.../m<message_pk>_<hash>/*.pdf
+    # - content-addressed: raw_data/_blobs/<ab>/<sha256>.pdf, hardlinked into the message dirs
+    # Hardlinks of one blob share an inode, so each unique file is parsed once, from a
+    # message dir when one links it (that is where the sidecar metadata lives).
     if not root.exists():
         return []
-    return sorted(p for p in root.rglob("*.pdf") if p.is_file())
+    blobs = root / "_blobs"
+    candidates = sorted(p for p in root.rglob("*.pdf") if p.is_file())
+    candidates.sort(key=lambda p: blobs in p.parents)
+    seen, pdfs = set(), []
+    for p in candidates:
+        st = p.stat()
+        key = (st.st_dev, st.st_ino)
+        if key in seen:
+            continue
+        seen.add(key)
+        pdfs.append(p)
+    return sorted(pdfs)
 
-def main():
-    pdfs = find_all_pdfs(ROOT)
-    if not pdfs:
-        print("No PDFs found under raw_data. Verify paths.", flush=True)
-        return
+# ===========================
+# Incremental extraction cache
+# ===========================
+# Bump whenever extract_fields_from_pdf or its regexes change so cached results are re-parsed.
+EXTRACTOR_VERSION = "1"
+EXTRACT_CACHE = Path("extract_cache.sqlite")
 
-    rows, misses = [], []
+def extract_cached(pdfs, cache: ExtractionCache, extract):
+    """Yield (pdf, fields, error, cached): cache hits first, then `extract(todo)` results for the rest.
+
+    Files with identical content are parsed once; only successful parses are stored.
+    """
+    todo = {}  # sha256 -> every path with that content
     for pdf in pdfs:
+        sha = cache.file_sha256(pdf)
+        fields = cache.get(sha)
+        if fields is not None:
+            yield pdf, fields, None, True
+        else:
+            todo.setdefault(sha, []).append(pdf)
+    first = {paths[0]: sha for sha, paths in todo.items()}
+    for pdf, fields, error in extract(list(first)):
+        sha = first[pdf]
+        if error is None:
+            cache.put(sha, fields)
+        for path in todo[sha]:
+            yield path, fields, error, False
+
+def _extract_all(pdfs, workers, timeout):
+    if workers and workers > 1:
+        return extract_parallel(pdfs, extract_fields_from_pdf, workers, timeout)
+    return ((pdf, extract_fields_from_pdf(pdf), None) for pdf in pdfs)
+
+def _collect_rows(results):
+    rows, misses = [], []
+    for pdf, fields, error, cached in results:
         meta = read_message_metadata(pdf.parent)
-        po, job, total, inv_date = extract_fields_from_pdf(pdf)
+        po, job, total, inv_date = fields or (None, None, None, None)
         vendor = infer_vendor_from(meta.get("sender"), pdf.name)
 
         row = {
@@ -174,11 +223,38 @@ def main():
             "Subject": meta.get("subject"),
         }
         rows.append(row)
+        if error:
+            misses.append({**row, "Error": error})
+            print(f"Failed: {pdf.name} | {error}", flush=True)
+            continue
         if not (po and total):
             misses.append(row)
+        if cached:
+            continue
 
         print(f"Parsed: {pdf.name} | Vendor={vendor} PO={po} Total={total}", flush=True)
 
+    # Parallel results stream in completion order; keep the CSV in path order either way.
+    rows.sort(key=lambda r: r["File"])
+    return rows, misses
+
+def main(workers: int | None = None, timeout: float = FILE_TIMEOUT_SECONDS, use_cache: bool = True):
+    pdfs = find_all_pdfs(ROOT)
+    if not pdfs:
+        print("No PDFs found under raw_data. Verify paths.", flush=True)
+        return
+
+    cache = ExtractionCache(EXTRACT_CACHE, EXTRACTOR_VERSION) if use_cache else None
+    try:
+        if cache is not None:
+            results = extract_cached(pdfs, cache, lambda todo: _extract_all(todo, workers, timeout))
+        else:
+            results = ((*result, False) for result in _extract_all(pdfs, workers, timeout))
+        rows, misses = _collect_rows(results)
+    finally:
+        if cache is not None:
+            cache.close()
+
     # Write CSV
     with OUT_CSV.open("w", newline="", encoding="utf-8") as f:
         writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
@@ -191,16 +267,25 @@ def main():
                 f.write(json.dumps(m, ensure_ascii=False) + "\n")
 
     print(f"\n✅ Wrote {len(rows)} rows to {OUT_CSV}")
+    if cache is not None:
+        print(f"♻️ {cache.hits} cached result(s) reused from {EXTRACT_CACHE}")
     if misses:
         print(f"⚠️ {len(misses)} file(s) missing PO or Total → see {LOG_MISSES}")
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=None, help="Parse PDFs on N processes.")
+    parser.add_argument("--file-timeout", type=float, default=FILE_TIMEOUT_SECONDS)
+    parser.add_argument("--no-cache", action="store_true", help=f"Ignore and do not update {EXTRACT_CACHE}.")
+    args = parser.parse_args()
     # Start Matrix rain in the background
     stop_evt = threading.Event()
     t = threading.Thread(target=matrix_rain, args=(stop_evt,), daemon=True)
     t.start()
     try:
-        main()
+        main(workers=args.workers, timeout=args.file_timeout, use_cache=not args.no_cache)
     finally:
         # stop rain and wait for thread to finish
         stop_evt.set()
@@ -0,0 +1,253 @@
+"""End-to-end throughput benchmarks: `mail-scraper bench`.
+
+Each stage runs the real pipeline code against synthetic data: ingest and attachment downloads
+talk to `FakeGraph`, and `load-extracted-csv`, `derive-tasks` and `score-decisions` run on a
+scratch database (a temporary SQLite file unless `--database-url` names a throwaway Postgres
+database, whose tables are dropped and recreated). Results are plain JSON so runs can be kept
+per commit and compared with `--baseline`.
+"""
+
+import asyncio
+from contextlib import contextmanager
+import csv
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+import logging
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Any, Iterator
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+
+from . import db
+from .config import MailboxConfig, settings
+from .db_schema import Attachment, Base, Message
+from .fake_graph import FakeGraph, SyntheticMailbox
+from .operations import run_derive_tasks, run_load_extracted_csv, run_score_decisions
+from .pipeline_attachments import download_attachments_for_mailbox
+from .pipeline_ingest import ingest_mailbox
+
+BENCH_USER_ID = "bench@example.com"
+
+
+@dataclass
+class BenchConfig:
+    folders: int = 10
+    messages_per_folder: int = 200
+    attachment_every: int = 2
+    attachment_bytes: int = 32 * 1024
+    latency_ms: float = 0.0
+    throttle_rate: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+
+
+@dataclass
+class StageResult:
+    stage: str
+    unit: str
+    items: int
+    seconds: float
+    details: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def per_second(self) -> float:
+        return self.items / self.seconds if self.seconds > 0 else 0.0
+
+
+@contextmanager
+def scratch_database(database_url: str, *, allow_configured: bool = False) -> Iterator[None]:
+    """Point the shared engine at `database_url` with an empty schema, then restore the old one.
+
+    Every table is dropped first, so the configured `DATABASE_URL` is refused unless `allow_configured`.
+    """
+    if make_url(database_url) == make_url(settings.database_url) and not allow_configured:
+        raise ValueError(
+            "Refusing to benchmark against DATABASE_URL: bench drops every table. "
+            "Pass a throwaway --database-url, or --i-know-this-drops-tables."
+        )
+    previous = (settings.database_url, db._ENGINE, db._SessionFactory)
+    settings.database_url = database_url
+    db._ENGINE, db._SessionFactory = None, None
+    engine = db.get_engine()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    try:
+        yield
+    finally:
+        engine.dispose()
+        settings.database_url, db._ENGINE, db._SessionFactory = previous
+
+
+def _timed(fn: Any, *args: Any, **kwargs: Any) -> tuple[Any, float]:
+    started = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return value, time.perf_counter() - started
+
+
+async def _bench_graph_stages(config: BenchConfig, output_root: Path) -> list[StageResult]:
+    fake = FakeGraph(
+        [
+            SyntheticMailbox(
+                BENCH_USER_ID,
+                folders=config.folders,
+                messages_per_folder=config.messages_per_folder,
+                attachment_every=config.attachment_every,
+                attachment_bytes=config.attachment_bytes,
+            )
+        ],
+        latency_seconds=config.latency_ms / 1000.0,
+        throttle_rate=config.throttle_rate,
+        error_rate=config.error_rate,
+        retry_after_seconds=0,
+        seed=config.seed,
+    )
+    mailbox = MailboxConfig(key="bench", user_id=BENCH_USER_ID)
+    results: list[StageResult] = []
+    async with fake.client() as client:
+        with db.db_session() as session:
+            mailbox_row = db.bootstrap_mailboxes(session, [mailbox])["bench"]
+            run = db.start_run(session, pipeline_name="bench_ingest", mailbox_id=mailbox_row.id)
+            started = time.perf_counter()
+            ingested = await ingest_mailbox(
+                client, session, mailbox, mailbox_row, run, max_concurrency=settings.graph_max_concurrency
+            )
+            session.commit()
+            results.append(
+                StageResult(
+                    "ingest",
+                    "messages",
+                    ingested.processed,
+                    time.perf_counter() - started,
+                    {"errors": ingested.errors, "graph_requests": fake.stats.requests},
+                )
+            )
+
+            requests_before = fake.stats.requests
+            run = db.start_run(session, pipeline_name="bench_download_attachments", mailbox_id=mailbox_row.id)
+            started = time.perf_counter()
+            _, errors, skipped = await download_attachments_for_mailbox(
+                client, session, mailbox, mailbox_row, run, output_root, batch_size=settings.attachment_batch_size
+            )
+            session.commit()
+            elapsed = time.perf_counter() - started
+            files, messages = session.execute(
+                select(func.count(), func.count(func.distinct(Attachment.message_id))).where(
+                    Attachment.download_status == "success"
+                )
+            ).one()
+            results.append(
+                StageResult(
+                    "download_attachments",
+                    "attachments",
+                    int(files),
+                    elapsed,
+                    {
+                        "messages": int(messages),
+                        "errors": errors,
+                        "skipped": skipped,
+                        "bytes": int(files) * config.attachment_bytes,
+                        "graph_requests": fake.stats.requests - requests_before,
+                    },
+                )
+            )
+    return results
+
+
+def _write_extracted_csv(csv_path: Path) -> int:
+    """An invoice_summary.csv with one row per downloaded file, mixing PO/total combinations."""
+    with db.db_session() as session:
+        rows = session.execute(
+            select(Attachment.file_path, Message.source_sender, Message.source_received_at, Message.source_subject)
+            .join(Message, Message.id == Attachment.message_id)
+            .where(Attachment.file_path.is_not(None))
+            .order_by(Attachment.id.asc())
+        ).all()
+    with csv_path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(
+            ["File", "Vendor", "PO Number", "Job Number", "Invoice Date", "Total Amount", "Sender", "Received", "Subject"]
+        )
+        for index, (file_path, sender, received_at, subject) in enumerate(rows):
+            writer.writerow(
+                [
+                    file_path,
+                    f"Vendor {index % 50}",
+                    f"PO-{index}" if index % 3 else "",
+                    f"J{index % 200:04d}",
+                    received_at.date().isoformat() if received_at else "",
+                    f"${(index * 137) % 60000:,}.00" if index % 4 else "",
+                    sender,
+                    received_at.isoformat() if received_at else "",
+                    subject,
+                ]
+            )
+    return len(rows)
+
+
+def _bench_db_stages(work_dir: Path) -> list[StageResult]:
+    csv_path = work_dir / "invoice_summary.csv"
+    _write_extracted_csv(csv_path)
+    loaded, load_seconds = _timed(run_load_extracted_csv, csv_path=csv_path)
+    derived, derive_seconds = _timed(run_derive_tasks)
+    scored, score_seconds = _timed(run_score_decisions)
+    return [
+        StageResult("load_extracted_csv", "rows", loaded["rows_read"], load_seconds, loaded),
+        StageResult("derive_tasks", "tasks", derived["tasks_created"], derive_seconds, derived),
+        StageResult("score_decisions", "tasks", scored["tasks_scored"], score_seconds, scored),
+    ]
+
+
+def _git_commit() -> str | None:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def run_benchmarks(
+    config: BenchConfig, *, database_url: str | None = None, allow_configured_database: bool = False
+) -> dict[str, Any]:
+    """Run every stage once and return a JSON-serialisable report."""
+    # One httpx log line per fake request would otherwise be part of what is measured.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory(prefix="mail-scraper-bench-") as tmp:
+        work_dir = Path(tmp)
+        url = database_url or f"sqlite+pysqlite:///{work_dir / 'bench.db'}"
+        with scratch_database(url, allow_configured=allow_configured_database):
+            stages = asyncio.run(_bench_graph_stages(config, work_dir / "raw_data"))
+            stages.extend(_bench_db_stages(work_dir))
+            dialect = db.get_engine().dialect.name
+    return {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": dialect,
+        "config": asdict(config),
+        "stages": {
+            stage.stage: {
+                "unit": stage.unit,
+                "items": stage.items,
+                "seconds": round(stage.seconds, 4),
+                "per_second": round(stage.per_second, 2),
+                "details": stage.details,
+            }
+            for stage in stages
+        },
+    }
+
+
+def compare_reports(current: dict[str, Any], baseline: dict[str, Any]) -> dict[str, float | None]:
+    """Throughput of each stage relative to the baseline (1.10 = 10% faster); None when not comparable."""
+    ratios: dict[str, float | None] = {}
+    for stage, result in current["stages"].items():
+        before = baseline.get("stages", {}).get(stage, {}).get("per_second")
+        ratios[stage] = round(result["per_second"] / before, 3) if before else None
+    return ratios
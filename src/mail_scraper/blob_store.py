@@ -0,0 +1,59 @@
+import json
+import os
+from pathlib import Path
+import uuid
+
+# Blobs live beside the per-mailbox trees: raw_data/_blobs/ab/<sha256><ext>.
+BLOB_DIR_NAME = "_blobs"
+MANIFEST_NAME = "blobs.json"
+
+
+def blob_root(output_root: Path) -> Path:
+    return output_root / BLOB_DIR_NAME
+
+
+def blob_path(output_root: Path, content_sha256: str, suffix: str = "") -> Path:
+    return blob_root(output_root) / content_sha256[:2] / f"{content_sha256}{suffix.lower()}"
+
+
+def staging_path(output_root: Path) -> Path:
+    """Unique scratch path for a download whose hash is not known yet."""
+    staging_dir = blob_root(output_root) / "tmp"
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    return staging_dir / uuid.uuid4().hex
+
+
+def commit_blob(staged: Path, blob: Path) -> Path:
+    """Move a fully written staging file into the store, or drop it if the blob is already there."""
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    if blob.exists():
+        staged.unlink(missing_ok=True)
+    else:
+        # Atomic; two writers racing on the same content leave identical bytes either way.
+        os.replace(staged, blob)
+    return blob
+
+
+def link_blob(blob: Path, destination: Path) -> Path:
+    """Expose a blob at ``destination`` and return the path to record on the attachment row.
+
+    Hardlinks keep the per-message layout (and the sidecar metadata next to it) without a second copy.
+    Where the filesystem refuses them, a ``blobs.json`` manifest in the message directory points at the
+    blob instead and the blob path itself is returned.
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if destination.exists():
+            if os.path.samefile(blob, destination):
+                return destination
+            destination.unlink()
+        os.link(blob, destination)
+        return destination
+    except OSError:
+        manifest_path = destination.parent / MANIFEST_NAME
+        manifest: dict[str, str] = {}
+        if manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        manifest[destination.name] = str(blob)
+        manifest_path.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+        return blob
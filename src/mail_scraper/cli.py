@@ -10,10 +10,12 @@ from .operations import (
     run_audit,
     run_build_role_graph,
     run_download_attachments,
+    run_download_attachments_worker,
     run_derive_tasks,
     run_define_task_completion_rules,
     run_export_score_profiles,
     run_ingest,
+    run_ingest_worker,
     run_import_vendors,
     run_load_extracted_csv,
     run_legacy_extract,
@@ -36,14 +38,37 @@ def build_parser() -> argparse.ArgumentParser:
     ingest.add_argument("--mailbox-key", type=str, default=None)
     ingest.add_argument("--limit", type=int, default=None)
     ingest.add_argument("--matrix", action="store_true", help="Enable Matrix-style running numbers display.")
+    ingest.add_argument(
+        "--mailbox-concurrency", type=int, default=None, help="Ingest up to N mailboxes at the same time."
+    )
+    ingest.add_argument(
+        "--workers", type=int, default=None, help="Queue folder work units and ingest them with N worker processes."
+    )
+    ingest.add_argument(
+        "--worker", action="store_true", help="Only drain queued folder work units (join a sharded ingest)."
+    )
 
     dl = sub.add_parser("download-attachments", help="Download attachment files for ingested messages.")
     dl.add_argument("--mailbox-key", type=str, default=None)
     dl.add_argument("--limit", type=int, default=None)
     dl.add_argument("--batch-size", type=int, default=None, help="Commit and checkpoint every N messages.")
     dl.add_argument("--matrix", action="store_true", help="Enable Matrix-style running numbers display.")
+    dl.add_argument(
+        "--mailbox-concurrency", type=int, default=None, help="Download for up to N mailboxes at the same time."
+    )
+    dl.add_argument("--force", action="store_true", help="Re-download attachments already present on disk.")
+    dl.add_argument(
+        "--worker", action="store_true", help="Queue messages and drain the shared download queue (run on many hosts)."
+    )
 
-    sub.add_parser("extract", help="Run legacy extract_deep parser over downloaded files.")
+    extract = sub.add_parser("extract", help="Run legacy extract_deep parser over downloaded files.")
+    extract.add_argument("--workers", type=int, default=None, help="Parse PDFs on N processes.")
+    extract.add_argument(
+        "--file-timeout", type=float, default=None, help="With --workers, give up on a PDF after N seconds (120)."
+    )
+    extract.add_argument(
+        "--no-cache", action="store_true", help="Re-parse every PDF instead of reusing extract_cache.sqlite."
+    )
     load = sub.add_parser("load-extracted-csv", help="Load invoice_summary.csv into Postgres documents table.")
     load.add_argument("--csv-path", type=Path, default=Path("invoice_summary.csv"))
     import_vendors = sub.add_parser("import-vendors", help="Load vendor reference workbook into lookup table.")
@@ -70,13 +95,34 @@ def build_parser() -> argparse.ArgumentParser:
     sub.add_parser("summarize", help="Run legacy post_run_summary report.")
     sub.add_parser("audit", help="Show mailbox/pipeline counters from Postgres.")
 
-    replay = sub.add_parser("replay-dead-letters", help="Mark dead letters replayed/resolved.")
+    replay = sub.add_parser("replay-dead-letters", help="Re-run failed work from dead letters that are due.")
     replay.add_argument("--stage", type=str, default=None)
     replay.add_argument("--limit", type=int, default=100)
+    replay.add_argument("--mailbox-key", type=str, default=None)
 
     report = sub.add_parser("reliability-report", help="Print rolling pipeline failure rates.")
     report.add_argument("--window", type=int, default=20)
 
+    bench = sub.add_parser("bench", help="Benchmark pipeline throughput on synthetic data; prints JSON.")
+    bench.add_argument("--folders", type=int, default=10)
+    bench.add_argument("--messages-per-folder", type=int, default=200)
+    bench.add_argument("--attachment-every", type=int, default=2, help="Every Nth message carries an attachment.")
+    bench.add_argument("--attachment-bytes", type=int, default=32 * 1024)
+    bench.add_argument("--latency-ms", type=float, default=0.0, help="Simulated Graph latency per request.")
+    bench.add_argument("--throttle-rate", type=float, default=0.0, help="Share of Graph calls answered with 429.")
+    bench.add_argument("--error-rate", type=float, default=0.0, help="Share of Graph calls answered with 5xx.")
+    bench.add_argument(
+        "--database-url", type=str, default=None, help="Throwaway database to use; its tables are dropped first."
+    )
+    bench.add_argument(
+        "--i-know-this-drops-tables",
+        dest="allow_configured_database",
+        action="store_true",
+        help="Allow --database-url to be the configured DATABASE_URL.",
+    )
+    bench.add_argument("--output", type=Path, default=None, help="Also write the JSON report to this file.")
+    bench.add_argument("--baseline", type=Path, default=None, help="Earlier report to compare throughput against.")
+
     port = sub.add_parser("port-sqlite", help="Port documents/line_items from purchasing.db to Postgres.")
     port.add_argument("--sqlite-path", type=Path, default=Path("purchasing.db"))
 
@@ -90,10 +136,33 @@ def main(argv: list[str] | None = None) -> int:
     parser = build_parser()
     args = parser.parse_args(argv)
 
+    if args.command == "ingest" and args.worker:
+        processed = asyncio.run(run_ingest_worker(mailbox_key=args.mailbox_key, limit=args.limit))
+        print(f"Ingest worker complete. Processed new messages: {processed}")
+        return 0
     if args.command == "ingest":
-        processed = asyncio.run(run_ingest(limit=args.limit, mailbox_key=args.mailbox_key, matrix=args.matrix))
+        processed = asyncio.run(
+            run_ingest(
+                limit=args.limit,
+                mailbox_key=args.mailbox_key,
+                matrix=args.matrix,
+                mailbox_concurrency=args.mailbox_concurrency,
+                workers=args.workers,
+            )
+        )
         print(f"Ingest complete. Processed new messages: {processed}")
         return 0
+    if args.command == "download-attachments" and args.worker:
+        processed = asyncio.run(
+            run_download_attachments_worker(
+                mailbox_key=args.mailbox_key,
+                limit=args.limit,
+                batch_size=args.batch_size,
+                force=args.force,
+            )
+        )
+        print(f"Attachment download worker complete. Files processed: {processed}")
+        return 0
     if args.command == "download-attachments":
         processed = asyncio.run(
             run_download_attachments(
@@ -101,12 +170,14 @@ def main(argv: list[str] | None = None) -> int:
                 mailbox_key=args.mailbox_key,
                 matrix=args.matrix,
                 batch_size=args.batch_size,
+                mailbox_concurrency=args.mailbox_concurrency,
+                force=args.force,
             )
         )
         print(f"Attachment download complete. Files processed: {processed}")
         return 0
     if args.command == "extract":
-        run_legacy_extract()
+        run_legacy_extract(workers=args.workers, file_timeout=args.file_timeout, use_cache=not args.no_cache)
         return 0
     if args.command == "load-extracted-csv":
         results = run_load_extracted_csv(csv_path=args.csv_path)
@@ -166,13 +237,37 @@ def main(argv: list[str] | None = None) -> int:
         print(json.dumps(counters, indent=2))
         return 0
     if args.command == "replay-dead-letters":
-        replayed = run_replay_dead_letters(stage=args.stage, limit=args.limit)
-        print(f"Dead letters replayed/resolved: {replayed}")
+        results = asyncio.run(run_replay_dead_letters(stage=args.stage, limit=args.limit, mailbox_key=args.mailbox_key))
+        print(json.dumps(results, indent=2))
         return 0
     if args.command == "reliability-report":
         report = run_reliability_report(window=args.window)
         print(json.dumps(report, indent=2))
         return 0
+    if args.command == "bench":
+        from .bench import BenchConfig, compare_reports, run_benchmarks
+
+        config = BenchConfig(
+            folders=args.folders,
+            messages_per_folder=args.messages_per_folder,
+            attachment_every=args.attachment_every,
+            attachment_bytes=args.attachment_bytes,
+            latency_ms=args.latency_ms,
+            throttle_rate=args.throttle_rate,
+            error_rate=args.error_rate,
+        )
+        try:
+            report = run_benchmarks(
+                config, database_url=args.database_url, allow_configured_database=args.allow_configured_database
+            )
+        except ValueError as exc:
+            parser.error(str(exc))
+        if args.baseline:
+            report["vs_baseline"] = compare_reports(report, json.loads(args.baseline.read_text(encoding="utf-8")))
+        if args.output:
+            args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(json.dumps(report, indent=2))
+        return 0
     if args.command == "port-sqlite":
         migrate_sqlite_to_postgres(args.sqlite_path)
         return 0
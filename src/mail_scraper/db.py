@@ -2,7 +2,8 @@ from contextlib import contextmanager
 from datetime import datetime, timezone
 from typing import Iterator
 
-from sqlalchemy import create_engine, func, select
+from sqlalchemy import create_engine, func, literal_column, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, sessionmaker
 
@@ -71,6 +72,67 @@ def bootstrap_mailboxes(session: Session, mailbox_configs: list[MailboxConfig])
     return known
 
 
+def upsert_rows(
+    session: Session,
+    model: type[Base],
+    rows: list[dict],
+    *,
+    conflict_columns: list[str],
+    update_columns: list[str],
+) -> int:
+    """Write `rows` as one INSERT ... ON CONFLICT DO UPDATE and return how many were new."""
+    if not rows:
+        return 0
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table).values(rows)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table).values(rows)
+    else:
+        raise NotImplementedError(f"Bulk upsert not supported for dialect: {dialect}")
+
+    set_ = {column: stmt.excluded[column] for column in update_columns}
+    if "updated_at" in table.c:
+        set_["updated_at"] = func.now()
+    stmt = stmt.on_conflict_do_update(index_elements=conflict_columns, set_=set_)
+
+    if dialect == "postgresql":
+        # xmax is 0 only for tuples created by this statement, i.e. genuine inserts.
+        flags = session.execute(stmt.returning(literal_column("xmax = 0"))).scalars().all()
+        return sum(1 for flag in flags if flag)
+
+    key_columns = [table.c[column] for column in conflict_columns]
+    keys = [tuple(row[column] for column in conflict_columns) for row in rows]
+    existing = session.execute(
+        select(func.count()).select_from(table).where(tuple_(*key_columns).in_(keys))
+    ).scalar_one()
+    session.execute(stmt)
+    return len(rows) - int(existing)
+
+
+def insert_missing_rows(
+    session: Session,
+    model: type[Base],
+    rows: list[dict],
+    *,
+    conflict_columns: list[str],
+) -> int:
+    """Write `rows` as one INSERT ... ON CONFLICT DO NOTHING and return how many were inserted."""
+    if not rows:
+        return 0
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table).values(rows)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table).values(rows)
+    else:
+        raise NotImplementedError(f"Bulk insert not supported for dialect: {dialect}")
+    result = session.execute(stmt.on_conflict_do_nothing(index_elements=conflict_columns))
+    return int(result.rowcount or 0)
+
+
 def start_run(session: Session, pipeline_name: str, mailbox_id: int | None, metadata: dict | None = None) -> PipelineRun:
     run = PipelineRun(
         pipeline_name=pipeline_name,
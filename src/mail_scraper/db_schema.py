@@ -1,4 +1,16 @@
-from sqlalchemy import JSON, Boolean, DateTime, Float, ForeignKey, Integer, String, Text, UniqueConstraint, func
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    UniqueConstraint,
+    func,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -33,6 +45,12 @@ class Folder(Base):
     display_name: Mapped[str] = mapped_column(String(512))
     path: Mapped[str] = mapped_column(Text)
     total_item_count: Mapped[int] = mapped_column(Integer, default=0)
+    unread_item_count: Mapped[int] = mapped_column(Integer, default=0)
+    last_synced_item_count: Mapped[int | None] = mapped_column(Integer)
+    last_synced_unread_count: Mapped[int | None] = mapped_column(Integer)
+    last_max_received_at: Mapped[str | None] = mapped_column(DateTime(timezone=True))
+    last_delta_link: Mapped[str | None] = mapped_column(Text)
+    last_synced_at: Mapped[str | None] = mapped_column(DateTime(timezone=True))
     updated_at: Mapped[str] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
@@ -52,7 +70,20 @@ class Message(Base):
     source_received_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), index=True)
     body_preview: Mapped[str | None] = mapped_column(Text)
     has_attachments: Mapped[bool] = mapped_column(Boolean, default=False)
-    raw_json: Mapped[dict | None] = mapped_column(JSON)
+    # Deferred: bulk reads of messages should not drag full Graph payloads into memory.
+    raw_json: Mapped[dict | None] = mapped_column(JSON, deferred=True)
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class MessagePayload(Base):
+    __tablename__ = "message_payloads"
+
+    message_id: Mapped[int] = mapped_column(ForeignKey("messages.id", ondelete="CASCADE"), primary_key=True)
+    payload_sha256: Mapped[str] = mapped_column(String(64))
+    codec: Mapped[str] = mapped_column(String(10))
+    payload: Mapped[bytes] = mapped_column(LargeBinary)
     updated_at: Mapped[str] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
@@ -70,6 +101,7 @@ class Attachment(Base):
     name: Mapped[str | None] = mapped_column(Text)
     content_type: Mapped[str | None] = mapped_column(String(200))
     size_bytes: Mapped[int | None] = mapped_column(Integer)
+    content_sha256: Mapped[str | None] = mapped_column(String(64), index=True)
     file_path: Mapped[str | None] = mapped_column(Text)
     download_status: Mapped[str] = mapped_column(String(50), default="pending")
     error_message: Mapped[str | None] = mapped_column(Text)
@@ -419,3 +451,43 @@ class DeadLetter(Base):
     next_retry_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), index=True)
     last_seen_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
     resolved_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), index=True)
+
+
+class IngestWorkUnit(Base):
+    __tablename__ = "ingest_work_units"
+    __table_args__ = (UniqueConstraint("mailbox_id", "graph_folder_id", name="uq_ingest_work_mailbox_folder"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    mailbox_id: Mapped[int] = mapped_column(ForeignKey("mailboxes.id", ondelete="CASCADE"), index=True)
+    graph_folder_id: Mapped[str] = mapped_column(String(256), index=True)
+    status: Mapped[str] = mapped_column(String(20), index=True, default="pending")
+    lease_owner: Mapped[str | None] = mapped_column(String(200), index=True)
+    leased_at: Mapped[str | None] = mapped_column(DateTime(timezone=True))
+    heartbeat_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    processed_count: Mapped[int] = mapped_column(Integer, default=0)
+    error_message: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class AttachmentWorkItem(Base):
+    __tablename__ = "attachment_work_items"
+    __table_args__ = (UniqueConstraint("mailbox_id", "message_id", name="uq_attachment_work_mailbox_message"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    mailbox_id: Mapped[int] = mapped_column(ForeignKey("mailboxes.id", ondelete="CASCADE"), index=True)
+    message_id: Mapped[int] = mapped_column(ForeignKey("messages.id", ondelete="CASCADE"), index=True)
+    status: Mapped[str] = mapped_column(String(20), index=True, default="pending")
+    lease_owner: Mapped[str | None] = mapped_column(String(200), index=True)
+    leased_at: Mapped[str | None] = mapped_column(DateTime(timezone=True))
+    heartbeat_at: Mapped[str | None] = mapped_column(DateTime(timezone=True), index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    processed_count: Mapped[int] = mapped_column(Integer, default=0)
+    error_message: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
@@ -0,0 +1,104 @@
+"""SQLite sidecar that remembers PDF extraction results between `extract` runs.
+
+Results are keyed by the file's SHA-256 plus the extractor version, so a renamed or re-linked
+file is still a hit and bumping the version re-parses everything. Hashes are memoised by path,
+size and mtime, so an unchanged file is not even re-read.
+"""
+
+import hashlib
+from pathlib import Path
+import sqlite3
+import time
+
+Fields = tuple[str | None, str | None, str | None, str | None]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    sha256 TEXT NOT NULL,
+    extractor_version TEXT NOT NULL,
+    po_number TEXT,
+    job_number TEXT,
+    total TEXT,
+    invoice_date TEXT,
+    extracted_at REAL NOT NULL,
+    PRIMARY KEY (sha256, extractor_version)
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+"""
+
+
+def sha256_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        while chunk := handle.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    def __init__(self, path: Path, extractor_version: str, commit_every: int = 500) -> None:
+        self.extractor_version = extractor_version
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self._uncommitted = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self) -> "ExtractionCache":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+    def _written(self) -> None:
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def file_sha256(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path)
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, sha256 FROM file_hashes WHERE path = ?", (key,)
+        ).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        sha = sha256_file(path)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256) VALUES (?, ?, ?, ?)",
+            (key, st.st_size, st.st_mtime_ns, sha),
+        )
+        self._written()
+        return sha
+
+    def get(self, sha256: str) -> Fields | None:
+        row = self._conn.execute(
+            "SELECT po_number, job_number, total, invoice_date FROM extractions"
+            " WHERE sha256 = ? AND extractor_version = ?",
+            (sha256, self.extractor_version),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tuple(row)
+
+    def put(self, sha256: str, fields: Fields) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO extractions"
+            " (sha256, extractor_version, po_number, job_number, total, invoice_date, extracted_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (sha256, self.extractor_version, *fields, time.time()),
+        )
+        self._written()
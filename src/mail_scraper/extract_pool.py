@@ -0,0 +1,104 @@
+"""Process pool for CPU-bound per-file extraction that survives hung and crashing workers.
+
+`extract_parallel` keeps at most `workers` files in flight, so a file's deadline starts roughly
+when a worker picks it up and a 200k-file list is never queued up front. A file that runs past
+its timeout is reported as failed and the pool is replaced (its worker is killed). When a worker
+crashes, the files that were in flight are retried one at a time; the one that crashes again on
+its own is reported as failed.
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from pathlib import Path
+import time
+from typing import Any, Callable, Iterable, Iterator
+
+FILE_TIMEOUT_SECONDS = 120
+
+# (path, extracted value or None, error message or None)
+ExtractOutcome = tuple[Path, Any, str | None]
+
+
+class _WorkerPool:
+    """A ProcessPoolExecutor whose worker processes can be killed, not just shut down."""
+
+    def __init__(self, workers: int) -> None:
+        self._children_before = set(multiprocessing.active_children())
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+
+    def processes(self) -> list[multiprocessing.Process]:
+        # CPython keeps the workers in the private `_processes` dict. If that ever changes, fall back
+        # to the children started since this pool was created.
+        processes = getattr(self.executor, "_processes", None)
+        if isinstance(processes, dict):
+            return list(processes.values())
+        return [proc for proc in multiprocessing.active_children() if proc not in self._children_before]
+
+    def kill(self) -> None:
+        # A hung worker never returns, so shutdown() alone would leave it running.
+        processes = self.processes()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        for proc in processes:
+            if proc.is_alive():
+                proc.kill()
+        for proc in processes:
+            proc.join(timeout=5)
+
+
+def extract_parallel(
+    paths: Iterable[Path],
+    extract: Callable[[Path], Any],
+    workers: int,
+    timeout: float = FILE_TIMEOUT_SECONDS,
+) -> Iterator[ExtractOutcome]:
+    """Yield (path, value, error) as files finish, running the picklable `extract` on `workers` processes."""
+    pending: deque[Path] = deque(paths)
+    suspects: deque[Path] = deque()
+    pool = _WorkerPool(workers)
+    in_flight: dict[Future, tuple[Path, float, bool]] = {}  # future -> (path, deadline, suspect)
+
+    def submit(path: Path, suspect: bool) -> None:
+        in_flight[pool.executor.submit(extract, path)] = (path, time.monotonic() + timeout, suspect)
+
+    try:
+        while pending or suspects or in_flight:
+            # Suspects run alone so a repeat crash pins down the file that caused it.
+            while suspects and not in_flight:
+                submit(suspects.popleft(), True)
+            while pending and not suspects and len(in_flight) < workers:
+                submit(pending.popleft(), False)
+
+            next_deadline = min(deadline for _, deadline, _ in in_flight.values())
+            done, _ = wait(in_flight, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+
+            broken = False
+            for future in done:
+                path, _, suspect = in_flight.pop(future)
+                try:
+                    yield path, future.result(), None
+                except BrokenProcessPool as exc:
+                    broken = True
+                    if suspect:
+                        yield path, None, f"worker crashed: {exc}"
+                    else:
+                        suspects.append(path)
+                except Exception as exc:
+                    yield path, None, f"{type(exc).__name__}: {exc}"
+
+            now = time.monotonic()
+            expired = [future for future, (_, deadline, _) in in_flight.items() if deadline <= now and not future.done()]
+            for future in expired:
+                path, _, _ = in_flight.pop(future)
+                yield path, None, f"timed out after {timeout:g}s"
+
+            if broken or expired:
+                # Files still in flight on the old pool never finish there; put them back in front.
+                for path, _, suspect in in_flight.values():
+                    (suspects if broken or suspect else pending).appendleft(path)
+                in_flight.clear()
+                pool.kill()
+                pool = _WorkerPool(workers)
+    finally:
+        pool.kill()
@@ -0,0 +1,338 @@
+"""Local stand-in for Microsoft Graph, for tests and offline benchmarks.
+
+`FakeGraph` answers the calls ingest and attachment downloads make, through
+`httpx.MockTransport`: synthetic mailboxes of configurable size, JSONL recordings captured
+by `GraphRecorder` (set `GRAPH_RECORD_DIR`), or both, with recordings taking precedence.
+Latency, 429 throttling and 5xx errors can be injected per call, including per `$batch` item.
+
+    fake = FakeGraph([SyntheticMailbox("ops@example.com", folders=20, messages_per_folder=500)])
+    async with fake.client() as client:
+        await ingest_mailbox(client, ...)
+"""
+
+import asyncio
+import base64
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+import json
+from pathlib import Path
+import random
+import re
+from typing import Any, Iterable
+from urllib.parse import unquote
+
+import httpx
+
+from .config import settings
+from .graph_client import GraphClient, recording_key
+
+_FILTER_GE_RE = re.compile(r"receivedDateTime ge (\S+)")
+_BASE_RECEIVED_AT = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass
+class SyntheticMailbox:
+    """A flat mailbox: `folders` folders under the root, each holding `messages_per_folder` messages.
+
+    Every `attachment_every`-th message carries `attachments_per_message` PDF attachments of
+    `attachment_bytes` bytes.
+    """
+
+    user_id: str
+    folders: int = 10
+    messages_per_folder: int = 100
+    attachments_per_message: int = 1
+    attachment_every: int = 1
+    attachment_bytes: int = 64 * 1024
+    root_folder_name: str = "msgfolderroot"
+
+    def has_attachments(self, index: int) -> bool:
+        return self.attachments_per_message > 0 and index % max(1, self.attachment_every) == 0
+
+
+@dataclass
+class FakeGraphStats:
+    requests: int = 0
+    batch_items: int = 0
+    throttled: int = 0
+    errors: int = 0
+    replayed: int = 0
+    bytes_served: int = 0
+
+
+@dataclass
+class _Reply:
+    status: int
+    body: Any = None
+    content: bytes | None = None
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+def _split_query(query: str) -> dict[str, str]:
+    params: dict[str, str] = {}
+    for part in unquote(query).split("&"):
+        if part:
+            name, _, value = part.partition("=")
+            params[name] = value
+    return params
+
+
+class FakeGraph:
+    def __init__(
+        self,
+        mailboxes: Iterable[SyntheticMailbox] = (),
+        *,
+        recordings: Iterable[Path] = (),
+        latency_seconds: float = 0.0,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        retry_after_seconds: int = 1,
+        seed: int = 0,
+    ) -> None:
+        self.mailboxes = {mailbox.user_id.lower(): mailbox for mailbox in mailboxes}
+        self.latency_seconds = latency_seconds
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after_seconds = retry_after_seconds
+        self.stats = FakeGraphStats()
+        self._random = random.Random(seed)
+        self._recorded: dict[tuple[str, str], list[dict[str, Any]]] = {}
+        self._replay_position: dict[tuple[str, str], int] = {}
+        for path in recordings:
+            self.load_recording(path)
+
+    def load_recording(self, path: Path) -> None:
+        with path.open(encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._recorded.setdefault((entry["method"], entry["path"]), []).append(entry)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def client(self, **kwargs: Any) -> GraphClient:
+        """A GraphClient wired to this fake; the token exchange is answered locally too."""
+        return GraphClient(http_client=httpx.AsyncClient(transport=self.transport()), **kwargs)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.stats.requests += 1
+        if request.url.host != httpx.URL(settings.graph_endpoint).host:
+            # Token exchange (login.microsoftonline.com).
+            return httpx.Response(200, json={"access_token": "fake-token", "expires_in": 3600})
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        method, path = recording_key(request.method, request.url.raw_path.decode("ascii"))
+        if method == "POST" and path.split("?")[0] == "/$batch":
+            reply = self._batch(json.loads(request.content))
+        else:
+            reply = self._call(method, path, request.headers)
+        if reply.content is not None:
+            self.stats.bytes_served += len(reply.content)
+            return httpx.Response(reply.status, content=reply.content, headers=reply.headers)
+        return httpx.Response(reply.status, json=reply.body, headers=reply.headers)
+
+    def _batch(self, payload: dict[str, Any]) -> _Reply:
+        responses = []
+        for item in payload.get("requests", []):
+            self.stats.batch_items += 1
+            method, path = recording_key(item.get("method", "GET"), item["url"])
+            reply = self._call(method, path, item.get("headers") or {})
+            body = reply.body
+            if reply.content is not None:
+                body = base64.b64encode(reply.content).decode("ascii")
+            responses.append({"id": item["id"], "status": reply.status, "headers": reply.headers, "body": body})
+        return _Reply(200, {"responses": responses})
+
+    def _call(self, method: str, path: str, headers: Any) -> _Reply:
+        roll = self._random.random()
+        if roll < self.throttle_rate:
+            self.stats.throttled += 1
+            return _Reply(
+                429,
+                {"error": {"code": "TooManyRequests"}},
+                headers={"Retry-After": str(self.retry_after_seconds)},
+            )
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats.errors += 1
+            return _Reply(self._random.choice((500, 502, 504)), {"error": {"code": "ServiceUnavailable"}})
+        recorded = self._replay(method, path)
+        if recorded is not None:
+            return recorded
+        if method == "GET":
+            reply = self._synthetic(path, headers)
+            if reply is not None:
+                return reply
+        return _Reply(404, {"error": {"code": "ErrorItemNotFound", "message": f"{method} {path}"}})
+
+    def _replay(self, method: str, path: str) -> _Reply | None:
+        entries = self._recorded.get((method, path))
+        if not entries:
+            return None
+        # Successive calls walk through the recorded responses, then keep repeating the last one.
+        position = self._replay_position.get((method, path), 0)
+        self._replay_position[(method, path)] = position + 1
+        entry = entries[min(position, len(entries) - 1)]
+        self.stats.replayed += 1
+        headers = dict(entry.get("headers") or {})
+        if "body_b64" in entry:
+            return _Reply(entry["status"], content=base64.b64decode(entry["body_b64"]), headers=headers)
+        return _Reply(entry["status"], entry.get("json"), headers=headers)
+
+    # Synthetic mailboxes ---------------------------------------------------------------
+
+    def _link(self, path: str, params: dict[str, str]) -> str:
+        query = "&".join(f"{name}={value}" for name, value in params.items())
+        return f"{settings.graph_endpoint.rstrip('/')}{path}?{query}"
+
+    def _synthetic(self, path: str, headers: Any) -> _Reply | None:
+        route, _, query = path.partition("?")
+        params = _split_query(query)
+        parts = route.strip("/").split("/")
+        if len(parts) < 3 or parts[0] != "users":
+            return None
+        mailbox = self.mailboxes.get(parts[1].lower())
+        if mailbox is None:
+            return None
+        rest = parts[2:]
+        if rest[0] == "mailFolders" and len(rest) == 2:
+            return self._folder(mailbox, rest[1])
+        if rest[0] == "mailFolders" and rest[2:] == ["childFolders"]:
+            return self._child_folders(mailbox, route, rest[1], params)
+        if rest[0] == "mailFolders" and rest[2:] == ["messages"]:
+            return self._messages(mailbox, route, rest[1], params)
+        if rest[0] == "mailFolders" and rest[2:] == ["messages", "delta"]:
+            return self._delta(mailbox, route, rest[1], params, headers)
+        if rest[0] == "messages" and len(rest) == 2:
+            message = self._message(mailbox, rest[1])
+            return _Reply(200, message) if message else None
+        if rest[0] == "messages" and rest[2:] == ["attachments"]:
+            return self._attachments(mailbox, rest[1])
+        if rest[0] == "messages" and len(rest) == 5 and rest[2] == "attachments" and rest[4] == "$value":
+            return self._attachment_content(mailbox, rest[1], rest[3])
+        return None
+
+    def _folder_json(self, mailbox: SyntheticMailbox, index: int) -> dict[str, Any]:
+        return {
+            "id": f"f{index}",
+            "displayName": f"Folder {index:04d}",
+            "parentFolderId": "root",
+            "childFolderCount": 0,
+            "totalItemCount": mailbox.messages_per_folder,
+            "unreadItemCount": 0,
+        }
+
+    def _folder(self, mailbox: SyntheticMailbox, folder_id: str) -> _Reply | None:
+        if folder_id in (mailbox.root_folder_name, "root"):
+            return _Reply(
+                200,
+                {
+                    "id": "root",
+                    "displayName": mailbox.root_folder_name,
+                    "childFolderCount": mailbox.folders,
+                    "totalItemCount": 0,
+                    "unreadItemCount": 0,
+                },
+            )
+        index = self._folder_index(mailbox, folder_id)
+        return None if index is None else _Reply(200, self._folder_json(mailbox, index))
+
+    def _child_folders(self, mailbox: SyntheticMailbox, route: str, folder_id: str, params: dict[str, str]) -> _Reply:
+        children = range(mailbox.folders) if folder_id == "root" else range(0)
+        top = int(params.get("$top", 10))
+        skip = int(params.get("$skip", 0))
+        page = [self._folder_json(mailbox, index) for index in children[skip : skip + top]]
+        body: dict[str, Any] = {"value": page}
+        if skip + top < len(children):
+            body["@odata.nextLink"] = self._link(route, {**params, "$skip": str(skip + top)})
+        return _Reply(200, body)
+
+    @staticmethod
+    def _folder_index(mailbox: SyntheticMailbox, folder_id: str) -> int | None:
+        if folder_id.startswith("f") and folder_id[1:].isdigit() and int(folder_id[1:]) < mailbox.folders:
+            return int(folder_id[1:])
+        return None
+
+    def _message(self, mailbox: SyntheticMailbox, message_id: str) -> dict[str, Any] | None:
+        folder_id, _, tail = message_id.partition("-m")
+        folder_index = self._folder_index(mailbox, folder_id)
+        if folder_index is None or not tail.isdigit() or int(tail) >= mailbox.messages_per_folder:
+            return None
+        index = int(tail)
+        received_at = _BASE_RECEIVED_AT - timedelta(minutes=index)
+        return {
+            "id": message_id,
+            "from": {"emailAddress": {"address": f"vendor{index % 50}@example.com"}},
+            "subject": f"Quote {folder_index}-{index}",
+            "receivedDateTime": received_at.isoformat().replace("+00:00", "Z"),
+            "bodyPreview": "Please find the quote attached.",
+            "hasAttachments": mailbox.has_attachments(index),
+            "conversationId": f"c{folder_index}-{index // 3}",
+            "parentFolderId": folder_id,
+        }
+
+    def _folder_messages(self, mailbox: SyntheticMailbox, folder_id: str, params: dict[str, str]) -> list[dict]:
+        if self._folder_index(mailbox, folder_id) is None:
+            return []
+        # Newest first, matching `$orderby=receivedDateTime desc`.
+        messages = [self._message(mailbox, f"{folder_id}-m{index}") for index in range(mailbox.messages_per_folder)]
+        match = _FILTER_GE_RE.search(params.get("$filter", ""))
+        if match:
+            since = datetime.fromisoformat(match.group(1).replace("Z", "+00:00"))
+            messages = [
+                message
+                for message in messages
+                if datetime.fromisoformat(message["receivedDateTime"].replace("Z", "+00:00")) >= since
+            ]
+        return messages
+
+    def _messages(self, mailbox: SyntheticMailbox, route: str, folder_id: str, params: dict[str, str]) -> _Reply:
+        messages = self._folder_messages(mailbox, folder_id, params)
+        top = int(params.get("$top", 10))
+        skip = int(params.get("$skip", 0))
+        body: dict[str, Any] = {"value": messages[skip : skip + top]}
+        if skip + top < len(messages):
+            body["@odata.nextLink"] = self._link(route, {**params, "$skip": str(skip + top)})
+        return _Reply(200, body)
+
+    def _delta(
+        self, mailbox: SyntheticMailbox, route: str, folder_id: str, params: dict[str, str], headers: Any
+    ) -> _Reply:
+        if "$deltatoken" in params:
+            # Nothing changes in a synthetic mailbox after the first full round.
+            return _Reply(200, {"value": [], "@odata.deltaLink": self._link(route, params)})
+        match = re.search(r"odata\.maxpagesize=(\d+)", headers.get("Prefer", ""))
+        page_size = int(match.group(1)) if match else 50
+        messages = self._folder_messages(mailbox, folder_id, params)
+        skip = int(params.pop("$skiptoken", 0))
+        body: dict[str, Any] = {"value": messages[skip : skip + page_size]}
+        if skip + page_size < len(messages):
+            body["@odata.nextLink"] = self._link(route, {**params, "$skiptoken": str(skip + page_size)})
+        else:
+            body["@odata.deltaLink"] = self._link(route, {"$deltatoken": "synthetic"})
+        return _Reply(200, body)
+
+    def _attachment_json(self, mailbox: SyntheticMailbox, message_id: str, index: int) -> dict[str, Any]:
+        return {
+            "@odata.type": "#microsoft.graph.fileAttachment",
+            "id": f"{message_id}-a{index}",
+            "name": f"quote-{message_id}-{index}.pdf",
+            "contentType": "application/pdf",
+            "size": mailbox.attachment_bytes,
+            "isInline": False,
+        }
+
+    def _attachments(self, mailbox: SyntheticMailbox, message_id: str) -> _Reply | None:
+        message = self._message(mailbox, message_id)
+        if message is None:
+            return None
+        count = mailbox.attachments_per_message if message["hasAttachments"] else 0
+        return _Reply(200, {"value": [self._attachment_json(mailbox, message_id, index) for index in range(count)]})
+
+    def _attachment_content(self, mailbox: SyntheticMailbox, message_id: str, attachment_id: str) -> _Reply | None:
+        message = self._message(mailbox, message_id)
+        if message is None or not message["hasAttachments"] or not attachment_id.startswith(f"{message_id}-a"):
+            return None
+        header = f"%PDF-1.4\n% {attachment_id}\n".encode("ascii")
+        content = (header + b"0" * mailbox.attachment_bytes)[: max(len(header), mailbox.attachment_bytes)]
+        return _Reply(200, content=content, headers={"Content-Type": "application/pdf"})
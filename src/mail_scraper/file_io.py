@@ -0,0 +1,66 @@
+"""Blocking filesystem work for the async pipelines.
+
+Disk writes, directory creation and fsync run on a small shared thread pool so a slow
+disk (or a network-mounted `raw_data`) stalls only that pool, not the event loop that
+keeps Graph requests in flight.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+from pathlib import Path
+import threading
+from typing import Any, Callable, Iterable, TypeVar
+
+from .config import settings
+
+T = TypeVar("T")
+FSYNC_MODES = ("off", "file", "batch")
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def io_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.attachment_io_workers), thread_name_prefix="mail-scraper-io"
+            )
+        return _executor
+
+
+async def run_io(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking filesystem call on the I/O pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def fsync_mode() -> str:
+    mode = settings.attachment_fsync.lower()
+    if mode not in FSYNC_MODES:
+        raise ValueError(f"ATTACHMENT_FSYNC must be one of {', '.join(FSYNC_MODES)}, got {mode!r}")
+    return mode
+
+
+def fsync_path(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_paths(paths: Iterable[Path]) -> None:
+    """Flush files, then their directories, so renames and hardlinks survive a crash too."""
+    directories: set[Path] = set()
+    for path in paths:
+        fsync_path(path)
+        directories.add(path.parent)
+    if os.name == "nt":
+        # Windows cannot open directories for fsync; file data is already flushed.
+        return
+    for directory in directories:
+        fsync_path(directory)
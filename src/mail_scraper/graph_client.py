@@ -1,21 +1,167 @@
 import asyncio
+import base64
+from dataclasses import dataclass, field
+import importlib.util
+import json
 import logging
+import os
+from pathlib import Path
+import threading
 import time
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, Awaitable, Callable
+from urllib.parse import unquote
 
 import httpx
 
 from .config import settings
+from .file_io import run_io
+from .rate_limit import THROTTLE_STATUSES, GraphRateLimiter, mailbox_scope
 
 logger = logging.getLogger(__name__)
 
+# Graph rejects JSON batches with more than 20 sub-requests.
+GRAPH_BATCH_MAX = 20
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+@dataclass
+class _BatchItem:
+    path: str
+    future: asyncio.Future = field(repr=False)
+    attempts: int = 0
+
+
+def _retry_after_seconds(headers: Any) -> float | None:
+    value = (headers or {}).get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(1.0, float(value))
+    except ValueError:
+        return None
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def recording_key(method: str, path: str) -> tuple[str, str]:
+    """Match key for a Graph call: method plus the unquoted path and query below the endpoint (`/v1.0`)."""
+    if "://" in path:
+        path = httpx.URL(path).raw_path.decode("ascii")
+    prefix = httpx.URL(settings.graph_endpoint).path.rstrip("/")
+    if prefix and path.startswith(f"{prefix}/"):
+        path = path[len(prefix) :]
+    return method.upper(), unquote(path)
+
+
+class GraphRecorder:
+    """Append Graph request/response pairs to a JSONL file for offline replay by `fake_graph`.
+
+    Only Graph calls are kept (never the token exchange), and only Content-Type and Retry-After
+    headers are stored. `$batch` calls are recorded as their individual sub-requests so a replay
+    can answer them in any grouping.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def in_directory(cls, directory: Path) -> "GraphRecorder":
+        return cls(directory / f"graph-{os.getpid()}.jsonl")
+
+    def _write(self, entries: list[dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+        with self._lock, self.path.open("a", encoding="utf-8") as handle:
+            handle.write(lines)
+
+    @staticmethod
+    def _entry(method: str, path: str, status: int, headers: Any, body: Any) -> dict[str, Any]:
+        kept = {name: headers[name] for name in ("Content-Type", "Retry-After") if name in (headers or {})}
+        method, path = recording_key(method, path)
+        return {"method": method, "path": path, "status": status, "headers": kept, **body}
+
+    async def __call__(self, response: httpx.Response) -> None:
+        """httpx response event hook."""
+        request = response.request
+        if request.url.host != httpx.URL(settings.graph_endpoint).host:
+            return
+        await response.aread()
+        path = request.url.raw_path.decode("ascii")
+        if request.url.path.endswith("/$batch") and response.is_success:
+            sub_requests = {item["id"]: item for item in json.loads(request.content).get("requests", [])}
+            entries = [
+                self._entry(
+                    sub_requests[item["id"]].get("method", "GET"),
+                    sub_requests[item["id"]]["url"],
+                    int(item.get("status", 500)),
+                    item.get("headers"),
+                    {"json": item.get("body")},
+                )
+                for item in response.json().get("responses", [])
+                if item.get("id") in sub_requests
+            ]
+        else:
+            if "json" in response.headers.get("Content-Type", ""):
+                body = {"json": response.json()}
+            else:
+                body = {"body_b64": base64.b64encode(response.content).decode("ascii")}
+            entries = [self._entry(request.method, path, response.status_code, response.headers, body)]
+        await asyncio.to_thread(self._write, entries)
+
+
+def build_http_client(timeout_seconds: float | None = None) -> httpx.AsyncClient:
+    """Pooled client for graph.microsoft.com: keep-alive reuse, split timeouts, HTTP/2 when `h2` is installed.
+
+    Over HTTP/2 concurrent requests are multiplexed onto one or a few TLS connections instead of
+    each needing its own handshake.
+    """
+    http2 = settings.graph_http2 and _http2_available()
+    if settings.graph_http2 and not http2:
+        logger.info("graph_http2_unavailable", extra={"hint": "pip install 'httpx[http2]'"})
+    read = timeout_seconds if timeout_seconds is not None else settings.graph_read_timeout_seconds
+    hooks: dict[str, list[Any]] = {}
+    if settings.graph_record_dir:
+        hooks["response"] = [GraphRecorder.in_directory(Path(settings.graph_record_dir))]
+    return httpx.AsyncClient(
+        http2=http2,
+        event_hooks=hooks,
+        limits=httpx.Limits(
+            max_connections=settings.graph_max_connections,
+            max_keepalive_connections=settings.graph_max_keepalive_connections,
+            keepalive_expiry=settings.graph_keepalive_expiry_seconds,
+        ),
+        timeout=httpx.Timeout(read, connect=settings.graph_connect_timeout_seconds),
+    )
+
 
 class GraphClient:
-    def __init__(self, timeout_seconds: int = 30) -> None:
+    """Graph API client; one instance can be shared by every mailbox and pipeline in a process.
+
+    Pass `http_client` to reuse an existing pool; a client passed in is not closed by `close()`.
+    """
+
+    def __init__(
+        self,
+        timeout_seconds: float | None = None,
+        limiter: GraphRateLimiter | None = None,
+        http_client: httpx.AsyncClient | None = None,
+    ) -> None:
         self._token: str | None = None
         self._token_expires_at: float = 0.0
-        self._client = httpx.AsyncClient(timeout=timeout_seconds)
+        self._owns_client = http_client is None
+        self._client = http_client or build_http_client(timeout_seconds)
         self._graph_endpoint = settings.graph_endpoint.rstrip("/")
+        self.limiter = limiter or GraphRateLimiter(
+            initial=settings.graph_max_concurrency,
+            ceiling=settings.graph_max_concurrency_ceiling,
+            per_mailbox=settings.graph_mailbox_concurrency,
+        )
+        self._batch_pending: list[_BatchItem] = []
+        self._batch_flush_handle: asyncio.TimerHandle | None = None
+        self._batch_tasks: set[asyncio.Task] = set()
 
     async def __aenter__(self) -> "GraphClient":
         return self
@@ -60,7 +206,15 @@ class GraphClient:
         *,
         params: dict[str, Any] | None = None,
         expect_json: bool = True,
+        extra_headers: dict[str, str] | None = None,
+        json_body: Any = None,
+        stream_to: Callable[[httpx.Response], Awaitable[Any]] | None = None,
     ) -> Any:
+        """Send with token refresh, limiter slots and retries.
+
+        With `stream_to`, a successful response is handed over unread and the callback's result
+        is returned, so large bodies never have to be held in memory.
+        """
         await self._ensure_token()
         path = self._normalize_graph_path(path_or_url)
         url = f"{self._graph_endpoint}{path}"
@@ -69,21 +223,43 @@ class GraphClient:
             # Immutable IDs remain stable when items move between folders.
             "Prefer": 'IdType="ImmutableId"',
         }
+        for name, value in (extra_headers or {}).items():
+            if name.lower() == "prefer":
+                # Graph accepts several preferences in one comma-separated header.
+                headers["Prefer"] = f"{headers['Prefer']}, {value}"
+            else:
+                headers[name] = value
 
+        scope = mailbox_scope(path)
         for attempt in range(6):
-            resp = await self._client.request(method, url, headers=headers, params=params)
+            async with self.limiter.slot(scope) as slot:
+                if stream_to is None:
+                    resp = await self._client.request(method, url, headers=headers, params=params, json=json_body)
+                else:
+                    request = self._client.build_request(method, url, headers=headers, params=params, json=json_body)
+                    resp = await self._client.send(request, stream=True)
+                wait_seconds = _retry_after_seconds(resp.headers) or min(30.0, 2**attempt)
+                slot.record(resp.status_code, wait_seconds)
+                if stream_to is not None:
+                    # The slot stays held while the body streams; it is still an in-flight request.
+                    try:
+                        if resp.is_success:
+                            return await stream_to(resp)
+                        await resp.aread()
+                    finally:
+                        await resp.aclose()
 
             if resp.status_code == 401 and attempt == 0:
                 await self.authenticate(force_refresh=True)
                 headers["Authorization"] = f"Bearer {self._token}"
                 continue
 
-            if resp.status_code in (429, 500, 502, 503, 504):
-                retry_after = resp.headers.get("Retry-After")
-                if retry_after is not None:
-                    wait_seconds = max(1.0, float(retry_after))
-                else:
-                    wait_seconds = min(30.0, 2**attempt)
+            if resp.status_code in THROTTLE_STATUSES:
+                # The limiter has paused this scope until Retry-After; the next slot waits it out.
+                logger.warning("graph_throttled", extra={"status": resp.status_code, "wait_s": wait_seconds})
+                continue
+
+            if resp.status_code in RETRYABLE_STATUSES:
                 logger.warning("graph_retry", extra={"status": resp.status_code, "wait_s": wait_seconds})
                 await asyncio.sleep(wait_seconds)
                 continue
@@ -94,12 +270,167 @@ class GraphClient:
         resp.raise_for_status()
         return resp.json() if expect_json else resp.content
 
-    async def _get(self, path: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
-        return await self._request("GET", path, params=params, expect_json=True)
+    async def _get(
+        self,
+        path: str,
+        params: dict[str, Any] | None = None,
+        extra_headers: dict[str, str] | None = None,
+    ) -> dict[str, Any]:
+        return await self._request("GET", path, params=params, expect_json=True, extra_headers=extra_headers)
 
     async def _get_bytes(self, path_or_url: str) -> bytes:
         return await self._request("GET", path_or_url, expect_json=False)
 
+    async def download_to(
+        self,
+        path_or_url: str,
+        destination: Path,
+        chunk_size: int = 1 << 20,
+        digest: Any = None,
+        fsync: bool = False,
+    ) -> int:
+        """Stream a binary GET (e.g. `.../attachments/{id}/$value`) into `destination`.
+
+        Chunks go to a sibling `.part` file that is renamed into place only once complete, so
+        memory stays flat whatever the size and readers never see a truncated file.
+        Returns the number of bytes written; pass a `hashlib` object as `digest` to hash on the way.
+        Disk writes and hashing run on the shared I/O pool; `fsync` flushes the file before the rename.
+        """
+        partial = destination.with_name(f"{destination.name}.part")
+
+        def write_chunk(handle: Any, chunk: bytes) -> None:
+            handle.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+
+        def finish(handle: Any) -> None:
+            if fsync:
+                handle.flush()
+                os.fsync(handle.fileno())
+            handle.close()
+            os.replace(partial, destination)
+
+        async def write(resp: httpx.Response) -> int:
+            written = 0
+            handle = await run_io(partial.open, "wb")
+            try:
+                async for chunk in resp.aiter_bytes(chunk_size):
+                    await run_io(write_chunk, handle, chunk)
+                    written += len(chunk)
+                await run_io(finish, handle)
+            finally:
+                if not handle.closed:
+                    await run_io(handle.close)
+            return written
+
+        try:
+            return await self._request("GET", path_or_url, expect_json=False, stream_to=write)
+        finally:
+            await run_io(partial.unlink, missing_ok=True)
+
+    async def batched_get(self, path_or_url: str) -> dict[str, Any]:
+        """GET through the `/$batch` coalescer.
+
+        Calls issued within `graph_batch_window_ms` of each other are packed into one
+        batch of up to 20 sub-requests; each caller gets its own body back, or an
+        `httpx.HTTPStatusError` for a failed item so callers handle errors as with `_get`.
+        """
+        if settings.graph_batch_window_ms <= 0:
+            return await self._get(path_or_url)
+        item = _BatchItem(
+            path=self._normalize_graph_path(path_or_url),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._enqueue_batch_item(item)
+        return await item.future
+
+    def _enqueue_batch_item(self, item: _BatchItem) -> None:
+        self._batch_pending.append(item)
+        if len(self._batch_pending) >= GRAPH_BATCH_MAX:
+            self._flush_batches()
+        elif self._batch_flush_handle is None:
+            self._batch_flush_handle = asyncio.get_running_loop().call_later(
+                settings.graph_batch_window_ms / 1000.0, self._flush_batches
+            )
+
+    def _flush_batches(self) -> None:
+        if self._batch_flush_handle is not None:
+            self._batch_flush_handle.cancel()
+            self._batch_flush_handle = None
+        loop = asyncio.get_running_loop()
+        while self._batch_pending:
+            chunk = self._batch_pending[:GRAPH_BATCH_MAX]
+            del self._batch_pending[:GRAPH_BATCH_MAX]
+            task = loop.create_task(self._send_batch(chunk))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    def _batch_item_error(self, item: _BatchItem, status: int, response: dict[str, Any]) -> httpx.HTTPStatusError:
+        request = httpx.Request("GET", f"{self._graph_endpoint}{item.path}")
+        item_response = httpx.Response(
+            status,
+            json=response.get("body"),
+            headers=response.get("headers") or {},
+            request=request,
+        )
+        return httpx.HTTPStatusError(
+            f"Graph batch item returned {status} for {item.path}",
+            request=request,
+            response=item_response,
+        )
+
+    async def _send_batch(self, chunk: list[_BatchItem]) -> None:
+        requests = [
+            {
+                "id": str(index),
+                "method": "GET",
+                "url": item.path,
+                "headers": {"Prefer": 'IdType="ImmutableId"'},
+            }
+            for index, item in enumerate(chunk)
+        ]
+        try:
+            payload = await self._request("POST", "/$batch", json_body={"requests": requests})
+        except Exception as exc:
+            for item in chunk:
+                if not item.future.done():
+                    item.future.set_exception(exc)
+            return
+
+        responses = {str(resp.get("id")): resp for resp in payload.get("responses", [])}
+        retry: list[_BatchItem] = []
+        backoff_seconds = 0.0
+        for index, item in enumerate(chunk):
+            if item.future.done():
+                continue
+            response = responses.get(str(index))
+            if response is None:
+                item.future.set_exception(RuntimeError(f"Graph batch response missing item for {item.path}"))
+                continue
+            status = int(response.get("status", 500))
+            if status in RETRYABLE_STATUSES and item.attempts < 5:
+                item.attempts += 1
+                item_wait = _retry_after_seconds(response.get("headers")) or min(30.0, 2**item.attempts)
+                if status in THROTTLE_STATUSES:
+                    self.limiter.throttled(mailbox_scope(item.path), item_wait)
+                else:
+                    backoff_seconds = max(backoff_seconds, item_wait)
+                retry.append(item)
+                continue
+            if status >= 400:
+                item.future.set_exception(self._batch_item_error(item, status, response))
+                continue
+            item.future.set_result(response.get("body") or {})
+
+        if retry:
+            logger.warning("graph_batch_retry", extra={"items": len(retry), "wait_s": backoff_seconds})
+            if backoff_seconds:
+                await asyncio.sleep(backoff_seconds)
+            for scope in {mailbox_scope(item.path) for item in retry}:
+                await self.limiter.wait_ready(scope)
+            for item in retry:
+                self._enqueue_batch_item(item)
+
     async def list_items_paged(
         self, path: str, params: dict[str, Any] | None = None
     ) -> AsyncGenerator[dict[str, Any], None]:
@@ -110,4 +441,9 @@ class GraphClient:
             yield data
 
     async def close(self) -> None:
-        await self._client.aclose()
+        if self._batch_pending:
+            self._flush_batches()
+        while self._batch_tasks:
+            await asyncio.gather(*list(self._batch_tasks), return_exceptions=True)
+        if self._owns_client:
+            await self._client.aclose()
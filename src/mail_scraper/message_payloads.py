@@ -0,0 +1,108 @@
+"""Compressed side-table storage for raw Graph message payloads.
+
+With `MESSAGE_PAYLOAD_STORAGE=compressed`, `messages.raw_json` stays empty and each payload is
+kept once in `message_payloads`, compressed with zstd (zlib when `zstandard` is not
+installed) and keyed by message id. A payload whose hash has not changed since the last
+sync is not rewritten. Use `load_message_payload` to read one back on demand.
+"""
+
+import hashlib
+import json
+from typing import Any
+import zlib
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .db import upsert_rows
+from .db_schema import Message, MessagePayload
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+PAYLOAD_STORAGE_MODES = ("inline", "compressed")
+
+
+def payload_storage_mode() -> str:
+    mode = settings.message_payload_storage.lower()
+    if mode not in PAYLOAD_STORAGE_MODES:
+        raise ValueError(
+            f"MESSAGE_PAYLOAD_STORAGE must be one of {', '.join(PAYLOAD_STORAGE_MODES)}, got {mode!r}"
+        )
+    return mode
+
+
+def _canonical_json(payload: dict[str, Any]) -> bytes:
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def payload_sha256(payload: dict[str, Any]) -> str:
+    return hashlib.sha256(_canonical_json(payload)).hexdigest()
+
+
+def encode_payload(payload: dict[str, Any]) -> tuple[str, bytes]:
+    """Return (codec, compressed bytes) for a payload."""
+    raw = _canonical_json(payload)
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(raw)
+    return "zlib", zlib.compress(raw, 6)
+
+
+def decode_payload(codec: str, data: bytes) -> dict[str, Any]:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Payload is zstd-compressed; install zstandard to read it")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    else:
+        raise ValueError(f"Unknown payload codec: {codec}")
+    return json.loads(raw)
+
+
+def store_message_payloads(session: Session, mailbox_id: int, payloads: list[dict[str, Any]]) -> int:
+    """Write compressed payloads for already-upserted messages; returns how many were (re)written."""
+    hashes = {payload["id"]: payload_sha256(payload) for payload in payloads}
+    message_ids = dict(
+        session.execute(
+            select(Message.graph_message_id, Message.id).where(
+                Message.mailbox_id == mailbox_id,
+                Message.graph_message_id.in_(list(hashes)),
+            )
+        ).all()
+    )
+    stored = dict(
+        session.execute(
+            select(MessagePayload.message_id, MessagePayload.payload_sha256).where(
+                MessagePayload.message_id.in_(list(message_ids.values()))
+            )
+        ).all()
+    )
+    rows = []
+    for payload in {payload["id"]: payload for payload in payloads}.values():
+        message_id = message_ids.get(payload["id"])
+        if message_id is None or stored.get(message_id) == hashes[payload["id"]]:
+            continue
+        codec, data = encode_payload(payload)
+        rows.append(
+            {"message_id": message_id, "payload_sha256": hashes[payload["id"]], "codec": codec, "payload": data}
+        )
+    upsert_rows(
+        session,
+        MessagePayload,
+        rows,
+        conflict_columns=["message_id"],
+        update_columns=["payload_sha256", "codec", "payload"],
+    )
+    return len(rows)
+
+
+def load_message_payload(session: Session, message: Message) -> dict[str, Any] | None:
+    """Raw Graph payload for a message, from the side table or the legacy inline column."""
+    row = session.get(MessagePayload, message.id)
+    if row is not None:
+        return decode_payload(row.codec, row.payload)
+    return message.raw_json
@@ -2,30 +2,36 @@ import asyncio
 from datetime import datetime, timedelta
 from pathlib import Path
 from contextlib import nullcontext
+from dataclasses import asdict
 import re
 import hashlib
 import json
+import multiprocessing
+from typing import Any
 
 import pandas as pd
 from sqlalchemy import func, select
 from sqlalchemy.orm import aliased
 
-from .config import settings
+from .config import MailboxConfig, settings
 from .db import bootstrap_mailboxes, db_session, ensure_schema, finish_run, get_engine, rolling_failure_rate, start_run
 from .db_schema import (
     AppUser,
     Actor,
     ActorAlias,
     Attachment,
+    AttachmentWorkItem,
     DeadLetter,
     DecisionScore,
     Document,
     Folder,
+    IngestWorkUnit,
     InvoiceMatch,
     Interaction,
     Mailbox,
     Message,
     PipelineError,
+    PipelineRun,
     PurchaseOrder,
     RfqQuote,
     OrderConfirmation,
@@ -36,8 +42,26 @@ from .db_schema import (
     WorkflowAction,
 )
 from .graph_client import GraphClient
-from .pipeline_attachments import download_attachments_for_mailbox, replay_dead_letters
-from .pipeline_ingest import ingest_mailbox
+from .pipeline_attachments import (
+    download_attachments_for_mailbox,
+    download_work_items,
+    enqueue_attachment_work,
+)
+from .pipeline_ingest import (
+    discover_target_folders,
+    enqueue_folder_work,
+    ingest_mailbox,
+    ingest_work_units,
+    roll_up_folder_checkpoints,
+)
+from .pipeline_replay import replay_dead_letters
+from .work_queue import (
+    claim_work_items,
+    complete_work_item,
+    default_worker_id,
+    heartbeat_forever,
+    release_work_item,
+)
 
 try:
     from matrix_rain import matrix_rain as matrix_rain_context
@@ -111,103 +135,376 @@ def _contains_any(value: str | None, tokens: list[str]) -> bool:
     return any(token in s for token in tokens)
 
 
-async def run_ingest(limit: int | None = None, mailbox_key: str | None = None, matrix: bool = False) -> int:
-    ensure_schema()
-    matrix_ctx = (
-        matrix_rain_context(enabled=True)
-        if matrix and matrix_rain_context is not None
-        else nullcontext()
-    )
+class _ProgressBoard:
+    """Merges per-mailbox status lines into the single matrix status bar."""
+
+    def __init__(self, rain: Any) -> None:
+        self._rain = rain if rain is not None and hasattr(rain, "set_status") else None
+        self._lines: dict[str, str] = {}
+
+    def update(self, mailbox_key: str, text: str | None) -> None:
+        if self._rain is None or text is None:
+            return
+        self._lines[mailbox_key] = text
+        self._rain.set_status(" || ".join(self._lines.values()))
+
+
+def _ingest_status(mailbox_key: str, evt: dict) -> str | None:
+    stage = evt.get("stage", "")
+    if stage == "discovering-folders":
+        return f"discovering folders | mailbox={mailbox_key}"
+    if stage == "folder-tree-cached":
+        return (
+            "cached folder tree "
+            f"| mailbox={mailbox_key} "
+            f"| total={evt.get('total_folders', 0)} "
+            f"| refreshing={'yes' if evt.get('refreshing') else 'no'}"
+        )
+    if stage == "folder-discovery-complete":
+        return (
+            "folders discovered "
+            f"| mailbox={mailbox_key} "
+            f"| total={evt.get('total_folders', 0)} "
+            f"| targeted={evt.get('target_folders', 0)}"
+        )
+    if stage == "ingesting-folders":
+        return (
+            "ingesting "
+            f"| mailbox={mailbox_key} "
+            f"| folders={evt.get('completed_folders', 0)}/{evt.get('target_folders', 0)} "
+            f"| new_msgs={evt.get('processed_messages', 0)} "
+            f"| errors={evt.get('errors', 0)}"
+        )
+    if stage == "completed":
+        return (
+            "completed "
+            f"| mailbox={mailbox_key} "
+            f"| folders={evt.get('target_folders', 0)} "
+            f"| unchanged={evt.get('skipped_folders', 0)} "
+            f"| new_msgs={evt.get('processed_messages', 0)} "
+            f"| errors={evt.get('errors', 0)}"
+        )
+    return None
+
+
+def _attachments_status(mailbox_key: str, evt: dict) -> str | None:
+    stage = evt.get("stage", "")
+    if stage == "attachments-start":
+        return (
+            "attachments start "
+            f"| mailbox={mailbox_key} "
+            f"| messages={evt.get('total_messages', 0)} "
+            f"| resume_pk>{evt.get('resume_after_message_pk', 0)}"
+        )
+    if stage == "attachments-progress":
+        return (
+            "attachments downloading "
+            f"| mailbox={mailbox_key} "
+            f"| files={evt.get('processed_files', 0)} "
+            f"| errors={evt.get('errors', 0)} "
+            f"| skipped={evt.get('skipped', 0)} "
+            f"| scanned={evt.get('scanned_messages', 0)}"
+        )
+    if stage == "attachments-complete":
+        return (
+            "attachments complete "
+            f"| mailbox={mailbox_key} "
+            f"| files={evt.get('processed_files', 0)} "
+            f"| errors={evt.get('errors', 0)} "
+            f"| skipped={evt.get('skipped', 0)} "
+            f"| scanned={evt.get('scanned_messages', 0)}"
+        )
+    return None
+
+
+def _graph_client(client: GraphClient | None) -> Any:
+    """Use the caller's shared client as-is, or open (and later close) a private one."""
+    return nullcontext(client) if client is not None else GraphClient()
+
+
+def _select_mailboxes(mailbox_key: str | None, *, require_match: bool) -> tuple[list[MailboxConfig], dict[str, int]]:
+    """Bootstrap mailbox rows and return the enabled configs to run with their row ids."""
     with db_session() as session:
         mailbox_configs = settings.mailbox_configs()
         mailbox_rows = bootstrap_mailboxes(session, mailbox_configs)
         selected_configs = [cfg for cfg in mailbox_configs if cfg.enabled and (mailbox_key is None or cfg.key == mailbox_key)]
-        if mailbox_key and not selected_configs:
+        if require_match and mailbox_key and not selected_configs:
             raise ValueError(f"Mailbox key not found or disabled: {mailbox_key}")
+        return selected_configs, {cfg.key: mailbox_rows[cfg.key].id for cfg in selected_configs}
+
 
-        total_processed = 0
-        with matrix_ctx as rain:
-            async with GraphClient() as client:
-                for mailbox_cfg in selected_configs:
-                    mailbox_row = mailbox_rows[mailbox_cfg.key]
-                    run = start_run(session, pipeline_name="ingest", mailbox_id=mailbox_row.id)
-                    session.flush()
-                    if rain is not None and hasattr(rain, "set_status"):
-                        rain.set_status(f"starting ingest | mailbox={mailbox_cfg.key}")
-
-                    def on_progress(evt: dict) -> None:
-                        if rain is None or not hasattr(rain, "set_status"):
-                            return
-                        stage = evt.get("stage", "")
-                        if stage == "discovering-folders":
-                            rain.set_status(f"discovering folders | mailbox={mailbox_cfg.key}")
-                            return
-                        if stage == "folder-discovery-complete":
-                            rain.set_status(
-                                "folders discovered "
-                                f"| mailbox={mailbox_cfg.key} "
-                                f"| total={evt.get('total_folders', 0)} "
-                                f"| targeted={evt.get('target_folders', 0)}"
+async def run_ingest(
+    limit: int | None = None,
+    mailbox_key: str | None = None,
+    matrix: bool = False,
+    mailbox_concurrency: int | None = None,
+    workers: int | None = None,
+    client: GraphClient | None = None,
+) -> int:
+    ensure_schema()
+    if workers:
+        return await _run_ingest_sharded(limit=limit, mailbox_key=mailbox_key, workers=workers, client=client)
+    matrix_ctx = (
+        matrix_rain_context(enabled=True)
+        if matrix and matrix_rain_context is not None
+        else nullcontext()
+    )
+    selected_configs, mailbox_ids = _select_mailboxes(mailbox_key, require_match=True)
+    semaphore = asyncio.Semaphore(max(1, mailbox_concurrency or settings.mailbox_concurrency))
+
+    with matrix_ctx as rain:
+        board = _ProgressBoard(rain)
+        async with _graph_client(client) as client:
+
+            async def ingest_one(mailbox_cfg: MailboxConfig) -> int:
+                async with semaphore:
+                    # Each mailbox gets its own session/transaction; the Graph client is shared.
+                    with db_session() as session:
+                        mailbox_row = session.get(Mailbox, mailbox_ids[mailbox_cfg.key])
+                        run = start_run(session, pipeline_name="ingest", mailbox_id=mailbox_row.id)
+                        session.flush()
+                        board.update(mailbox_cfg.key, f"starting ingest | mailbox={mailbox_cfg.key}")
+
+                        def on_progress(evt: dict) -> None:
+                            board.update(mailbox_cfg.key, _ingest_status(mailbox_cfg.key, evt))
+
+                        try:
+                            result = await ingest_mailbox(
+                                client=client,
+                                session=session,
+                                mailbox=mailbox_cfg,
+                                mailbox_row=mailbox_row,
+                                run=run,
+                                hard_limit=limit,
+                                # Folder fan-out only; the client's limiter decides how many requests fly.
+                                max_concurrency=client.limiter.max_concurrency,
+                                progress_cb=on_progress,
                             )
-                            return
-                        if stage == "ingesting-folders":
-                            rain.set_status(
-                                "ingesting "
-                                f"| mailbox={mailbox_cfg.key} "
-                                f"| folders={evt.get('completed_folders', 0)}/{evt.get('target_folders', 0)} "
-                                f"| new_msgs={evt.get('processed_messages', 0)} "
-                                f"| errors={evt.get('errors', 0)}"
+                            finish_run(
+                                session,
+                                run,
+                                status="success" if result.errors == 0 else "partial_success",
+                                processed_count=result.processed,
+                                error_count=result.errors,
                             )
-                            return
-                        if stage == "completed":
-                            rain.set_status(
-                                "completed "
-                                f"| mailbox={mailbox_cfg.key} "
-                                f"| folders={evt.get('target_folders', 0)} "
-                                f"| new_msgs={evt.get('processed_messages', 0)} "
-                                f"| errors={evt.get('errors', 0)}"
+                            run.metadata_json = {
+                                "updated_messages": result.updated,
+                                "skipped_folders": result.skipped_folders,
+                                "stats": result.stats,
+                            }
+                            return result.processed
+                        except Exception as exc:
+                            session.add(
+                                PipelineError(
+                                    run_id=run.id,
+                                    mailbox_id=mailbox_row.id,
+                                    stage="ingest-mailbox",
+                                    error_message=str(exc),
+                                    payload_json={"mailbox_key": mailbox_cfg.key},
+                                )
                             )
+                            session.add(
+                                DeadLetter(
+                                    mailbox_id=mailbox_row.id,
+                                    stage="ingest-mailbox",
+                                    payload_json={"mailbox_key": mailbox_cfg.key},
+                                    error_message=str(exc),
+                                )
+                            )
+                            finish_run(session, run, status="failed", processed_count=0, error_count=1)
+                            return 0
+
+            processed = await asyncio.gather(*(ingest_one(cfg) for cfg in selected_configs))
+    return sum(processed)
+
+
+def _ingest_worker_process(worker_id: str, mailbox_key: str | None, limit: int | None) -> None:
+    asyncio.run(run_ingest_worker(worker_id=worker_id, mailbox_key=mailbox_key, limit=limit))
+
 
-                    try:
-                        result = await ingest_mailbox(
-                            client=client,
-                            session=session,
-                            mailbox=mailbox_cfg,
-                            mailbox_row=mailbox_row,
-                            run=run,
-                            hard_limit=limit,
-                            max_concurrency=settings.graph_max_concurrency,
-                            progress_cb=on_progress,
-                        )
-                        finish_run(
+async def _run_ingest_sharded(
+    limit: int | None, mailbox_key: str | None, workers: int, client: GraphClient | None = None
+) -> int:
+    """Discover folders, queue one work unit per folder, and drain the queue with local worker processes."""
+    selected_configs, mailbox_ids = _select_mailboxes(mailbox_key, require_match=True)
+    queued: dict[int, list[str]] = {}
+    async with _graph_client(client) as client:
+        for mailbox_cfg in selected_configs:
+            with db_session() as session:
+                mailbox_row = session.get(Mailbox, mailbox_ids[mailbox_cfg.key])
+                target_folders = await discover_target_folders(client, session, mailbox_cfg, mailbox_row)
+                queued[mailbox_row.id] = enqueue_folder_work(session, mailbox_row, target_folders)
+
+    # spawn: workers must not inherit the parent's engine, sockets or event loop.
+    context = multiprocessing.get_context("spawn")
+    base_id = default_worker_id()
+    processes = [
+        context.Process(target=_ingest_worker_process, args=(f"{base_id}/{index}", mailbox_key, limit))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    await asyncio.gather(*(asyncio.to_thread(process.join) for process in processes))
+    # A worker that crashed or was killed (e.g. by the OOM killer) never records a failure itself.
+    crashed = [
+        f"{base_id}/{index} (exit code {process.exitcode})"
+        for index, process in enumerate(processes)
+        if process.exitcode != 0
+    ]
+
+    with db_session() as session:
+        processed = 0
+        for mailbox_id, folder_ids in queued.items():
+            roll_up_folder_checkpoints(session, mailbox_id)
+            if not folder_ids:
+                continue
+            processed += session.execute(
+                select(func.coalesce(func.sum(IngestWorkUnit.processed_count), 0)).where(
+                    IngestWorkUnit.mailbox_id == mailbox_id,
+                    IngestWorkUnit.graph_folder_id.in_(folder_ids),
+                    IngestWorkUnit.status == "done",
+                )
+            ).scalar_one()
+    if crashed:
+        raise RuntimeError(
+            f"Ingest worker(s) exited abnormally: {', '.join(crashed)}; "
+            "their leased folders are retried once the leases go stale"
+        )
+    return int(processed)
+
+
+async def _ingest_claimed_units(
+    client: GraphClient,
+    worker_id: str,
+    mailbox_id: int,
+    mailbox_cfg: MailboxConfig,
+    run_id: int,
+    unit_ids: list[int],
+    limit: int | None,
+) -> tuple[int, int]:
+    """Run one mailbox's claimed units in a single transaction; returns (processed, errors)."""
+    try:
+        with db_session() as session:
+            mailbox_row = session.get(Mailbox, mailbox_id)
+            run = session.get(PipelineRun, run_id)
+            # A unit whose lease went stale and was re-claimed elsewhere is no longer ours.
+            units = session.execute(
+                select(IngestWorkUnit).where(
+                    IngestWorkUnit.id.in_(unit_ids),
+                    IngestWorkUnit.lease_owner == worker_id,
+                )
+            ).scalars().all()
+            if not units:
+                return 0, 0
+            result = await ingest_work_units(
+                client=client,
+                session=session,
+                mailbox=mailbox_cfg,
+                mailbox_row=mailbox_row,
+                run=run,
+                units=units,
+                hard_limit=limit,
+                max_concurrency=client.limiter.max_concurrency,
+            )
+            for unit in units:
+                unit.processed_count = result.folder_processed.get(unit.graph_folder_id, 0)
+                complete_work_item(unit)
+            return result.processed, result.errors
+    except Exception as exc:
+        with db_session() as session:
+            units = session.execute(
+                select(IngestWorkUnit).where(
+                    IngestWorkUnit.id.in_(unit_ids),
+                    IngestWorkUnit.lease_owner == worker_id,
+                )
+            ).scalars().all()
+            for unit in units:
+                release_work_item(unit, error=str(exc), max_attempts=settings.work_max_attempts)
+            session.add(
+                PipelineError(
+                    run_id=run_id,
+                    mailbox_id=mailbox_id,
+                    stage="ingest-folder",
+                    error_message=str(exc),
+                    payload_json={
+                        "mailbox_key": mailbox_cfg.key,
+                        "graph_folder_ids": [unit.graph_folder_id for unit in units],
+                    },
+                )
+            )
+        return 0, 1
+
+
+async def run_ingest_worker(
+    worker_id: str | None = None,
+    mailbox_key: str | None = None,
+    limit: int | None = None,
+    client: GraphClient | None = None,
+) -> int:
+    """Claim folder work units until the queue is empty; safe to run on any number of hosts."""
+    ensure_schema()
+    worker_id = worker_id or default_worker_id()
+    selected_configs, mailbox_ids = _select_mailboxes(mailbox_key, require_match=True)
+    configs_by_id = {mailbox_ids[cfg.key]: cfg for cfg in selected_configs}
+    runs: dict[int, int] = {}
+    totals: dict[int, list[int]] = {}
+    async with _graph_client(client) as client:
+        while True:
+            with db_session() as session:
+                claimed = claim_work_items(
+                    session,
+                    IngestWorkUnit,
+                    worker_id,
+                    lease_seconds=settings.work_lease_seconds,
+                    limit=client.limiter.max_concurrency,
+                    filters=[IngestWorkUnit.mailbox_id.in_(list(configs_by_id))],
+                )
+                by_mailbox: dict[int, list[int]] = {}
+                for unit in claimed:
+                    by_mailbox.setdefault(unit.mailbox_id, []).append(unit.id)
+                for mailbox_id in by_mailbox:
+                    if mailbox_id not in runs:
+                        runs[mailbox_id] = start_run(
                             session,
-                            run,
-                            status="success" if result.errors == 0 else "partial_success",
-                            processed_count=result.processed,
-                            error_count=result.errors,
-                        )
-                        total_processed += result.processed
-                    except Exception as exc:
-                        session.add(
-                            PipelineError(
-                                run_id=run.id,
-                                mailbox_id=mailbox_row.id,
-                                stage="ingest-mailbox",
-                                error_message=str(exc),
-                                payload_json={"mailbox_key": mailbox_cfg.key},
-                            )
-                        )
-                        session.add(
-                            DeadLetter(
-                                mailbox_id=mailbox_row.id,
-                                stage="ingest-mailbox",
-                                payload_json={"mailbox_key": mailbox_cfg.key},
-                                error_message=str(exc),
-                            )
-                        )
-                        finish_run(session, run, status="failed", processed_count=0, error_count=1)
-                        continue
-        return total_processed
+                            pipeline_name="ingest",
+                            mailbox_id=mailbox_id,
+                            metadata={"worker_id": worker_id},
+                        ).id
+            if not by_mailbox:
+                break
+
+            heartbeat = asyncio.create_task(
+                heartbeat_forever(
+                    IngestWorkUnit,
+                    [unit_id for unit_ids in by_mailbox.values() for unit_id in unit_ids],
+                    worker_id,
+                    settings.work_lease_seconds,
+                )
+            )
+            try:
+                for mailbox_id, unit_ids in by_mailbox.items():
+                    processed, errors = await _ingest_claimed_units(
+                        client, worker_id, mailbox_id, configs_by_id[mailbox_id], runs[mailbox_id], unit_ids, limit
+                    )
+                    tally = totals.setdefault(mailbox_id, [0, 0])
+                    tally[0] += processed
+                    tally[1] += errors
+            finally:
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
+
+    with db_session() as session:
+        for mailbox_id, run_id in runs.items():
+            processed, errors = totals.get(mailbox_id, [0, 0])
+            roll_up_folder_checkpoints(session, mailbox_id)
+            finish_run(
+                session,
+                session.get(PipelineRun, run_id),
+                status="success" if errors == 0 else "partial_success",
+                processed_count=processed,
+                error_count=errors,
+            )
+    return sum(processed for processed, _ in totals.values())
 
 
 async def run_download_attachments(
@@ -215,6 +512,9 @@ async def run_download_attachments(
     mailbox_key: str | None = None,
     matrix: bool = False,
     batch_size: int | None = None,
+    mailbox_concurrency: int | None = None,
+    client: GraphClient | None = None,
+    force: bool = False,
 ) -> int:
     ensure_schema()
     output_root = Path("raw_data")
@@ -223,98 +523,220 @@ async def run_download_attachments(
         if matrix and matrix_rain_context is not None
         else nullcontext()
     )
-    with db_session() as session:
-        mailbox_configs = settings.mailbox_configs()
-        mailbox_rows = bootstrap_mailboxes(session, mailbox_configs)
-        selected_configs = [cfg for cfg in mailbox_configs if cfg.enabled and (mailbox_key is None or cfg.key == mailbox_key)]
-        total_processed = 0
-        effective_batch_size = max(1, batch_size or settings.attachment_batch_size)
-        with matrix_ctx as rain:
-            async with GraphClient() as client:
-                for mailbox_cfg in selected_configs:
-                    mailbox_row = mailbox_rows[mailbox_cfg.key]
-                    run = start_run(session, pipeline_name="download_attachments", mailbox_id=mailbox_row.id)
-                    session.flush()
-                    if rain is not None and hasattr(rain, "set_status"):
-                        rain.set_status(f"starting attachment download | mailbox={mailbox_cfg.key}")
-
-                    def on_progress(evt: dict) -> None:
-                        if rain is None or not hasattr(rain, "set_status"):
-                            return
-                        stage = evt.get("stage", "")
-                        if stage == "attachments-start":
-                            rain.set_status(
-                                "attachments start "
-                                f"| mailbox={mailbox_cfg.key} "
-                                f"| messages={evt.get('total_messages', 0)} "
-                                f"| resume_pk>{evt.get('resume_after_message_pk', 0)}"
+    selected_configs, mailbox_ids = _select_mailboxes(mailbox_key, require_match=False)
+    effective_batch_size = max(1, batch_size or settings.attachment_batch_size)
+    semaphore = asyncio.Semaphore(max(1, mailbox_concurrency or settings.mailbox_concurrency))
+
+    with matrix_ctx as rain:
+        board = _ProgressBoard(rain)
+        async with _graph_client(client) as client:
+
+            async def download_one(mailbox_cfg: MailboxConfig) -> int:
+                async with semaphore:
+                    with db_session() as session:
+                        mailbox_row = session.get(Mailbox, mailbox_ids[mailbox_cfg.key])
+                        run = start_run(session, pipeline_name="download_attachments", mailbox_id=mailbox_row.id)
+                        session.flush()
+                        board.update(mailbox_cfg.key, f"starting attachment download | mailbox={mailbox_cfg.key}")
+
+                        def on_progress(evt: dict) -> None:
+                            board.update(mailbox_cfg.key, _attachments_status(mailbox_cfg.key, evt))
+
+                        try:
+                            processed, errors, skipped = await download_attachments_for_mailbox(
+                                client=client,
+                                session=session,
+                                mailbox=mailbox_cfg,
+                                mailbox_row=mailbox_row,
+                                run=run,
+                                output_root=output_root,
+                                limit=limit,
+                                batch_size=effective_batch_size,
+                                progress_cb=on_progress,
+                                force=force,
                             )
-                            return
-                        if stage == "attachments-progress":
-                            rain.set_status(
-                                "attachments downloading "
-                                f"| mailbox={mailbox_cfg.key} "
-                                f"| files={evt.get('processed_files', 0)} "
-                                f"| errors={evt.get('errors', 0)} "
-                                f"| skipped={evt.get('skipped', 0)} "
-                                f"| scanned={evt.get('scanned_messages', 0)}"
+                            finish_run(
+                                session,
+                                run,
+                                status="success" if errors == 0 else "partial_success",
+                                processed_count=processed,
+                                error_count=errors,
                             )
-                            return
-                        if stage == "attachments-complete":
-                            rain.set_status(
-                                "attachments complete "
-                                f"| mailbox={mailbox_cfg.key} "
-                                f"| files={evt.get('processed_files', 0)} "
-                                f"| errors={evt.get('errors', 0)} "
-                                f"| skipped={evt.get('skipped', 0)} "
-                                f"| scanned={evt.get('scanned_messages', 0)}"
+                            run.metadata_json = {
+                                "skipped_messages": skipped,
+                                "batch_size": effective_batch_size,
+                            }
+                            return processed
+                        except Exception as exc:
+                            session.add(
+                                PipelineError(
+                                    run_id=run.id,
+                                    mailbox_id=mailbox_row.id,
+                                    stage="download-attachments-mailbox",
+                                    error_message=str(exc),
+                                    payload_json={"mailbox_key": mailbox_cfg.key, "batch_size": effective_batch_size},
+                                )
                             )
+                            session.add(
+                                DeadLetter(
+                                    mailbox_id=mailbox_row.id,
+                                    stage="download-attachments-mailbox",
+                                    payload_json={"mailbox_key": mailbox_cfg.key, "batch_size": effective_batch_size},
+                                    error_message=str(exc),
+                                )
+                            )
+                            finish_run(session, run, status="failed", processed_count=0, error_count=1)
+                            return 0
+
+            processed = await asyncio.gather(*(download_one(cfg) for cfg in selected_configs))
+    return sum(processed)
+
+
+async def _download_claimed_items(
+    client: GraphClient,
+    worker_id: str,
+    mailbox_id: int,
+    mailbox_cfg: MailboxConfig,
+    run_id: int,
+    item_ids: list[int],
+    output_root: Path,
+    force: bool,
+) -> tuple[int, int]:
+    """Download one mailbox's claimed messages; returns (processed, errors)."""
+    try:
+        with db_session() as session:
+            mailbox_row = session.get(Mailbox, mailbox_id)
+            run = session.get(PipelineRun, run_id)
+            # An item whose lease went stale and was re-claimed elsewhere is no longer ours.
+            items = session.execute(
+                select(AttachmentWorkItem).where(
+                    AttachmentWorkItem.id.in_(item_ids),
+                    AttachmentWorkItem.lease_owner == worker_id,
+                )
+            ).scalars().all()
+            if not items:
+                return 0, 0
+            processed, errors, _ = await download_work_items(
+                client=client,
+                session=session,
+                mailbox=mailbox_cfg,
+                mailbox_row=mailbox_row,
+                run=run,
+                output_root=output_root,
+                items=items,
+                force=force,
+                max_attempts=settings.work_max_attempts,
+            )
+            return processed, errors
+    except Exception as exc:
+        with db_session() as session:
+            items = session.execute(
+                select(AttachmentWorkItem).where(
+                    AttachmentWorkItem.id.in_(item_ids),
+                    AttachmentWorkItem.lease_owner == worker_id,
+                )
+            ).scalars().all()
+            for item in items:
+                release_work_item(item, error=str(exc), max_attempts=settings.work_max_attempts)
+            session.add(
+                PipelineError(
+                    run_id=run_id,
+                    mailbox_id=mailbox_id,
+                    stage="download-attachments-mailbox",
+                    error_message=str(exc),
+                    payload_json={"mailbox_key": mailbox_cfg.key, "work_item_ids": item_ids},
+                )
+            )
+        return 0, 1
+
+
+async def run_download_attachments_worker(
+    worker_id: str | None = None,
+    mailbox_key: str | None = None,
+    limit: int | None = None,
+    batch_size: int | None = None,
+    client: GraphClient | None = None,
+    force: bool = False,
+) -> int:
+    """Queue messages with attachments, then lease and download them until the queue is empty.
 
-                    try:
-                        processed, errors, skipped = await download_attachments_for_mailbox(
-                            client=client,
-                            session=session,
-                            mailbox=mailbox_cfg,
-                            mailbox_row=mailbox_row,
-                            run=run,
-                            output_root=output_root,
-                            limit=limit,
-                            batch_size=effective_batch_size,
-                            progress_cb=on_progress,
-                        )
-                        finish_run(
+    Safe to run on any number of hosts against the same database.
+    """
+    ensure_schema()
+    worker_id = worker_id or default_worker_id()
+    output_root = Path("raw_data")
+    selected_configs, mailbox_ids = _select_mailboxes(mailbox_key, require_match=False)
+    configs_by_id = {mailbox_ids[cfg.key]: cfg for cfg in selected_configs}
+    claim_size = max(1, batch_size or settings.attachment_batch_size)
+    with db_session() as session:
+        for mailbox_id in configs_by_id:
+            enqueue_attachment_work(session, session.get(Mailbox, mailbox_id))
+
+    runs: dict[int, int] = {}
+    totals: dict[int, list[int]] = {}
+    async with _graph_client(client) as client:
+        while limit is None or sum(processed for processed, _ in totals.values()) < limit:
+            with db_session() as session:
+                claimed = claim_work_items(
+                    session,
+                    AttachmentWorkItem,
+                    worker_id,
+                    lease_seconds=settings.work_lease_seconds,
+                    limit=claim_size,
+                    filters=[AttachmentWorkItem.mailbox_id.in_(list(configs_by_id))],
+                )
+                by_mailbox: dict[int, list[int]] = {}
+                for item in claimed:
+                    by_mailbox.setdefault(item.mailbox_id, []).append(item.id)
+                for mailbox_id in by_mailbox:
+                    if mailbox_id not in runs:
+                        runs[mailbox_id] = start_run(
                             session,
-                            run,
-                            status="success" if errors == 0 else "partial_success",
-                            processed_count=processed,
-                            error_count=errors,
-                        )
-                        run.metadata_json = {
-                            "skipped_messages": skipped,
-                            "batch_size": effective_batch_size,
-                        }
-                        total_processed += processed
-                    except Exception as exc:
-                        session.add(
-                            PipelineError(
-                                run_id=run.id,
-                                mailbox_id=mailbox_row.id,
-                                stage="download-attachments-mailbox",
-                                error_message=str(exc),
-                                payload_json={"mailbox_key": mailbox_cfg.key, "batch_size": effective_batch_size},
-                            )
-                        )
-                        session.add(
-                            DeadLetter(
-                                mailbox_id=mailbox_row.id,
-                                stage="download-attachments-mailbox",
-                                payload_json={"mailbox_key": mailbox_cfg.key, "batch_size": effective_batch_size},
-                                error_message=str(exc),
-                            )
-                        )
-                        finish_run(session, run, status="failed", processed_count=0, error_count=1)
-                        continue
-        return total_processed
+                            pipeline_name="download_attachments",
+                            mailbox_id=mailbox_id,
+                            metadata={"worker_id": worker_id},
+                        ).id
+            if not by_mailbox:
+                break
+
+            heartbeat = asyncio.create_task(
+                heartbeat_forever(
+                    AttachmentWorkItem,
+                    [item_id for item_ids in by_mailbox.values() for item_id in item_ids],
+                    worker_id,
+                    settings.work_lease_seconds,
+                )
+            )
+            try:
+                for mailbox_id, item_ids in by_mailbox.items():
+                    processed, errors = await _download_claimed_items(
+                        client,
+                        worker_id,
+                        mailbox_id,
+                        configs_by_id[mailbox_id],
+                        runs[mailbox_id],
+                        item_ids,
+                        output_root,
+                        force,
+                    )
+                    tally = totals.setdefault(mailbox_id, [0, 0])
+                    tally[0] += processed
+                    tally[1] += errors
+            finally:
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
+
+    with db_session() as session:
+        for mailbox_id, run_id in runs.items():
+            processed, errors = totals.get(mailbox_id, [0, 0])
+            finish_run(
+                session,
+                session.get(PipelineRun, run_id),
+                status="success" if errors == 0 else "partial_success",
+                processed_count=processed,
+                error_count=errors,
+            )
+    return sum(processed for processed, _ in totals.values())
 
 
 def run_reliability_report(window: int = 20) -> dict[str, float | int]:
@@ -332,10 +754,25 @@ def run_reliability_report(window: int = 20) -> dict[str, float | int]:
         }
 
 
-def run_replay_dead_letters(stage: str | None = None, limit: int = 100) -> int:
+async def run_replay_dead_letters(
+    stage: str | None = None,
+    limit: int = 100,
+    mailbox_key: str | None = None,
+    client: GraphClient | None = None,
+) -> dict[str, int]:
     ensure_schema()
-    with db_session() as session:
-        return replay_dead_letters(session, stage=stage, limit=limit)
+    selected_configs, mailbox_ids = _select_mailboxes(mailbox_key, require_match=True)
+    async with _graph_client(client) as client:
+        with db_session() as session:
+            result = await replay_dead_letters(
+                client,
+                session,
+                {mailbox_ids[cfg.key]: cfg for cfg in selected_configs},
+                stage=stage,
+                limit=limit,
+                output_root=Path("raw_data"),
+            )
+    return asdict(result)
 
 
 def run_audit() -> dict[str, int]:
@@ -353,10 +790,12 @@ def run_audit() -> dict[str, int]:
         }
 
 
-def run_legacy_extract() -> None:
+def run_legacy_extract(workers: int | None = None, file_timeout: float | None = None, use_cache: bool = True) -> None:
     import parse_pdfs_batch
 
-    parse_pdfs_batch.main()
+    parse_pdfs_batch.main(
+        workers=workers, timeout=file_timeout or parse_pdfs_batch.FILE_TIMEOUT_SECONDS, use_cache=use_cache
+    )
 
 
 def run_load_extracted_csv(csv_path: Path = Path("invoice_summary.csv")) -> dict[str, int]:
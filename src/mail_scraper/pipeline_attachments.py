@@ -1,4 +1,6 @@
-from datetime import datetime, timezone
+import asyncio
+from dataclasses import dataclass, field
+import fnmatch
 import hashlib
 import os
 from pathlib import Path
@@ -9,10 +11,12 @@ import httpx
 from sqlalchemy import and_, func, select
 from sqlalchemy.orm import Session
 
-from .attachments import decode_graph_attachment
-from .config import MailboxConfig
+from .blob_store import blob_path, commit_blob, link_blob, staging_path
+from .config import MailboxConfig, settings
+from .db import insert_missing_rows, upsert_rows
 from .db_schema import (
     Attachment,
+    AttachmentWorkItem,
     DeadLetter,
     Mailbox,
     Message,
@@ -20,9 +24,27 @@ from .db_schema import (
     PipelineError,
     PipelineRun,
 )
+from .file_io import fsync_mode, fsync_paths, run_io
 from .graph_client import GraphClient
+from .work_queue import complete_work_item, release_work_item
 
 ProgressCb = Callable[[dict[str, Any]], None]
+# Listing metadata only; content is streamed per file from /$value.
+ATTACHMENT_LIST_QUERY = "$select=id,name,size,contentType"
+FILE_ATTACHMENT_TYPE = "#microsoft.graph.fileAttachment"
+# 11 bound parameters per row keeps each statement well under Postgres' 65535 limit.
+ATTACHMENT_UPSERT_CHUNK = 1000
+_ATTACHMENT_UPDATE_COLUMNS = [
+    "message_id",
+    "graph_message_id",
+    "name",
+    "content_type",
+    "size_bytes",
+    "content_sha256",
+    "file_path",
+    "download_status",
+    "error_message",
+]
 _WIN_RESERVED_NAMES = {
     "CON",
     "PRN",
@@ -86,6 +108,64 @@ def _make_message_dir(output_root: Path, mailbox_key: str, message_pk: int, grap
     return output_root / mailbox_component / f"m{message_pk}_{msg_hash}"
 
 
+def _already_downloaded(row: Attachment | None) -> bool:
+    """True when a previous run stored this attachment and the file on disk is still intact."""
+    if row is None or row.download_status != "success" or not row.file_path or row.size_bytes is None:
+        return False
+    try:
+        return os.stat(row.file_path).st_size == row.size_bytes
+    except OSError:
+        return False
+
+
+def _load_existing_attachments(session: Session, mailbox_id: int, messages: list[Message]) -> dict[str, Attachment]:
+    rows = session.execute(
+        select(Attachment).where(
+            and_(
+                Attachment.mailbox_id == mailbox_id,
+                Attachment.graph_message_id.in_([message.graph_message_id for message in messages]),
+            )
+        )
+    ).scalars().all()
+    return {row.graph_attachment_id: row for row in rows}
+
+
+def _normalize_extension(value: str) -> str:
+    value = value.strip().lower()
+    return value if value.startswith(".") else f".{value}"
+
+
+def _attachment_filter_reason(
+    mailbox: MailboxConfig,
+    name: str | None,
+    content_type: str | None,
+    size: int | None,
+) -> str | None:
+    """Return why the mailbox's attachment rules reject this attachment, or None to download it.
+
+    Content types match as lowercase globs (`image/*`). With include rules set, an attachment must
+    match an included content type or an included extension; excludes and size bounds always apply.
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    extension = os.path.splitext(name or "")[1].lower()
+    include_types = [pattern.lower() for pattern in mailbox.attachment_include_content_types]
+    include_extensions = [_normalize_extension(value) for value in mailbox.attachment_include_extensions]
+    if include_types or include_extensions:
+        type_included = any(fnmatch.fnmatchcase(content_type, pattern) for pattern in include_types)
+        if not type_included and extension not in include_extensions:
+            return f"not included: {content_type or 'unknown type'} {extension or 'no extension'}"
+    for pattern in mailbox.attachment_exclude_content_types:
+        if fnmatch.fnmatchcase(content_type, pattern.lower()):
+            return f"excluded content type {content_type}"
+    if extension and extension in {_normalize_extension(value) for value in mailbox.attachment_exclude_extensions}:
+        return f"excluded extension {extension}"
+    if size is not None and mailbox.attachment_min_size_bytes is not None and size < mailbox.attachment_min_size_bytes:
+        return f"smaller than {mailbox.attachment_min_size_bytes} bytes"
+    if size is not None and mailbox.attachment_max_size_bytes is not None and size > mailbox.attachment_max_size_bytes:
+        return f"larger than {mailbox.attachment_max_size_bytes} bytes"
+    return None
+
+
 def _make_attachment_filename(
     original_name: str | None,
     attachment_id: str,
@@ -104,6 +184,226 @@ def _make_attachment_filename(
     return f"{compact_root}{suffix}{ext}"
 
 
+@dataclass
+class _DownloadedFile:
+    graph_attachment_id: str
+    name: str
+    content_type: str | None
+    file_path: Path
+    size_bytes: int
+    content_sha256: str
+
+
+@dataclass
+class _MessageFetch:
+    """What one worker did for one message; applied to the database by the single writer."""
+
+    message: Message
+    files: list[_DownloadedFile] = field(default_factory=list)
+    # (attachment metadata, reason) for items the mailbox's attachment rules rejected before download.
+    filtered: list[tuple[dict[str, Any], str]] = field(default_factory=list)
+    skipped: int = 0
+    error: Exception | None = None
+
+
+async def _fetch_message_attachments(
+    client: GraphClient,
+    mailbox: MailboxConfig,
+    output_root: Path,
+    message: Message,
+    present: set[str],
+    content_addressed: bool = False,
+    fsync_each: bool = False,
+) -> _MessageFetch:
+    """List one message's attachments and stream the missing ones to disk; never touches the Session."""
+    outcome = _MessageFetch(message=message)
+    try:
+        response = await client.batched_get(
+            f"/users/{mailbox.user_id}/messages/{message.graph_message_id}/attachments?{ATTACHMENT_LIST_QUERY}"
+        )
+        message_dir = _make_message_dir(
+            output_root=output_root,
+            mailbox_key=mailbox.key,
+            message_pk=message.id,
+            graph_message_id=message.graph_message_id,
+        )
+        await run_io(message_dir.mkdir, parents=True, exist_ok=True)
+        for attachment_json in response.get("value", []):
+            graph_attachment_id = attachment_json.get("id")
+            if not graph_attachment_id:
+                continue
+            # Item and reference attachments carry no file content.
+            if attachment_json.get("@odata.type", FILE_ATTACHMENT_TYPE) != FILE_ATTACHMENT_TYPE:
+                continue
+            if graph_attachment_id in present:
+                outcome.skipped += 1
+                continue
+            name = attachment_json.get("name", graph_attachment_id)
+            reason = _attachment_filter_reason(
+                mailbox, name, attachment_json.get("contentType"), attachment_json.get("size")
+            )
+            if reason is not None:
+                outcome.filtered.append((attachment_json, reason))
+                continue
+            file_path = message_dir / _make_attachment_filename(name, graph_attachment_id)
+            # In content-addressed mode the hash names the file, so download to scratch first.
+            target = await run_io(staging_path, output_root) if content_addressed else file_path
+            digest = hashlib.sha256()
+            written = await client.download_to(
+                f"/users/{mailbox.user_id}/messages/{message.graph_message_id}"
+                f"/attachments/{graph_attachment_id}/$value",
+                target,
+                digest=digest,
+                fsync=fsync_each,
+            )
+            if content_addressed:
+                blob = await run_io(commit_blob, target, blob_path(output_root, digest.hexdigest(), file_path.suffix))
+                file_path = await run_io(link_blob, blob, file_path)
+            outcome.files.append(
+                _DownloadedFile(
+                    graph_attachment_id=graph_attachment_id,
+                    name=name,
+                    content_type=attachment_json.get("contentType"),
+                    file_path=file_path,
+                    size_bytes=written,
+                    content_sha256=digest.hexdigest(),
+                )
+            )
+    except Exception as exc:
+        outcome.error = exc
+    return outcome
+
+
+def _record_download_error(
+    session: Session, run: PipelineRun, mailbox_id: int, message: Message, exc: Exception
+) -> None:
+    session.add(
+        PipelineError(
+            run_id=run.id,
+            mailbox_id=mailbox_id,
+            message_graph_id=message.graph_message_id,
+            stage="download-attachments",
+            error_message=str(exc),
+            payload_json={"message_id": message.graph_message_id},
+        )
+    )
+    session.add(
+        DeadLetter(
+            mailbox_id=mailbox_id,
+            stage="download-attachments",
+            payload_json={"message_id": message.graph_message_id},
+            error_message=str(exc),
+        )
+    )
+
+
+def _downloaded_row(mailbox_id: int, message: Message, downloaded: _DownloadedFile) -> dict[str, Any]:
+    return {
+        "mailbox_id": mailbox_id,
+        "graph_attachment_id": downloaded.graph_attachment_id,
+        "message_id": message.id,
+        "graph_message_id": message.graph_message_id,
+        "name": downloaded.name,
+        "content_type": downloaded.content_type,
+        "size_bytes": downloaded.size_bytes,
+        "content_sha256": downloaded.content_sha256,
+        "file_path": str(downloaded.file_path),
+        "download_status": "success",
+        "error_message": None,
+    }
+
+
+def _filtered_row(mailbox_id: int, message: Message, attachment_json: dict[str, Any], reason: str) -> dict[str, Any]:
+    return {
+        "mailbox_id": mailbox_id,
+        "graph_attachment_id": attachment_json["id"],
+        "message_id": message.id,
+        "graph_message_id": message.graph_message_id,
+        "name": attachment_json.get("name"),
+        "content_type": attachment_json.get("contentType"),
+        "size_bytes": attachment_json.get("size"),
+        "content_sha256": None,
+        "file_path": None,
+        "download_status": "filtered",
+        "error_message": reason,
+    }
+
+
+def _upsert_attachment_rows(session: Session, rows: list[dict[str, Any]]) -> None:
+    """Write a batch of attachment rows with one INSERT ... ON CONFLICT per chunk."""
+    for start in range(0, len(rows), ATTACHMENT_UPSERT_CHUNK):
+        upsert_rows(
+            session,
+            Attachment,
+            rows[start : start + ATTACHMENT_UPSERT_CHUNK],
+            conflict_columns=["mailbox_id", "graph_attachment_id"],
+            update_columns=_ATTACHMENT_UPDATE_COLUMNS,
+        )
+
+
+def _message_gone(exc: Exception | None) -> bool:
+    # Message no longer resolvable (moved/deleted); callers treat it as skipped.
+    return isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 404
+
+
+async def _download_batch(
+    client: GraphClient,
+    session: Session,
+    mailbox: MailboxConfig,
+    mailbox_row: Mailbox,
+    output_root: Path,
+    messages: list[Message],
+    *,
+    force: bool,
+    content_addressed: bool,
+    fsync: str,
+    semaphore: asyncio.Semaphore,
+    on_message: Callable[[_MessageFetch], None],
+) -> None:
+    """Fetch a batch of messages concurrently and write their attachment rows; the caller commits.
+
+    Fetch tasks only talk to Graph and the filesystem. This coroutine is the single writer: it
+    applies each outcome as it completes and hands it to `on_message` for counting and bookkeeping.
+    """
+    # One query per batch instead of one per attachment, for the already-downloaded skip.
+    existing = _load_existing_attachments(session, mailbox_row.id, messages)
+    present = set() if force else {key for key, row in existing.items() if _already_downloaded(row)}
+
+    async def fetch(message: Message) -> _MessageFetch:
+        # Concurrent listings coalesce into shared $batch requests inside the client.
+        async with semaphore:
+            return await _fetch_message_attachments(
+                client, mailbox, output_root, message, present, content_addressed, fsync == "file"
+            )
+
+    written_paths: list[Path] = []
+    # Keyed by Graph id: ON CONFLICT cannot touch the same row twice in one statement.
+    pending_rows: dict[str, dict[str, Any]] = {}
+    tasks = [asyncio.create_task(fetch(message)) for message in messages]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            outcome = await next_done
+            for downloaded in outcome.files:
+                pending_rows[downloaded.graph_attachment_id] = _downloaded_row(
+                    mailbox_row.id, outcome.message, downloaded
+                )
+                written_paths.append(downloaded.file_path)
+            for attachment_json, reason in outcome.filtered:
+                pending_rows[attachment_json["id"]] = _filtered_row(
+                    mailbox_row.id, outcome.message, attachment_json, reason
+                )
+            on_message(outcome)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if fsync == "batch" and written_paths:
+        # One flush pass per batch, before the commit that vouches for these files.
+        await run_io(fsync_paths, written_paths)
+    _upsert_attachment_rows(session, list(pending_rows.values()))
+
+
 async def download_attachments_for_mailbox(
     client: GraphClient,
     session: Session,
@@ -114,6 +414,9 @@ async def download_attachments_for_mailbox(
     limit: int | None = None,
     batch_size: int = 500,
     progress_cb: ProgressCb | None = None,
+    force: bool = False,
+    max_concurrency: int | None = None,
+    content_addressed: bool | None = None,
 ) -> tuple[int, int, int]:
     processed = 0
     errors = 0
@@ -136,6 +439,10 @@ async def download_attachments_for_mailbox(
                 "resume_after_message_pk": cursor,
             }
         )
+    semaphore = asyncio.Semaphore(max(1, max_concurrency or settings.attachment_download_concurrency))
+    if content_addressed is None:
+        content_addressed = settings.attachment_content_addressed
+    fsync = fsync_mode()
 
     while True:
         if limit is not None and processed >= limit:
@@ -160,108 +467,26 @@ async def download_attachments_for_mailbox(
         if not messages:
             break
 
-        for message in messages:
-            cursor = message.id
+        # The cursor is a watermark: it only moves past a contiguous run of finished messages.
+        finished: set[int] = set()
+        next_index = 0
+
+        def on_message(outcome: _MessageFetch) -> None:
+            nonlocal processed, errors, skipped, scanned_messages, cursor, next_index
+            message = outcome.message
             scanned_messages += 1
-            try:
-                response = await client._get(
-                    f"/users/{mailbox.user_id}/messages/{message.graph_message_id}/attachments"
-                )
-                message_dir = _make_message_dir(
-                    output_root=output_root,
-                    mailbox_key=mailbox.key,
-                    message_pk=message.id,
-                    graph_message_id=message.graph_message_id,
-                )
-                message_dir.mkdir(parents=True, exist_ok=True)
-                for attachment_json in response.get("value", []):
-                    graph_attachment_id = attachment_json.get("id")
-                    if not graph_attachment_id:
-                        continue
-                    content_bytes = attachment_json.get("contentBytes")
-                    if not content_bytes:
-                        continue
-                    name = attachment_json.get("name", graph_attachment_id)
-                    safe_file_name = _make_attachment_filename(name, graph_attachment_id)
-                    file_path = message_dir / safe_file_name
-                    file_path.write_bytes(decode_graph_attachment(content_bytes))
-
-                    row = session.execute(
-                        select(Attachment).where(
-                            and_(
-                                Attachment.mailbox_id == mailbox_row.id,
-                                Attachment.graph_attachment_id == graph_attachment_id,
-                            )
-                        )
-                    ).scalar_one_or_none()
-                    if row:
-                        row.message_id = message.id
-                        row.graph_message_id = message.graph_message_id
-                        row.name = name
-                        row.content_type = attachment_json.get("contentType")
-                        row.size_bytes = attachment_json.get("size")
-                        row.file_path = str(file_path)
-                        row.download_status = "success"
-                        row.error_message = None
-                    else:
-                        session.add(
-                            Attachment(
-                                mailbox_id=mailbox_row.id,
-                                message_id=message.id,
-                                graph_attachment_id=graph_attachment_id,
-                                graph_message_id=message.graph_message_id,
-                                name=name,
-                                content_type=attachment_json.get("contentType"),
-                                size_bytes=attachment_json.get("size"),
-                                file_path=str(file_path),
-                                download_status="success",
-                            )
-                        )
-                    processed += 1
-            except httpx.HTTPStatusError as exc:
-                if exc.response.status_code == 404:
-                    # Message no longer resolvable (moved/deleted). Treat as skipped.
-                    skipped += 1
-                else:
-                    errors += 1
-                    session.add(
-                        PipelineError(
-                            run_id=run.id,
-                            mailbox_id=mailbox_row.id,
-                            message_graph_id=message.graph_message_id,
-                            stage="download-attachments",
-                            error_message=str(exc),
-                            payload_json={"message_id": message.graph_message_id},
-                        )
-                    )
-                    session.add(
-                        DeadLetter(
-                            mailbox_id=mailbox_row.id,
-                            stage="download-attachments",
-                            payload_json={"message_id": message.graph_message_id},
-                            error_message=str(exc),
-                        )
-                    )
-            except Exception as exc:  # pragma: no cover - error path
+            processed += len(outcome.files)
+            skipped += outcome.skipped + len(outcome.filtered)
+            if _message_gone(outcome.error):
+                skipped += 1
+            elif outcome.error is not None:
                 errors += 1
-                session.add(
-                    PipelineError(
-                        run_id=run.id,
-                        mailbox_id=mailbox_row.id,
-                        message_graph_id=message.graph_message_id,
-                        stage="download-attachments",
-                        error_message=str(exc),
-                        payload_json={"message_id": message.graph_message_id},
-                    )
-                )
-                session.add(
-                    DeadLetter(
-                        mailbox_id=mailbox_row.id,
-                        stage="download-attachments",
-                        payload_json={"message_id": message.graph_message_id},
-                        error_message=str(exc),
-                    )
-                )
+                _record_download_error(session, run, mailbox_row.id, message, outcome.error)
+
+            finished.add(message.id)
+            while next_index < len(messages) and messages[next_index].id in finished:
+                cursor = messages[next_index].id
+                next_index += 1
 
             if progress_cb:
                 progress_cb(
@@ -277,6 +502,19 @@ async def download_attachments_for_mailbox(
                     }
                 )
 
+        await _download_batch(
+            client,
+            session,
+            mailbox,
+            mailbox_row,
+            output_root,
+            messages,
+            force=force,
+            content_addressed=content_addressed,
+            fsync=fsync,
+            semaphore=semaphore,
+            on_message=on_message,
+        )
         checkpoint.progress_cursor = {
             "last_message_pk": cursor,
             "scanned_messages": scanned_messages,
@@ -300,14 +538,115 @@ async def download_attachments_for_mailbox(
     return processed, errors, skipped
 
 
-def replay_dead_letters(session: Session, stage: str | None = None, limit: int = 100) -> int:
-    query = select(DeadLetter).where(DeadLetter.resolved_at.is_(None))
-    if stage:
-        query = query.where(DeadLetter.stage == stage)
-    rows = session.execute(query.order_by(DeadLetter.id.asc()).limit(limit)).scalars().all()
-    now = datetime.now(timezone.utc)
-    for row in rows:
-        row.attempts += 1
-        row.last_seen_at = now
-        row.resolved_at = now
-    return len(rows)
+def enqueue_attachment_work(session: Session, mailbox_row: Mailbox) -> int:
+    """Queue one work item per message with attachments that is not queued yet; returns how many were added.
+
+    Safe to run from several workers at once: rows that another worker queued first are skipped.
+    """
+    queued = select(AttachmentWorkItem.message_id).where(AttachmentWorkItem.mailbox_id == mailbox_row.id)
+    message_ids = (
+        session.execute(
+            select(Message.id)
+            .where(
+                Message.mailbox_id == mailbox_row.id,
+                Message.has_attachments.is_(True),
+                Message.id.not_in(queued),
+            )
+            .order_by(Message.id.asc())
+        )
+        .scalars()
+        .all()
+    )
+    rows = [
+        {"mailbox_id": mailbox_row.id, "message_id": message_id, "status": "pending", "attempts": 0}
+        for message_id in message_ids
+    ]
+    added = 0
+    for start in range(0, len(rows), ATTACHMENT_UPSERT_CHUNK):
+        added += insert_missing_rows(
+            session,
+            AttachmentWorkItem,
+            rows[start : start + ATTACHMENT_UPSERT_CHUNK],
+            conflict_columns=["mailbox_id", "message_id"],
+        )
+    session.commit()
+    return added
+
+
+async def download_work_items(
+    client: GraphClient,
+    session: Session,
+    mailbox: MailboxConfig,
+    mailbox_row: Mailbox,
+    run: PipelineRun,
+    output_root: Path,
+    items: list[AttachmentWorkItem],
+    *,
+    force: bool = False,
+    max_attempts: int = 3,
+) -> tuple[int, int, int]:
+    """Download the messages behind leased work items and complete or release each item.
+
+    A failed message is released for another attempt; its dead letter is only written once
+    the item has used up `max_attempts`. Returns (processed, errors, skipped).
+    """
+    if not items:
+        return 0, 0, 0
+    processed = 0
+    errors = 0
+    skipped = 0
+    items_by_message = {item.message_id: item for item in items}
+    # Work items cascade away with their message, so every item still has one.
+    messages = (
+        session.execute(select(Message).where(Message.id.in_(list(items_by_message))).order_by(Message.id.asc()))
+        .scalars()
+        .all()
+    )
+    def on_message(outcome: _MessageFetch) -> None:
+        nonlocal processed, errors, skipped
+        item = items_by_message[outcome.message.id]
+        processed += len(outcome.files)
+        skipped += outcome.skipped + len(outcome.filtered)
+        if _message_gone(outcome.error):
+            skipped += 1
+        if outcome.error is None or _message_gone(outcome.error):
+            item.processed_count = len(outcome.files)
+            complete_work_item(item)
+            return
+        errors += 1
+        release_work_item(item, error=str(outcome.error), max_attempts=max_attempts)
+        session.add(
+            PipelineError(
+                run_id=run.id,
+                mailbox_id=mailbox_row.id,
+                message_graph_id=outcome.message.graph_message_id,
+                stage="download-attachments",
+                error_message=str(outcome.error),
+                payload_json={"message_id": outcome.message.graph_message_id, "attempt": item.attempts},
+            )
+        )
+        if item.status == "failed":
+            session.add(
+                DeadLetter(
+                    mailbox_id=mailbox_row.id,
+                    stage="download-attachments",
+                    payload_json={"message_id": outcome.message.graph_message_id},
+                    error_message=str(outcome.error),
+                )
+            )
+
+    await _download_batch(
+        client,
+        session,
+        mailbox,
+        mailbox_row,
+        output_root,
+        messages,
+        force=force,
+        content_addressed=settings.attachment_content_addressed,
+        fsync=fsync_mode(),
+        semaphore=asyncio.Semaphore(max(1, settings.attachment_download_concurrency)),
+        on_message=on_message,
+    )
+    session.commit()
+    return processed, errors, skipped
@@ -1,19 +1,38 @@
 import asyncio
-from dataclasses import dataclass
-from datetime import datetime, timezone
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 import re
-from typing import Any, Callable
+import time
+from typing import Any, AsyncIterator, Callable
 
-from sqlalchemy import and_, select
+import httpx
+from sqlalchemy import and_, delete, func, select
 from sqlalchemy.orm import Session
 
-from .config import MailboxConfig
-from .db_schema import DeadLetter, Folder, Mailbox, Message, PipelineCheckpoint, PipelineError, PipelineRun
+from .config import MailboxConfig, settings
+from .db import upsert_rows
+from .db_schema import (
+    DeadLetter,
+    Folder,
+    IngestWorkUnit,
+    Mailbox,
+    Message,
+    PipelineCheckpoint,
+    PipelineError,
+    PipelineRun,
+)
 from .graph_client import GraphClient
+from .message_payloads import payload_storage_mode, store_message_payloads
 
 SELECT_FIELDS = "$select=id,from,subject,receivedDateTime,bodyPreview,hasAttachments,conversationId,parentFolderId"
 PAGE_SIZE = "$top=50"
+# messages/delta ignores $top; page size is negotiated through the Prefer header instead.
+DELTA_PAGE_PREFER = "odata.maxpagesize=50"
+# childFolders honours $top up to 999, which turns most listings into a single page.
+FOLDER_PAGE_SIZE = "$top=999"
 ProgressCb = Callable[[dict[str, Any]], None]
+FolderCb = Callable[[dict[str, Any]], None]
 
 
 def _to_dt(value: str | None) -> datetime | None:
@@ -35,65 +54,109 @@ def _path_matches(path_parts: list[str], include_filters: list[str], exclude_fil
     return True
 
 
-async def _list_all_folders(client: GraphClient, mailbox: MailboxConfig) -> list[dict[str, Any]]:
+def _folder_dict(folder: dict[str, Any], path_parts: list[str], parent_id: str | None) -> dict[str, Any]:
+    return {
+        "id": folder["id"],
+        "path_parts": path_parts,
+        "display_name": path_parts[-1],
+        "parent_id": parent_id,
+        "total_item_count": folder.get("totalItemCount", 0),
+        "unread_item_count": folder.get("unreadItemCount", 0),
+    }
+
+
+def _next_link(resp: dict[str, Any]) -> str | None:
+    url = resp.get("@odata.nextLink")
+    return url.split("v1.0")[-1] if url else None
+
+
+async def _list_all_folders(
+    client: GraphClient, mailbox: MailboxConfig, on_folder: FolderCb | None = None
+) -> list[dict[str, Any]]:
+    """Discover the folder tree breadth-first with a bounded pool of listing workers.
+
+    Each folder is reported to `on_folder` as soon as it is seen, so callers can start pulling
+    messages while deeper levels are still being listed.
+    """
     if mailbox.traversal_mode.lower() == "active_jobs":
-        return await _list_active_jobs_folders(client, mailbox)
+        return await _list_active_jobs_folders(client, mailbox, on_folder)
 
     out: list[dict[str, Any]] = []
+
+    def found(folder_data: dict[str, Any]) -> None:
+        out.append(folder_data)
+        if on_folder:
+            on_folder(folder_data)
+
     root = await client._get(f"/users/{mailbox.user_id}/mailFolders/{mailbox.root_folder_name}")
-    out.append(
-        {
-            "id": root["id"],
-            "path_parts": [mailbox.root_folder_name],
-            "display_name": root.get("displayName", mailbox.root_folder_name),
-            "parent_id": None,
-            "total_item_count": root.get("totalItemCount", 0),
-        }
-    )
+    root_data = _folder_dict(root, [mailbox.root_folder_name], None)
+    root_data["display_name"] = root.get("displayName", mailbox.root_folder_name)
+    found(root_data)
 
-    async def walk(folder_id: str, path_parts: list[str], depth: int) -> None:
+    pending: asyncio.Queue[tuple[str, list[str], int]] = asyncio.Queue()
+    failures: list[Exception] = []
+
+    def schedule(folder: dict[str, Any], path_parts: list[str], depth: int) -> None:
         if mailbox.max_folder_depth is not None and depth >= mailbox.max_folder_depth:
             return
-        url = f"/users/{mailbox.user_id}/mailFolders/{folder_id}/childFolders"
+        # Leaf folders (the vast majority of job folders) need no childFolders request at all.
+        if folder.get("childFolderCount", 1) == 0:
+            return
+        pending.put_nowait((folder["id"], path_parts, depth))
+
+    async def list_children(folder_id: str, path_parts: list[str], depth: int) -> None:
+        url: str | None = f"/users/{mailbox.user_id}/mailFolders/{folder_id}/childFolders?{FOLDER_PAGE_SIZE}"
         while url:
-            resp = await client._get(url)
+            # Sibling listings from concurrent workers coalesce into shared $batch requests.
+            resp = await client.batched_get(url)
             for child in resp.get("value", []):
                 child_path = path_parts + [child.get("displayName", "")]
-                out.append(
-                    {
-                        "id": child["id"],
-                        "path_parts": child_path,
-                        "display_name": child.get("displayName", ""),
-                        "parent_id": folder_id,
-                        "total_item_count": child.get("totalItemCount", 0),
-                    }
-                )
-                await walk(child["id"], child_path, depth + 1)
-            url = resp.get("@odata.nextLink")
-            if url:
-                url = url.split("v1.0")[-1]
+                found(_folder_dict(child, child_path, folder_id))
+                schedule(child, child_path, depth + 1)
+            url = _next_link(resp)
+
+    async def worker() -> None:
+        while True:
+            folder_id, path_parts, depth = await pending.get()
+            try:
+                if not failures:
+                    await list_children(folder_id, path_parts, depth)
+            except Exception as exc:
+                failures.append(exc)
+            finally:
+                pending.task_done()
 
-    await walk(root["id"], [mailbox.root_folder_name], depth=1)
+    schedule(root, [mailbox.root_folder_name], depth=1)
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, settings.folder_discovery_concurrency))]
+    try:
+        await pending.join()
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    if failures:
+        raise failures[0]
     return out
 
 
-async def _list_active_jobs_folders(client: GraphClient, mailbox: MailboxConfig) -> list[dict[str, Any]]:
+async def _list_active_jobs_folders(
+    client: GraphClient, mailbox: MailboxConfig, on_folder: FolderCb | None = None
+) -> list[dict[str, Any]]:
     """Optimized traversal for Active Jobs -> Location -> Job folder structure."""
     out: list[dict[str, Any]] = []
+
+    def found(folder_data: dict[str, Any]) -> None:
+        out.append(folder_data)
+        if on_folder:
+            on_folder(folder_data)
+
     root = await client._get(f"/users/{mailbox.user_id}/mailFolders/{mailbox.root_folder_name}")
     root_name = root.get("displayName", mailbox.root_folder_name)
-    out.append(
-        {
-            "id": root["id"],
-            "path_parts": [root_name],
-            "display_name": root_name,
-            "parent_id": None,
-            "total_item_count": root.get("totalItemCount", 0),
-        }
-    )
+    found(_folder_dict(root, [root_name], None))
 
     # Level 1: locations (e.g., North Carolina, Nova, Richmond)
-    location_url = f"/users/{mailbox.user_id}/mailFolders/{root['id']}/childFolders"
+    locations: list[tuple[dict[str, Any], str]] = []
+    location_url: str | None = f"/users/{mailbox.user_id}/mailFolders/{root['id']}/childFolders?{FOLDER_PAGE_SIZE}"
     while location_url:
         loc_resp = await client._get(location_url)
         for location in loc_resp.get("value", []):
@@ -102,45 +165,28 @@ async def _list_active_jobs_folders(client: GraphClient, mailbox: MailboxConfig)
                 token.lower() in location_name.lower() for token in mailbox.location_filters
             ):
                 continue
-            location_path = [root_name, location_name]
-            out.append(
-                {
-                    "id": location["id"],
-                    "path_parts": location_path,
-                    "display_name": location_name,
-                    "parent_id": root["id"],
-                    "total_item_count": location.get("totalItemCount", 0),
-                }
-            )
+            found(_folder_dict(location, [root_name, location_name], root["id"]))
+            locations.append((location, location_name))
+        location_url = _next_link(loc_resp)
 
-            # Level 2: job folders under each location.
-            job_url = f"/users/{mailbox.user_id}/mailFolders/{location['id']}/childFolders"
-            while job_url:
-                job_resp = await client._get(job_url)
-                for job in job_resp.get("value", []):
-                    job_name = job.get("displayName", "")
-                    if not re.match(mailbox.job_folder_regex, job_name):
-                        continue
-                    out.append(
-                        {
-                            "id": job["id"],
-                            "path_parts": [root_name, location_name, job_name],
-                            "display_name": job_name,
-                            "parent_id": location["id"],
-                            "total_item_count": job.get("totalItemCount", 0),
-                        }
-                    )
-                job_url = job_resp.get("@odata.nextLink")
-                if job_url:
-                    job_url = job_url.split("v1.0")[-1]
+    # Level 2: job folders under each location. Locations are listed concurrently so their
+    # childFolders pages coalesce into shared $batch requests.
+    async def list_jobs(location: dict[str, Any], location_name: str) -> None:
+        job_url: str | None = f"/users/{mailbox.user_id}/mailFolders/{location['id']}/childFolders?{FOLDER_PAGE_SIZE}"
+        while job_url:
+            job_resp = await client.batched_get(job_url)
+            for job in job_resp.get("value", []):
+                job_name = job.get("displayName", "")
+                if not re.match(mailbox.job_folder_regex, job_name):
+                    continue
+                found(_folder_dict(job, [root_name, location_name, job_name], location["id"]))
+            job_url = _next_link(job_resp)
 
-        location_url = loc_resp.get("@odata.nextLink")
-        if location_url:
-            location_url = location_url.split("v1.0")[-1]
+    await asyncio.gather(*(list_jobs(location, name) for location, name in locations))
     return out
 
 
-def _upsert_folder(session: Session, mailbox_row: Mailbox, folder_data: dict[str, Any]) -> None:
+def _upsert_folder(session: Session, mailbox_row: Mailbox, folder_data: dict[str, Any]) -> Folder:
     existing = session.execute(
         select(Folder).where(
             and_(
@@ -154,56 +200,83 @@ def _upsert_folder(session: Session, mailbox_row: Mailbox, folder_data: dict[str
         existing.display_name = folder_data["display_name"]
         existing.parent_graph_folder_id = folder_data["parent_id"]
         existing.total_item_count = folder_data["total_item_count"]
-        return
-    session.add(
-        Folder(
-            mailbox_id=mailbox_row.id,
-            graph_folder_id=folder_data["id"],
-            parent_graph_folder_id=folder_data["parent_id"],
-            display_name=folder_data["display_name"],
-            path="/".join(folder_data["path_parts"]),
-            total_item_count=folder_data["total_item_count"],
-        )
+        existing.unread_item_count = folder_data.get("unread_item_count", 0)
+        return existing
+    folder = Folder(
+        mailbox_id=mailbox_row.id,
+        graph_folder_id=folder_data["id"],
+        parent_graph_folder_id=folder_data["parent_id"],
+        display_name=folder_data["display_name"],
+        path="/".join(folder_data["path_parts"]),
+        total_item_count=folder_data["total_item_count"],
+        unread_item_count=folder_data.get("unread_item_count", 0),
     )
+    session.add(folder)
+    return folder
 
 
-def _upsert_message(session: Session, mailbox_id: int, payload: dict[str, Any]) -> bool:
-    existing = session.execute(
-        select(Message).where(
+_MESSAGE_UPDATE_COLUMNS = [
+    "graph_folder_id",
+    "conversation_id",
+    "source_sender",
+    "source_subject",
+    "source_received_at",
+    "body_preview",
+    "has_attachments",
+    "raw_json",
+]
+
+
+def _message_row(mailbox_id: int, payload: dict[str, Any]) -> dict[str, Any]:
+    sender = ((payload.get("from") or {}).get("emailAddress") or {}).get("address")
+    return {
+        "mailbox_id": mailbox_id,
+        "graph_message_id": payload["id"],
+        "graph_folder_id": payload.get("parentFolderId"),
+        "conversation_id": payload.get("conversationId"),
+        "source_sender": sender,
+        "source_subject": payload.get("subject"),
+        "source_received_at": _to_dt(payload.get("receivedDateTime")),
+        "body_preview": payload.get("bodyPreview"),
+        "has_attachments": bool(payload.get("hasAttachments")),
+        "raw_json": payload,
+    }
+
+
+def _upsert_messages(session: Session, mailbox_id: int, payloads: list[dict[str, Any]]) -> tuple[int, int]:
+    """Upsert a page of Graph messages in one statement; returns (inserted, updated)."""
+    # ON CONFLICT cannot touch the same row twice in one statement, so keep the last copy.
+    rows = list({payload["id"]: _message_row(mailbox_id, payload) for payload in payloads}.values())
+    compressed = payload_storage_mode() == "compressed"
+    if compressed:
+        # The payload lives in message_payloads; clearing the column also drops inline copies from older runs.
+        for row in rows:
+            row["raw_json"] = None
+    inserted = upsert_rows(
+        session,
+        Message,
+        rows,
+        conflict_columns=["mailbox_id", "graph_message_id"],
+        update_columns=_MESSAGE_UPDATE_COLUMNS,
+    )
+    if compressed:
+        store_message_payloads(session, mailbox_id, payloads)
+    return inserted, len(rows) - inserted
+
+
+def _remove_message(session: Session, mailbox_id: int, folder_id: str, graph_message_id: str) -> bool:
+    # Only drop the row while it still belongs to this folder; a move shows up as a removal
+    # here and an add in the destination folder, which may already have been applied.
+    result = session.execute(
+        delete(Message).where(
             and_(
                 Message.mailbox_id == mailbox_id,
-                Message.graph_message_id == payload["id"],
+                Message.graph_message_id == graph_message_id,
+                Message.graph_folder_id == folder_id,
             )
         )
-    ).scalar_one_or_none()
-    sender = ((payload.get("from") or {}).get("emailAddress") or {}).get("address")
-    received = _to_dt(payload.get("receivedDateTime"))
-    if existing:
-        existing.graph_folder_id = payload.get("parentFolderId")
-        existing.conversation_id = payload.get("conversationId")
-        existing.source_sender = sender
-        existing.source_subject = payload.get("subject")
-        existing.source_received_at = received
-        existing.body_preview = payload.get("bodyPreview")
-        existing.has_attachments = bool(payload.get("hasAttachments"))
-        existing.raw_json = payload
-        return False
-
-    session.add(
-        Message(
-            mailbox_id=mailbox_id,
-            graph_message_id=payload["id"],
-            graph_folder_id=payload.get("parentFolderId"),
-            conversation_id=payload.get("conversationId"),
-            source_sender=sender,
-            source_subject=payload.get("subject"),
-            source_received_at=received,
-            body_preview=payload.get("bodyPreview"),
-            has_attachments=bool(payload.get("hasAttachments")),
-            raw_json=payload,
-        )
     )
-    return True
+    return bool(result.rowcount)
 
 
 def _get_or_create_checkpoint(session: Session, mailbox_id: int, pipeline_name: str) -> PipelineCheckpoint:
@@ -228,92 +301,453 @@ class IngestResult:
     processed: int
     errors: int
     max_received_at: datetime | None
+    removed: int = 0
+    delta_link: str | None = None
+    updated: int = 0
+    stats: dict[str, Any] | None = None
+    synced_folders: int = 0
+    skipped_folders: int = 0
+    # New messages per pulled folder id, so sharded ingest can credit each work unit.
+    folder_processed: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class IngestStats:
+    """Per-stage counters so fetch and write throughput can be compared side by side."""
+
+    pages_fetched: int = 0
+    messages_fetched: int = 0
+    fetch_seconds: float = 0.0
+    backpressure_seconds: float = 0.0
+    rows_written: int = 0
+    write_batches: int = 0
+    write_seconds: float = 0.0
+
+    def as_dict(self, elapsed_seconds: float) -> dict[str, Any]:
+        elapsed = max(elapsed_seconds, 1e-6)
+        return {
+            "pages_fetched": self.pages_fetched,
+            "messages_fetched": self.messages_fetched,
+            "fetch_seconds": round(self.fetch_seconds, 3),
+            "backpressure_seconds": round(self.backpressure_seconds, 3),
+            "rows_written": self.rows_written,
+            "write_batches": self.write_batches,
+            "write_seconds": round(self.write_seconds, 3),
+            "elapsed_seconds": round(elapsed_seconds, 3),
+            "fetched_per_sec": round(self.messages_fetched / elapsed, 1),
+            "written_per_sec": round(self.rows_written / elapsed, 1),
+        }
+
+
+@dataclass
+class _FolderPage:
+    folder_id: str
+    messages: list[dict[str, Any]]
+    removed_ids: list[str] = field(default_factory=list)
+    # Link to resume this folder from once this page (and all earlier ones) are written.
+    resume_link: str | None = None
+    final: bool = False
+
+
+@dataclass
+class _FolderState:
+    folder_data: dict[str, Any]
+    max_received_at: datetime | None
+    delta_link: str | None = None
+    pending_link: str | None = None
+    # Messages taken off pages for writing; `hard_limit` caps this per folder.
+    accepted: int = 0
+    inserted: int = 0
+    updated: int = 0
+    removed: int = 0
+    errors: int = 0
+    stopped: bool = False
+    done: bool = False
+
+    def result(self) -> IngestResult:
+        return IngestResult(
+            processed=self.inserted,
+            errors=self.errors,
+            max_received_at=self.max_received_at,
+            removed=self.removed,
+            delta_link=self.delta_link,
+            updated=self.updated,
+        )
+
+
+def _record_ingest_error(
+    session: Session, run: PipelineRun, mailbox_id: int, message_json: dict[str, Any], exc: Exception
+) -> None:
+    session.add(
+        PipelineError(
+            run_id=run.id,
+            mailbox_id=mailbox_id,
+            message_graph_id=message_json.get("id"),
+            stage="ingest-message",
+            error_message=str(exc),
+            payload_json=message_json,
+        )
+    )
+    session.add(
+        DeadLetter(
+            mailbox_id=mailbox_id,
+            stage="ingest-message",
+            payload_json=message_json,
+            error_message=str(exc),
+        )
+    )
+
+
+class _IngestWriter:
+    """Single consumer that owns the Session while folder producers only talk to Graph.
+
+    Pages arrive on a bounded queue, so producers block (backpressure) when the database
+    falls behind. Writes run in a worker thread so in-flight HTTP keeps moving meanwhile.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        run: PipelineRun,
+        mailbox_id: int,
+        hard_limit: int | None,
+        on_folder_done: Callable[["_FolderState"], None] | None = None,
+    ) -> None:
+        self.session = session
+        self.run = run
+        self.mailbox_id = mailbox_id
+        self.hard_limit = hard_limit
+        self.on_folder_done = on_folder_done
+        self.queue: asyncio.Queue[_FolderPage | None] = asyncio.Queue(maxsize=max(1, settings.ingest_queue_pages))
+        self.stats = IngestStats()
+        self.folders: dict[str, _FolderState] = {}
+        self.error: BaseException | None = None
+        self._pending: list[tuple[str, dict[str, Any]]] = []
+        self._pending_folders: set[str] = set()
+        # SQLite connections are bound to their creating thread, so only offload real servers.
+        self._threaded = session.get_bind().dialect.name != "sqlite"
+        # Folder upserts from discovery share the Session with message writes; never overlap them.
+        self._db_lock = asyncio.Lock()
+
+    def add_folder(self, folder_data: dict[str, Any], checkpoint_at: datetime | None, delta_link: str | None) -> None:
+        self.folders[folder_data["id"]] = _FolderState(
+            folder_data=folder_data,
+            max_received_at=checkpoint_at,
+            delta_link=delta_link,
+        )
+
+    def stopped(self, folder_id: str) -> bool:
+        return self.folders[folder_id].stopped or self.error is not None
+
+    async def fetch(self, awaitable: Any) -> dict[str, Any]:
+        started = time.monotonic()
+        resp = await awaitable
+        self.stats.fetch_seconds += time.monotonic() - started
+        self.stats.pages_fetched += 1
+        self.stats.messages_fetched += len(resp.get("value", []))
+        return resp
+
+    async def put(self, page: _FolderPage) -> None:
+        if self.error is not None:
+            raise RuntimeError("ingest writer failed") from self.error
+        started = time.monotonic()
+        await self.queue.put(page)
+        self.stats.backpressure_seconds += time.monotonic() - started
+
+    async def run_db(self, fn: Callable[..., Any], *args: Any) -> Any:
+        async with self._db_lock:
+            if self._threaded:
+                return await asyncio.to_thread(fn, *args)
+            return fn(*args)
+
+    async def drain(self) -> None:
+        try:
+            while True:
+                page = await self.queue.get()
+                if page is None:
+                    break
+                await self._accept(page)
+                if len(self._pending) >= settings.ingest_write_buffer_size or self.queue.empty():
+                    await self._flush()
+            await self._flush()
+        except BaseException as exc:
+            self.error = exc
+            # Keep draining so producers blocked on a full queue can observe the failure.
+            while True:
+                page = await self.queue.get()
+                if page is None:
+                    break
+            raise
+
+    async def _accept(self, page: _FolderPage) -> None:
+        state = self.folders[page.folder_id]
+        self._pending_folders.add(page.folder_id)
+        if page.final:
+            state.done = True
+        if state.stopped:
+            # Pages queued before the producer saw the limit are left for the next run.
+            return
+        if page.removed_ids:
+            # An add still in the buffer would otherwise be written back after the delete.
+            removed_ids = set(page.removed_ids)
+            kept = [
+                (folder_id, payload)
+                for folder_id, payload in self._pending
+                if folder_id != page.folder_id or payload["id"] not in removed_ids
+            ]
+            state.accepted -= len(self._pending) - len(kept)
+            self._pending = kept
+            removed = await self.run_db(self._remove_sync, page.folder_id, page.removed_ids)
+            state.removed += removed
+        messages = page.messages
+        if self.hard_limit:
+            messages = messages[: max(0, self.hard_limit - state.accepted)]
+        state.accepted += len(messages)
+        self._pending.extend((page.folder_id, payload) for payload in messages)
+        if len(messages) < len(page.messages):
+            # A trimmed page is not fully written, so the next run has to resume from its start.
+            state.stopped = True
+            return
+        if page.resume_link:
+            state.pending_link = page.resume_link
+        # Stop fetching as soon as the quota is queued; a folder that ends right on it is fully synced.
+        if self.hard_limit and state.accepted >= self.hard_limit and not page.final:
+            state.stopped = True
+
+    async def _flush(self) -> None:
+        if self._pending:
+            batch, self._pending = self._pending, []
+            started = time.monotonic()
+            await self.run_db(self._write_sync, batch)
+            self.stats.write_seconds += time.monotonic() - started
+            self.stats.write_batches += 1
+            self.stats.rows_written += len(batch)
+        touched, self._pending_folders = self._pending_folders, set()
+        for folder_id in touched:
+            state = self.folders[folder_id]
+            # Everything up to the page that carried this link is now written.
+            if state.pending_link:
+                state.delta_link = state.pending_link
+                state.pending_link = None
+            if state.done and self.on_folder_done:
+                self.on_folder_done(state)
+
+    def _remove_sync(self, folder_id: str, graph_message_ids: list[str]) -> int:
+        return sum(
+            1
+            for graph_message_id in graph_message_ids
+            if _remove_message(self.session, self.mailbox_id, folder_id, graph_message_id)
+        )
+
+    def _write_sync(self, batch: list[tuple[str, dict[str, Any]]]) -> None:
+        try:
+            with self.session.begin_nested():
+                _upsert_messages_tracked(self.session, self.mailbox_id, batch, self.folders)
+            return
+        except Exception:
+            pass
+        # One bad payload fails the whole statement; retry row by row to isolate it.
+        for folder_id, payload in batch:
+            try:
+                with self.session.begin_nested():
+                    _upsert_messages_tracked(self.session, self.mailbox_id, [(folder_id, payload)], self.folders)
+            except Exception as exc:  # pragma: no cover - error path
+                self.folders[folder_id].errors += 1
+                _record_ingest_error(self.session, self.run, self.mailbox_id, payload, exc)
+
+
+def _upsert_messages_tracked(
+    session: Session,
+    mailbox_id: int,
+    batch: list[tuple[str, dict[str, Any]]],
+    folders: dict[str, _FolderState],
+) -> None:
+    by_folder: dict[str, list[dict[str, Any]]] = {}
+    for folder_id, payload in batch:
+        by_folder.setdefault(folder_id, []).append(payload)
+    written: list[tuple[str, list[dict[str, Any]], int, int]] = []
+    for folder_id, payloads in by_folder.items():
+        inserted, updated = _upsert_messages(session, mailbox_id, payloads)
+        written.append((folder_id, payloads, inserted, updated))
+    # Only account once every statement in the savepoint has succeeded.
+    for folder_id, payloads, inserted, updated in written:
+        state = folders[folder_id]
+        state.inserted += inserted
+        state.updated += updated
+        for payload in payloads:
+            received_at = _to_dt(payload.get("receivedDateTime"))
+            if received_at and (state.max_received_at is None or received_at > state.max_received_at):
+                state.max_received_at = received_at
 
 
 async def _pull_folder_messages(
     client: GraphClient,
     mailbox: MailboxConfig,
-    mailbox_id: int,
     folder_id: str,
     checkpoint_at: datetime | None,
-    session: Session,
-    run: PipelineRun,
-    hard_limit: int | None,
-) -> IngestResult:
+    writer: _IngestWriter,
+) -> None:
     params = [SELECT_FIELDS, PAGE_SIZE, "$orderby=receivedDateTime desc"]
     if checkpoint_at:
         checkpoint_iso = checkpoint_at.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
         params.append(f"$filter=receivedDateTime ge {checkpoint_iso}")
     url = f"/users/{mailbox.user_id}/mailFolders/{folder_id}/messages?{'&'.join(params)}"
 
-    processed = 0
-    errors = 0
-    max_received_at = checkpoint_at
-    while url:
-        resp = await client._get(url)
-        for message_json in resp.get("value", []):
-            try:
-                inserted = _upsert_message(session, mailbox_id, message_json)
-                if inserted:
-                    processed += 1
-                received_at = _to_dt(message_json.get("receivedDateTime"))
-                if received_at and (max_received_at is None or received_at > max_received_at):
-                    max_received_at = received_at
-            except Exception as exc:  # pragma: no cover - error path
-                errors += 1
-                session.add(
-                    PipelineError(
-                        run_id=run.id,
-                        mailbox_id=mailbox_id,
-                        message_graph_id=message_json.get("id"),
-                        stage="ingest-message",
-                        error_message=str(exc),
-                        payload_json=message_json,
-                    )
-                )
-                session.add(
-                    DeadLetter(
-                        mailbox_id=mailbox_id,
-                        stage="ingest-message",
-                        payload_json=message_json,
-                        error_message=str(exc),
-                    )
-                )
-
-            if hard_limit and processed >= hard_limit:
-                session.flush()
-                return IngestResult(processed=processed, errors=errors, max_received_at=max_received_at)
-
+    while url and not writer.stopped(folder_id):
+        resp = await writer.fetch(client._get(url))
         url = resp.get("@odata.nextLink")
         if url:
             url = url.split("v1.0")[-1]
-        await asyncio.sleep(0.02)
-        session.flush()
-    return IngestResult(processed=processed, errors=errors, max_received_at=max_received_at)
+        await writer.put(_FolderPage(folder_id=folder_id, messages=resp.get("value", []), final=not url))
+    if url:
+        await writer.put(_FolderPage(folder_id=folder_id, messages=[], final=True))
 
 
-async def ingest_mailbox(
+async def _pull_folder_delta(
+    client: GraphClient,
+    mailbox: MailboxConfig,
+    folder_id: str,
+    delta_link: str | None,
+    checkpoint_at: datetime | None,
+    writer: _IngestWriter,
+) -> None:
+    """Stream one folder's messages/delta changes; each page carries the link to resume from."""
+    params = [SELECT_FIELDS]
+    if checkpoint_at:
+        # Only seeds the initial sync; later rounds are scoped by the stored delta token.
+        checkpoint_iso = checkpoint_at.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+        params.append(f"$filter=receivedDateTime ge {checkpoint_iso}")
+    initial_url = f"/users/{mailbox.user_id}/mailFolders/{folder_id}/messages/delta?{'&'.join(params)}"
+    prefer = {"Prefer": DELTA_PAGE_PREFER}
+
+    try:
+        resp = await writer.fetch(client._get(delta_link or initial_url, extra_headers=prefer))
+    except httpx.HTTPStatusError as exc:
+        if not delta_link or exc.response.status_code != 410:
+            raise
+        # Graph expired the sync state; start a fresh initial round for this folder.
+        resp = await writer.fetch(client._get(initial_url, extra_headers=prefer))
+
+    while True:
+        values = resp.get("value", [])
+        next_link = resp.get("@odata.nextLink")
+        await writer.put(
+            _FolderPage(
+                folder_id=folder_id,
+                messages=[item for item in values if "@removed" not in item],
+                removed_ids=[item["id"] for item in values if "@removed" in item],
+                resume_link=next_link or resp.get("@odata.deltaLink"),
+                final=not next_link,
+            )
+        )
+        if not next_link:
+            return
+        if writer.stopped(folder_id):
+            await writer.put(_FolderPage(folder_id=folder_id, messages=[], final=True))
+            return
+        resp = await writer.fetch(client._get(next_link, extra_headers=prefer))
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    # SQLite hands back naive datetimes; everything we store is UTC.
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _load_folder_rows(session: Session, mailbox_id: int, graph_folder_ids: list[str]) -> dict[str, Folder]:
+    if not graph_folder_ids:
+        return {}
+    rows = session.execute(
+        select(Folder).where(
+            and_(
+                Folder.mailbox_id == mailbox_id,
+                Folder.graph_folder_id.in_(graph_folder_ids),
+            )
+        )
+    ).scalars().all()
+    return {row.graph_folder_id: row for row in rows}
+
+
+def _folder_data_from_row(row: Folder) -> dict[str, Any]:
+    return {
+        "id": row.graph_folder_id,
+        "path_parts": row.path.split("/"),
+        "display_name": row.display_name,
+        "parent_id": row.parent_graph_folder_id,
+        "total_item_count": row.total_item_count,
+        "unread_item_count": row.unread_item_count,
+    }
+
+
+def _folder_unchanged(row: Folder | None, folder_data: dict[str, Any], now: datetime) -> bool:
+    """True when discovery counts match the last complete sync and the recheck window is still open.
+
+    Graph exposes no lastModified on mailFolders; total and unread counts are the cheapest signal,
+    and the periodic recheck covers changes that leave both untouched (e.g. a move in and out).
+    """
+    if settings.folder_recheck_hours <= 0 or row is None or row.last_synced_at is None:
+        return False
+    if row.last_synced_item_count is None or row.last_synced_unread_count is None:
+        return False
+    if now - _as_utc(row.last_synced_at) >= timedelta(hours=settings.folder_recheck_hours):
+        return False
+    return (
+        row.last_synced_item_count == folder_data["total_item_count"]
+        and row.last_synced_unread_count == folder_data.get("unread_item_count", 0)
+    )
+
+
+def _split_unchanged_folders(
+    session: Session, mailbox_id: int, target_folders: list[dict[str, Any]]
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """Return (folders to sync, folders skipped as unchanged since their last sync)."""
+    folder_rows = _load_folder_rows(session, mailbox_id, [folder["id"] for folder in target_folders])
+    now = datetime.now(timezone.utc)
+    to_sync: list[dict[str, Any]] = []
+    skipped: list[dict[str, Any]] = []
+    for folder_data in target_folders:
+        if _folder_unchanged(folder_rows.get(folder_data["id"]), folder_data, now):
+            skipped.append(folder_data)
+        else:
+            to_sync.append(folder_data)
+    return to_sync, skipped
+
+
+def _migrate_legacy_delta_links(session: Session, checkpoint: PipelineCheckpoint) -> None:
+    """Move deltaLinks kept on the mailbox checkpoint onto their folder rows."""
+    cursor = dict(checkpoint.progress_cursor or {})
+    legacy = cursor.pop("delta_links", None)
+    if legacy is None:
+        return
+    for graph_folder_id, row in _load_folder_rows(session, checkpoint.mailbox_id, list(legacy)).items():
+        if not row.last_delta_link:
+            row.last_delta_link = legacy[graph_folder_id]
+    # Reassign rather than mutate so SQLAlchemy notices the JSON change.
+    checkpoint.progress_cursor = cursor
+
+
+async def discover_target_folders(
     client: GraphClient,
     session: Session,
     mailbox: MailboxConfig,
     mailbox_row: Mailbox,
-    run: PipelineRun,
-    hard_limit: int | None = None,
-    max_concurrency: int = 4,
     progress_cb: ProgressCb | None = None,
-) -> IngestResult:
-    checkpoint = _get_or_create_checkpoint(session, mailbox_row.id, "ingest")
+) -> list[dict[str, Any]]:
+    """List the mailbox's folders, upsert them, and return the ones the filters select."""
     if progress_cb:
         progress_cb(
             {
                 "stage": "discovering-folders",
-                "mailbox_key": mailbox.mailbox_key if hasattr(mailbox, "mailbox_key") else mailbox.key,
+                "mailbox_key": mailbox.key,
                 "mailbox_user": mailbox.user_id,
             }
         )
+    started_at = datetime.now(timezone.utc)
     folders = await _list_all_folders(client, mailbox)
     for folder_data in folders:
         _upsert_folder(session, mailbox_row, folder_data)
+    _mark_folder_tree_refreshed(session, mailbox_row.id, started_at)
     session.flush()
 
     target_folders = [
@@ -330,56 +764,428 @@ async def ingest_mailbox(
                 "target_folders": len(target_folders),
             }
         )
+    return target_folders
 
-    semaphore = asyncio.Semaphore(max(1, max_concurrency))
-    results: list[IngestResult] = []
-    completed = 0
 
-    async def process_folder(folder_data: dict[str, Any]) -> None:
-        nonlocal completed
-        if not _path_matches(folder_data["path_parts"], mailbox.include_filters, mailbox.exclude_filters):
-            return
-        async with semaphore:
-            result = await _pull_folder_messages(
-                client=client,
-                mailbox=mailbox,
-                mailbox_id=mailbox_row.id,
-                folder_id=folder_data["id"],
-                checkpoint_at=checkpoint.last_successful_sync_at,
-                session=session,
-                run=run,
-                hard_limit=hard_limit,
-            )
-            results.append(result)
-            completed += 1
+async def _iter_folders(folders: list[dict[str, Any]]) -> AsyncIterator[tuple[dict[str, Any], bool]]:
+    for folder_data in folders:
+        yield folder_data, True
+
+
+FOLDER_COUNT_FIELDS = "$select=id,totalItemCount,unreadItemCount"
+
+
+async def _refresh_folder_counts(
+    client: GraphClient, mailbox: MailboxConfig, folder_data: dict[str, Any]
+) -> tuple[str, dict[str, Any] | None]:
+    """(folder id, the cached folder with its current counts), with None when it has been deleted since."""
+    try:
+        current = await client.batched_get(
+            f"/users/{mailbox.user_id}/mailFolders/{folder_data['id']}?{FOLDER_COUNT_FIELDS}"
+        )
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code == 404:
+            return folder_data["id"], None
+        raise
+    return folder_data["id"], {
+        **folder_data,
+        "total_item_count": current.get("totalItemCount", 0),
+        "unread_item_count": current.get("unreadItemCount", 0),
+    }
+
+
+async def _stream_folders(
+    client: GraphClient,
+    mailbox: MailboxConfig,
+    progress_cb: ProgressCb | None = None,
+    *,
+    cached: list[dict[str, Any]] | None = None,
+    refresh: bool = True,
+    on_deleted: Callable[[str], None] | None = None,
+) -> AsyncIterator[tuple[dict[str, Any], bool]]:
+    """Yield (folder, is_target) pairs: cached folders first, then folders as discovery finds them.
+
+    Cached target folders are handed out with counts re-read through `$batch` (20 folders per
+    request), so unchanged ones can still be skipped without a messages request; the ids of
+    those that no longer exist go to `on_deleted` instead. With `refresh`
+    the walk starts before the cached folders are handed out, so it runs in the background while
+    their messages are already being pulled.
+    """
+    found: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+
+    async def discover() -> None:
+        try:
+            await _list_all_folders(client, mailbox, on_folder=found.put_nowait)
+        finally:
+            found.put_nowait(None)
+
+    def is_target(folder_data: dict[str, Any]) -> bool:
+        return _path_matches(folder_data["path_parts"], mailbox.include_filters, mailbox.exclude_filters)
+
+    if progress_cb and refresh:
+        progress_cb(
+            {
+                "stage": "discovering-folders",
+                "mailbox_key": mailbox.key,
+                "mailbox_user": mailbox.user_id,
+            }
+        )
+    task = asyncio.create_task(discover()) if refresh else None
+    total = targeted = 0
+    try:
+        if cached is not None:
             if progress_cb:
                 progress_cb(
                     {
-                        "stage": "ingesting-folders",
+                        "stage": "folder-tree-cached",
                         "mailbox_key": mailbox.key,
-                        "completed_folders": completed,
-                        "target_folders": len(target_folders),
-                        "processed_messages": sum(item.processed for item in results),
-                        "errors": sum(item.errors for item in results),
-                        "current_folder": "/".join(folder_data.get("path_parts", [])),
+                        "total_folders": len(cached),
+                        "refreshing": refresh,
                     }
                 )
+            refreshes = []
+            for folder_data in cached:
+                if is_target(folder_data):
+                    refreshes.append(
+                        asyncio.ensure_future(_refresh_folder_counts(client, mailbox, {**folder_data, "cached": True}))
+                    )
+                else:
+                    yield {**folder_data, "cached": True}, False
+            try:
+                for refreshed in asyncio.as_completed(refreshes):
+                    folder_id, folder_data = await refreshed
+                    if folder_data is not None:
+                        yield folder_data, True
+                    elif on_deleted:
+                        on_deleted(folder_id)
+            finally:
+                for future in refreshes:
+                    future.cancel()
+                await asyncio.gather(*refreshes, return_exceptions=True)
+        if task is None:
+            return
+        while (folder_data := await found.get()) is not None:
+            target = is_target(folder_data)
+            total += 1
+            targeted += int(target)
+            yield folder_data, target
+        # Surface a discovery failure only after every folder found before it was handed over.
+        await task
+    finally:
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    if progress_cb:
+        progress_cb(
+            {
+                "stage": "folder-discovery-complete",
+                "mailbox_key": mailbox.key,
+                "total_folders": total,
+                "target_folders": targeted,
+            }
+        )
 
-    await asyncio.gather(*(process_folder(folder) for folder in target_folders))
-    processed = sum(item.processed for item in results)
-    errors = sum(item.errors for item in results)
-    latest = max((item.max_received_at for item in results if item.max_received_at is not None), default=None)
-    if latest:
-        checkpoint.last_successful_sync_at = latest
+
+def _cached_folder_tree(
+    session: Session, mailbox_id: int, now: datetime
+) -> tuple[list[dict[str, Any]] | None, bool]:
+    """Return (cached folders or None, whether the cache is still within FOLDER_TREE_TTL_MINUTES)."""
+    if settings.folder_tree_ttl_minutes <= 0:
+        return None, False
+    tree_checkpoint = _get_or_create_checkpoint(session, mailbox_id, "folder_tree")
+    refreshed_at = _as_utc(tree_checkpoint.last_successful_sync_at)
+    if refreshed_at is None:
+        return None, False
+    rows = session.execute(select(Folder).where(Folder.mailbox_id == mailbox_id)).scalars().all()
+    if not rows:
+        return None, False
+    fresh = now - refreshed_at < timedelta(minutes=settings.folder_tree_ttl_minutes)
+    return [_folder_data_from_row(row) for row in rows], fresh
+
+
+def _mark_folder_tree_refreshed(session: Session, mailbox_id: int, refreshed_at: datetime) -> None:
+    _get_or_create_checkpoint(session, mailbox_id, "folder_tree").last_successful_sync_at = refreshed_at
+
+
+async def _ingest_folders(
+    client: GraphClient,
+    session: Session,
+    mailbox: MailboxConfig,
+    mailbox_row: Mailbox,
+    run: PipelineRun,
+    folders: AsyncIterator[tuple[dict[str, Any], bool]],
+    *,
+    hard_limit: int | None,
+    max_concurrency: int,
+    fallback_at: datetime | None,
+    progress_cb: ProgressCb | None = None,
+) -> IngestResult:
+    """Upsert each folder as it arrives, pull the changed targets, and advance their checkpoints.
+
+    Folder pulls start as soon as a folder is yielded, so message ingest overlaps discovery.
+    """
+    started = time.monotonic()
+    use_delta = mailbox.ingest_mode.lower() == "delta"
+    now = datetime.now(timezone.utc)
+    folder_rows: dict[str, Folder] = {}
+    considered: set[str] = set()
+    skipped = 0
+    completed = 0
+
+    def on_folder_done(state: _FolderState) -> None:
+        nonlocal completed
+        completed += 1
+        if progress_cb:
+            states = writer.folders.values()
+            progress_cb(
+                {
+                    "stage": "ingesting-folders",
+                    "mailbox_key": mailbox.key,
+                    "completed_folders": completed,
+                    "target_folders": len(writer.folders),
+                    "processed_messages": sum(item.inserted for item in states),
+                    "removed_messages": sum(item.removed for item in states),
+                    "errors": sum(item.errors for item in states),
+                    "current_folder": "/".join(state.folder_data.get("path_parts", [])),
+                    "stats": writer.stats.as_dict(time.monotonic() - started),
+                }
+            )
+
+    writer = _IngestWriter(session, run, mailbox_row.id, hard_limit, on_folder_done=on_folder_done)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def process_folder(folder_data: dict[str, Any], checkpoint_at: datetime | None, delta_link: str | None) -> None:
+        try:
+            await pull_folder(folder_data, checkpoint_at, delta_link)
+        except httpx.HTTPStatusError as exc:
+            if not folder_data.get("cached") or exc.response.status_code != 404:
+                raise
+            # The cached tree still lists a folder that has since been deleted in Graph.
+            await writer.put(_FolderPage(folder_id=folder_data["id"], messages=[], final=True))
+            writer.folders[folder_data["id"]].stopped = True
+
+    async def pull_folder(folder_data: dict[str, Any], checkpoint_at: datetime | None, delta_link: str | None) -> None:
+        async with semaphore:
+            if use_delta:
+                await _pull_folder_delta(
+                    client=client,
+                    mailbox=mailbox,
+                    folder_id=folder_data["id"],
+                    delta_link=delta_link,
+                    checkpoint_at=checkpoint_at,
+                    writer=writer,
+                )
+            else:
+                await _pull_folder_messages(
+                    client=client,
+                    mailbox=mailbox,
+                    folder_id=folder_data["id"],
+                    checkpoint_at=checkpoint_at,
+                    writer=writer,
+                )
+
+    failures: list[BaseException] = []
+
+    def on_task_done(task: asyncio.Task[None]) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            failures.append(task.exception())
+
+    writer_task = asyncio.create_task(writer.drain())
+    folder_tasks: list[asyncio.Task[None]] = []
+    try:
+        async with aclosing(folders) as stream:
+            async for folder_data, is_target in stream:
+                if failures:
+                    raise failures[0]
+                row = await writer.run_db(_upsert_folder, session, mailbox_row, folder_data)
+                # A refreshing walk re-yields cached folders; their counts were just read, so decide once.
+                if not is_target or folder_data["id"] in considered:
+                    continue
+                considered.add(folder_data["id"])
+                if _folder_unchanged(row, folder_data, now):
+                    skipped += 1
+                    continue
+                folder_rows[folder_data["id"]] = row
+                checkpoint_at = _as_utc(row.last_max_received_at) if row.last_max_received_at else fallback_at
+                writer.add_folder(folder_data, checkpoint_at, row.last_delta_link)
+                task = asyncio.create_task(process_folder(folder_data, checkpoint_at, row.last_delta_link))
+                task.add_done_callback(on_task_done)
+                folder_tasks.append(task)
+        await asyncio.gather(*folder_tasks)
+    except BaseException:
+        for task in folder_tasks:
+            task.cancel()
+        await asyncio.gather(*folder_tasks, return_exceptions=True)
+        raise
+    finally:
+        # The sentinel always goes in so the writer flushes what it has, or stops draining.
+        await writer.queue.put(None)
+        await writer_task
+
+    synced_at = datetime.now(timezone.utc)
+    for folder_id, state in writer.folders.items():
+        row = folder_rows[folder_id]
+        if state.max_received_at:
+            row.last_max_received_at = state.max_received_at
+        if use_delta and state.delta_link:
+            row.last_delta_link = state.delta_link
+        row.last_synced_at = synced_at
+        if state.done and not state.stopped:
+            # Counts as of discovery: anything arriving later changes them and forces a re-query.
+            row.last_synced_item_count = state.folder_data["total_item_count"]
+            row.last_synced_unread_count = state.folder_data.get("unread_item_count", 0)
+        else:
+            row.last_synced_item_count = None
+            row.last_synced_unread_count = None
+
+    results = [state.result() for state in writer.folders.values()]
+    return IngestResult(
+        processed=sum(item.processed for item in results),
+        errors=sum(item.errors for item in results),
+        max_received_at=max(
+            (item.max_received_at for item in results if item.max_received_at is not None), default=None
+        ),
+        removed=sum(item.removed for item in results),
+        updated=sum(item.updated for item in results),
+        stats=writer.stats.as_dict(time.monotonic() - started),
+        synced_folders=len(results),
+        skipped_folders=skipped,
+        folder_processed={folder_id: state.inserted for folder_id, state in writer.folders.items()},
+    )
+
+
+async def ingest_mailbox(
+    client: GraphClient,
+    session: Session,
+    mailbox: MailboxConfig,
+    mailbox_row: Mailbox,
+    run: PipelineRun,
+    hard_limit: int | None = None,
+    max_concurrency: int = 4,
+    progress_cb: ProgressCb | None = None,
+) -> IngestResult:
+    checkpoint = _get_or_create_checkpoint(session, mailbox_row.id, "ingest")
+    _migrate_legacy_delta_links(session, checkpoint)
+    started_at = datetime.now(timezone.utc)
+    cached, fresh = _cached_folder_tree(session, mailbox_row.id, started_at)
+    deleted: list[str] = []
+
+    result = await _ingest_folders(
+        client,
+        session,
+        mailbox,
+        mailbox_row,
+        run,
+        # A fresh cached tree skips discovery; a stale one is refreshed while its folders are pulled.
+        _stream_folders(client, mailbox, progress_cb, cached=cached, refresh=not fresh, on_deleted=deleted.append),
+        hard_limit=hard_limit,
+        max_concurrency=max_concurrency,
+        # Folders without their own checkpoint yet (new, or pre-upgrade) start from the mailbox's.
+        fallback_at=_as_utc(checkpoint.last_successful_sync_at),
+        progress_cb=progress_cb,
+    )
+    if deleted:
+        # Evict folders deleted in Exchange so later runs stop re-checking them until the TTL runs out.
+        session.execute(
+            delete(Folder).where(Folder.mailbox_id == mailbox_row.id, Folder.graph_folder_id.in_(deleted))
+        )
+    if result.max_received_at:
+        checkpoint.last_successful_sync_at = result.max_received_at
     checkpoint.last_run_id = run.id
+    if not fresh:
+        _mark_folder_tree_refreshed(session, mailbox_row.id, started_at)
     if progress_cb:
         progress_cb(
             {
                 "stage": "completed",
                 "mailbox_key": mailbox.key,
-                "target_folders": len(target_folders),
-                "processed_messages": processed,
-                "errors": errors,
+                "target_folders": result.synced_folders,
+                "skipped_folders": result.skipped_folders,
+                "processed_messages": result.processed,
+                "updated_messages": result.updated,
+                "removed_messages": result.removed,
+                "errors": result.errors,
+                "stats": result.stats,
             }
         )
-    return IngestResult(processed=processed, errors=errors, max_received_at=latest)
+    return result
+
+
+def enqueue_folder_work(session: Session, mailbox_row: Mailbox, target_folders: list[dict[str, Any]]) -> list[str]:
+    """Queue one ingest work unit per changed target folder and return the queued folder ids.
+
+    Folders whose unit is currently leased are left alone.
+    """
+    checkpoint = _get_or_create_checkpoint(session, mailbox_row.id, "ingest")
+    _migrate_legacy_delta_links(session, checkpoint)
+    target_folders, _ = _split_unchanged_folders(session, mailbox_row.id, target_folders)
+    existing = {
+        unit.graph_folder_id: unit
+        for unit in session.execute(
+            select(IngestWorkUnit).where(IngestWorkUnit.mailbox_id == mailbox_row.id)
+        ).scalars().all()
+    }
+    queued: list[str] = []
+    for folder_data in target_folders:
+        unit = existing.get(folder_data["id"])
+        if unit is None:
+            session.add(
+                IngestWorkUnit(
+                    mailbox_id=mailbox_row.id,
+                    graph_folder_id=folder_data["id"],
+                    status="pending",
+                    attempts=0,
+                    processed_count=0,
+                )
+            )
+        elif unit.status == "leased":
+            # Someone is still on it; a dead lease is picked up again once its heartbeat goes stale.
+            continue
+        else:
+            unit.status = "pending"
+            unit.attempts = 0
+            unit.processed_count = 0
+            unit.error_message = None
+        queued.append(folder_data["id"])
+    session.flush()
+    return queued
+
+
+async def ingest_work_units(
+    client: GraphClient,
+    session: Session,
+    mailbox: MailboxConfig,
+    mailbox_row: Mailbox,
+    run: PipelineRun,
+    units: list[IngestWorkUnit],
+    hard_limit: int | None = None,
+    max_concurrency: int = 4,
+) -> IngestResult:
+    """Ingest the folders behind leased work units; the caller completes or releases them."""
+    folder_rows = _load_folder_rows(session, mailbox_row.id, [unit.graph_folder_id for unit in units])
+    checkpoint = _get_or_create_checkpoint(session, mailbox_row.id, "ingest")
+    target_folders = [_folder_data_from_row(row) for row in folder_rows.values()]
+    return await _ingest_folders(
+        client,
+        session,
+        mailbox,
+        mailbox_row,
+        run,
+        _iter_folders(target_folders),
+        hard_limit=hard_limit,
+        max_concurrency=max_concurrency,
+        fallback_at=_as_utc(checkpoint.last_successful_sync_at),
+    )
+
+
+def roll_up_folder_checkpoints(session: Session, mailbox_id: int) -> datetime | None:
+    """Advance the mailbox checkpoint to the newest folder checkpoint written by workers."""
+    latest = session.execute(
+        select(func.max(Folder.last_max_received_at)).where(Folder.mailbox_id == mailbox_id)
+    ).scalar_one_or_none()
+    latest = _as_utc(latest)
+    checkpoint = _get_or_create_checkpoint(session, mailbox_id, "ingest")
+    current = _as_utc(checkpoint.last_successful_sync_at)
+    if latest and (current is None or latest > current):
+        checkpoint.last_successful_sync_at = latest
+    return _as_utc(checkpoint.last_successful_sync_at)
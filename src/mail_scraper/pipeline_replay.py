@@ -0,0 +1,286 @@
+"""Dead-letter replay: re-run the failed stage from the dead letter's payload.
+
+Letters are grouped by mailbox and stage. Message-level letters are replayed together, so
+their Graph reads coalesce into `$batch` calls. Mailbox-level letters re-run the mailbox
+pipeline once per group. A letter is resolved only when its replay succeeds; otherwise it
+waits an exponentially growing delay (`next_retry_at`) before it becomes due again.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from .config import MailboxConfig, settings
+from .db import finish_run, start_run
+from .db_schema import DeadLetter, Mailbox, Message, PipelineRun
+from .file_io import fsync_mode
+from .graph_client import GraphClient
+from .pipeline_attachments import _download_batch, _message_gone, _MessageFetch, download_attachments_for_mailbox
+from .pipeline_ingest import SELECT_FIELDS, _upsert_messages, ingest_mailbox
+
+# Outcome per dead letter id: None when the replay succeeded, else the error that stopped it.
+Outcomes = dict[int, Exception | None]
+
+
+@dataclass
+class ReplayResult:
+    resolved: int = 0
+    failed: int = 0
+    skipped: int = 0
+
+
+def replay_backoff(attempts: int) -> timedelta:
+    """Delay before the next replay of a letter that has failed `attempts` times."""
+    base = max(1, settings.dead_letter_backoff_seconds)
+    seconds = min(settings.dead_letter_backoff_max_seconds, base * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=seconds)
+
+
+def _due_filters(stage: str | None, now: datetime) -> list[Any]:
+    filters = [
+        DeadLetter.resolved_at.is_(None),
+        or_(DeadLetter.next_retry_at.is_(None), DeadLetter.next_retry_at <= now),
+    ]
+    if stage:
+        filters.append(DeadLetter.stage == stage)
+    return filters
+
+
+def _due_dead_letters(
+    session: Session, stage: str | None, limit: int, now: datetime, mailbox_ids: list[int]
+) -> list[DeadLetter]:
+    """Due letters this run can replay; the rest are filtered out before the LIMIT so they never fill it."""
+    query = select(DeadLetter).where(
+        *_due_filters(stage, now),
+        DeadLetter.mailbox_id.in_(mailbox_ids),
+        DeadLetter.stage.in_(list(REPLAY_HANDLERS)),
+    )
+    return list(session.execute(query.order_by(DeadLetter.id.asc()).limit(limit)).scalars().all())
+
+
+def _count_unreplayable(session: Session, stage: str | None, now: datetime, mailbox_ids: list[int]) -> int:
+    """Due letters left alone: unknown stage, or a mailbox that is not selected."""
+    return session.execute(
+        select(func.count())
+        .select_from(DeadLetter)
+        .where(
+            *_due_filters(stage, now),
+            or_(DeadLetter.mailbox_id.not_in(mailbox_ids), DeadLetter.stage.not_in(list(REPLAY_HANDLERS))),
+        )
+    ).scalar_one()
+
+
+def _graph_message_id(row: DeadLetter) -> str | None:
+    payload = row.payload_json or {}
+    # ingest-message letters carry the whole Graph message, download letters only its id.
+    return payload.get("message_id") or payload.get("id")
+
+
+async def _replay_ingest_messages(
+    client: GraphClient,
+    session: Session,
+    mailbox: MailboxConfig,
+    mailbox_row: Mailbox,
+    run: PipelineRun,
+    output_root: Path,
+    rows: list[DeadLetter],
+) -> Outcomes:
+    """Re-read each message from Graph and upsert it; a message deleted since counts as done."""
+    outcomes: Outcomes = {}
+    wanted = [(row, _graph_message_id(row)) for row in rows]
+    fetched = await asyncio.gather(
+        *(
+            client.batched_get(f"/users/{mailbox.user_id}/messages/{graph_id}?{SELECT_FIELDS}")
+            for _, graph_id in wanted
+            if graph_id
+        ),
+        return_exceptions=True,
+    )
+    responses = iter(fetched)
+    for row, graph_id in wanted:
+        if not graph_id:
+            outcomes[row.id] = ValueError("dead letter payload has no message id")
+            continue
+        payload = next(responses)
+        if isinstance(payload, Exception):
+            # Deleted since it failed: nothing left to ingest.
+            outcomes[row.id] = None if _message_gone(payload) else payload
+        else:
+            try:
+                with session.begin_nested():
+                    _upsert_messages(session, mailbox_row.id, [payload])
+                outcomes[row.id] = None
+            except Exception as exc:
+                outcomes[row.id] = exc
+    return outcomes
+
+
+async def _replay_attachment_downloads(
+    client: GraphClient,
+    session: Session,
+    mailbox: MailboxConfig,
+    mailbox_row: Mailbox,
+    run: PipelineRun,
+    output_root: Path,
+    rows: list[DeadLetter],
+) -> Outcomes:
+    """Download the messages behind the letters as one concurrent batch."""
+    graph_ids = {row.id: _graph_message_id(row) for row in rows}
+    messages = (
+        session.execute(
+            select(Message)
+            .where(
+                Message.mailbox_id == mailbox_row.id,
+                Message.graph_message_id.in_([graph_id for graph_id in graph_ids.values() if graph_id]),
+            )
+            .order_by(Message.id.asc())
+        )
+        .scalars()
+        .all()
+    )
+    errors: dict[str, Exception | None] = {}
+
+    def on_message(outcome: _MessageFetch) -> None:
+        errors[outcome.message.graph_message_id] = None if _message_gone(outcome.error) else outcome.error
+
+    await _download_batch(
+        client,
+        session,
+        mailbox,
+        mailbox_row,
+        output_root,
+        list(messages),
+        force=False,
+        content_addressed=settings.attachment_content_addressed,
+        fsync=fsync_mode(),
+        semaphore=asyncio.Semaphore(max(1, settings.attachment_download_concurrency)),
+        on_message=on_message,
+    )
+    # A message row that no longer exists has nothing left to download.
+    return {row_id: errors.get(graph_id) for row_id, graph_id in graph_ids.items()}
+
+
+async def _replay_mailbox_ingest(
+    client: GraphClient,
+    session: Session,
+    mailbox: MailboxConfig,
+    mailbox_row: Mailbox,
+    run: PipelineRun,
+    output_root: Path,
+    rows: list[DeadLetter],
+) -> Outcomes:
+    try:
+        await ingest_mailbox(
+            client=client,
+            session=session,
+            mailbox=mailbox,
+            mailbox_row=mailbox_row,
+            run=run,
+            max_concurrency=client.limiter.max_concurrency,
+        )
+    except Exception as exc:
+        return {row.id: exc for row in rows}
+    return {row.id: None for row in rows}
+
+
+async def _replay_mailbox_downloads(
+    client: GraphClient,
+    session: Session,
+    mailbox: MailboxConfig,
+    mailbox_row: Mailbox,
+    run: PipelineRun,
+    output_root: Path,
+    rows: list[DeadLetter],
+) -> Outcomes:
+    try:
+        await download_attachments_for_mailbox(
+            client=client,
+            session=session,
+            mailbox=mailbox,
+            mailbox_row=mailbox_row,
+            run=run,
+            output_root=output_root,
+            batch_size=settings.attachment_batch_size,
+        )
+    except Exception as exc:
+        return {row.id: exc for row in rows}
+    return {row.id: None for row in rows}
+
+
+ReplayHandler = Callable[
+    [GraphClient, Session, MailboxConfig, Mailbox, PipelineRun, Path, list[DeadLetter]], Awaitable[Outcomes]
+]
+REPLAY_HANDLERS: dict[str, ReplayHandler] = {
+    "ingest-message": _replay_ingest_messages,
+    "download-attachments": _replay_attachment_downloads,
+    # One mailbox re-run resolves every mailbox-level letter in its group.
+    "ingest-mailbox": _replay_mailbox_ingest,
+    "download-attachments-mailbox": _replay_mailbox_downloads,
+}
+
+
+def _settle(row: DeadLetter, error: Exception | None, now: datetime) -> None:
+    row.last_seen_at = now
+    if error is None:
+        row.resolved_at = now
+        row.next_retry_at = None
+        return
+    row.attempts = (row.attempts or 0) + 1
+    row.error_message = str(error)
+    row.next_retry_at = now + replay_backoff(row.attempts)
+
+
+async def replay_dead_letters(
+    client: GraphClient,
+    session: Session,
+    mailbox_configs: dict[int, MailboxConfig],
+    *,
+    stage: str | None = None,
+    limit: int = 100,
+    output_root: Path = Path("raw_data"),
+    now: datetime | None = None,
+) -> ReplayResult:
+    """Replay up to `limit` due dead letters and commit after each mailbox/stage group.
+
+    Due letters for unknown stages or mailboxes missing from `mailbox_configs` are left untouched and
+    counted as skipped; they do not take up any of the `limit`.
+    """
+    now = now or datetime.now(timezone.utc)
+    mailbox_ids = list(mailbox_configs)
+    result = ReplayResult(skipped=_count_unreplayable(session, stage, now, mailbox_ids))
+    groups: dict[tuple[int, str], list[DeadLetter]] = {}
+    for row in _due_dead_letters(session, stage, limit, now, mailbox_ids):
+        groups.setdefault((row.mailbox_id, row.stage), []).append(row)
+
+    for (mailbox_id, row_stage), rows in groups.items():
+        mailbox_row = session.get(Mailbox, mailbox_id)
+        run = start_run(
+            session,
+            pipeline_name="replay_dead_letters",
+            mailbox_id=mailbox_id,
+            metadata={"stage": row_stage, "dead_letter_ids": [row.id for row in rows]},
+        )
+        outcomes = await REPLAY_HANDLERS[row_stage](
+            client, session, mailbox_configs[mailbox_id], mailbox_row, run, output_root, rows
+        )
+        failed = 0
+        for row in rows:
+            error = outcomes.get(row.id)
+            _settle(row, error, now)
+            failed += error is not None
+        result.resolved += len(rows) - failed
+        result.failed += failed
+        finish_run(
+            session,
+            run,
+            status="success" if failed == 0 else "partial_success",
+            processed_count=len(rows) - failed,
+            error_count=failed,
+        )
+        session.commit()
+    return result
@@ -0,0 +1,145 @@
+"""Adaptive concurrency limiting for Graph requests.
+
+Graph throttles per app+mailbox and per tenant, and tells us so with 429/503 and
+Retry-After. Instead of a fixed concurrency and fixed sleeps, requests pass through
+AIMD gates: every healthy response nudges the allowed concurrency up, every throttle
+halves it and pauses the gate until the server's Retry-After has elapsed.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+import re
+import time
+from typing import AsyncIterator
+
+_MAILBOX_SCOPE_RE = re.compile(r"^/users/([^/?]+)", re.I)
+THROTTLE_STATUSES = (429, 503)
+
+
+def mailbox_scope(path: str) -> str | None:
+    """Return the throttling scope (mailbox id/UPN) a Graph path is charged against."""
+    match = _MAILBOX_SCOPE_RE.match(path)
+    return match.group(1).lower() if match else None
+
+
+class AimdGate:
+    def __init__(self, initial: int, ceiling: int, floor: int = 1) -> None:
+        self.floor = max(1, floor)
+        self.ceiling = max(self.floor, ceiling)
+        self.limit = float(max(self.floor, min(initial, self.ceiling)))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._cond = asyncio.Condition()
+
+    def pause_remaining(self) -> float:
+        return max(0.0, self.paused_until - time.monotonic())
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            while True:
+                remaining = self.pause_remaining()
+                if remaining > 0:
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                await self._cond.wait()
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        # Additive increase: roughly +1 slot per window of `limit` healthy responses.
+        self.limit = min(float(self.ceiling), self.limit + 1.0 / self.limit)
+
+    def on_throttle(self, pause_seconds: float | None) -> None:
+        self.limit = max(float(self.floor), self.limit / 2.0)
+        if pause_seconds:
+            self.paused_until = max(self.paused_until, time.monotonic() + pause_seconds)
+
+
+class _Slot:
+    def __init__(self, limiter: "GraphRateLimiter", scope: str | None) -> None:
+        self._limiter = limiter
+        self._scope = scope
+
+    def record(self, status_code: int, retry_after: float | None) -> None:
+        if status_code in THROTTLE_STATUSES:
+            self._limiter.throttled(self._scope, retry_after)
+        elif status_code < 500:
+            self._limiter.succeeded(self._scope)
+
+
+class GraphRateLimiter:
+    """Shared AIMD limiter: one tenant-wide gate plus one gate per mailbox scope."""
+
+    def __init__(self, initial: int, ceiling: int, per_mailbox: int) -> None:
+        self._initial = initial
+        self._per_mailbox = max(1, per_mailbox)
+        self._global = AimdGate(initial, ceiling)
+        self._scopes: dict[str, AimdGate] = {}
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._global.ceiling
+
+    def _gate(self, scope: str | None) -> AimdGate | None:
+        if scope is None:
+            return None
+        gate = self._scopes.get(scope)
+        if gate is None:
+            gate = AimdGate(min(self._initial, self._per_mailbox), self._per_mailbox)
+            self._scopes[scope] = gate
+        return gate
+
+    @asynccontextmanager
+    async def slot(self, scope: str | None) -> AsyncIterator[_Slot]:
+        gate = self._gate(scope)
+        if gate is not None:
+            await gate.acquire()
+        try:
+            await self._global.acquire()
+            try:
+                yield _Slot(self, scope)
+            finally:
+                await self._global.release()
+        finally:
+            if gate is not None:
+                await gate.release()
+
+    def succeeded(self, scope: str | None) -> None:
+        self._global.on_success()
+        gate = self._gate(scope)
+        if gate is not None:
+            gate.on_success()
+
+    def throttled(self, scope: str | None, retry_after: float | None) -> None:
+        gate = self._gate(scope)
+        if gate is not None:
+            # Mailbox throttling only pauses that mailbox; the tenant gate still shrinks.
+            gate.on_throttle(retry_after)
+            self._global.on_throttle(None)
+        else:
+            self._global.on_throttle(retry_after)
+
+    async def wait_ready(self, scope: str | None) -> None:
+        """Sleep until neither the tenant gate nor the scope's gate is paused."""
+        gate = self._gate(scope)
+        while True:
+            remaining = max(self._global.pause_remaining(), gate.pause_remaining() if gate else 0.0)
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    def snapshot(self) -> dict[str, float]:
+        return {
+            "global_limit": round(self._global.limit, 2),
+            "global_in_flight": self._global.in_flight,
+            "throttled_scopes": sum(1 for gate in self._scopes.values() if gate.pause_remaining() > 0),
+        }
@@ -0,0 +1,93 @@
+"""Lease-based work queues shared by processes and hosts through Postgres.
+
+Work tables carry `status`, `lease_owner`, `leased_at`, `heartbeat_at`, `attempts` and
+`error_message`. Workers claim rows with `SELECT ... FOR UPDATE SKIP LOCKED`, so two
+workers never lease the same row, and a lease whose heartbeat has gone stale (crashed
+worker, lost host) becomes claimable again.
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+import os
+import socket
+from typing import Any
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from .db import db_session
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_work_items(
+    session: Session,
+    model: Any,
+    worker_id: str,
+    *,
+    lease_seconds: int,
+    limit: int = 1,
+    filters: list[Any] | None = None,
+) -> list[Any]:
+    """Lease up to `limit` pending (or abandoned) rows to `worker_id` and commit the lease."""
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=lease_seconds)
+    query = (
+        select(model)
+        .where(
+            or_(
+                model.status == "pending",
+                and_(model.status == "leased", model.heartbeat_at < stale_before),
+            ),
+            *(filters or []),
+        )
+        .order_by(model.id.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = session.execute(query).scalars().all()
+    for row in rows:
+        row.status = "leased"
+        row.lease_owner = worker_id
+        row.leased_at = now
+        row.heartbeat_at = now
+        row.attempts = (row.attempts or 0) + 1
+    session.commit()
+    return list(rows)
+
+
+def heartbeat_work_items(session: Session, model: Any, ids: list[int], worker_id: str) -> int:
+    result = session.execute(
+        update(model)
+        .where(and_(model.id.in_(ids), model.lease_owner == worker_id, model.status == "leased"))
+        .values(heartbeat_at=datetime.now(timezone.utc))
+    )
+    return int(result.rowcount or 0)
+
+
+def complete_work_item(row: Any) -> None:
+    row.status = "done"
+    row.lease_owner = None
+    row.error_message = None
+
+
+def release_work_item(row: Any, *, error: str | None, max_attempts: int) -> None:
+    """Hand a leased row back; it is retried until it has failed `max_attempts` times."""
+    row.status = "failed" if (row.attempts or 0) >= max_attempts else "pending"
+    row.lease_owner = None
+    row.error_message = error
+
+
+async def heartbeat_forever(model: Any, ids: list[int], worker_id: str, lease_seconds: int) -> None:
+    """Keep leases alive until cancelled; run alongside the work it protects."""
+
+    def beat() -> None:
+        with db_session() as session:
+            heartbeat_work_items(session, model, ids, worker_id)
+
+    interval = max(1.0, lease_seconds / 3.0)
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(beat)
@@ -1,6 +1,35 @@
+import os
 from pathlib import Path
 import sys
 
+import pytest
+
+# Settings() requires Graph credentials at import time; tests never talk to the real tenant.
+os.environ.setdefault("TENANT_ID", "test-tenant")
+os.environ.setdefault("CLIENT_ID", "test-client")
+os.environ.setdefault("CLIENT_SECRET", "test-secret")
+
 SRC_PATH = Path(__file__).resolve().parents[1] / "src"
 if str(SRC_PATH) not in sys.path:
     sys.path.insert(0, str(SRC_PATH))
+
+
+@pytest.fixture
+def sqlite_db(monkeypatch):
+    """Point the shared engine/session factory at an in-memory SQLite database for `run_*` operations.
+
+    All sessions share one connection, so concurrent mailbox sessions don't trip SQLite's single-writer lock.
+    """
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+
+    from mail_scraper import db
+
+    engine = create_engine(
+        "sqlite+pysqlite://", future=True, poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    monkeypatch.setattr(db, "_ENGINE", engine)
+    monkeypatch.setattr(db, "_SessionFactory", None)
+    db.ensure_schema()
+    yield engine
+    engine.dispose()
@@ -0,0 +1,32 @@
+import pytest
+
+from mail_scraper.bench import BenchConfig, compare_reports, run_benchmarks, scratch_database
+from mail_scraper.config import settings
+
+
+def test_run_benchmarks_reports_every_stage() -> None:
+    database_url = settings.database_url
+    report = run_benchmarks(BenchConfig(folders=2, messages_per_folder=12, attachment_every=3, attachment_bytes=512))
+
+    stages = report["stages"]
+    assert list(stages) == ["ingest", "download_attachments", "load_extracted_csv", "derive_tasks", "score_decisions"]
+    assert stages["ingest"]["items"] == 24
+    assert stages["download_attachments"]["items"] == 8
+    assert stages["download_attachments"]["details"]["messages"] == 8
+    assert stages["load_extracted_csv"]["details"]["inserted"] == 8
+    assert stages["derive_tasks"]["items"] == stages["score_decisions"]["items"] == 8
+    assert report["database"] == "sqlite"
+    # The scratch database is only used for the run.
+    assert settings.database_url == database_url
+
+    assert compare_reports(report, report) == {stage: 1.0 for stage in stages if stages[stage]["per_second"]}
+    assert set(compare_reports(report, {"stages": {}}).values()) == {None}
+
+
+def test_scratch_database_refuses_the_configured_database(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "database_url", f"sqlite+pysqlite:///{tmp_path / 'prod.db'}")
+    with pytest.raises(ValueError, match="drops every table"):
+        with scratch_database(settings.database_url):
+            pass
+    with scratch_database(settings.database_url, allow_configured=True):
+        pass
@@ -0,0 +1,48 @@
+import json
+import os
+from pathlib import Path
+
+from mail_scraper import blob_store
+
+
+def _stage(root: Path, content: bytes) -> Path:
+    staged = blob_store.staging_path(root)
+    staged.write_bytes(content)
+    return staged
+
+
+def test_commit_blob_stores_identical_content_once(tmp_path: Path) -> None:
+    blob = blob_store.blob_path(tmp_path, "ab" * 32, ".PDF")
+    first = _stage(tmp_path, b"%PDF")
+    second = _stage(tmp_path, b"%PDF")
+
+    assert blob_store.commit_blob(first, blob) == blob
+    assert blob_store.commit_blob(second, blob) == blob
+
+    assert blob.name == f"{'ab' * 32}.pdf"
+    assert not first.exists() and not second.exists()
+    assert blob.read_bytes() == b"%PDF"
+
+
+def test_link_blob_hardlinks_into_message_dir(tmp_path: Path) -> None:
+    blob = blob_store.commit_blob(_stage(tmp_path, b"%PDF"), blob_store.blob_path(tmp_path, "cd" * 32, ".pdf"))
+
+    one = blob_store.link_blob(blob, tmp_path / "ops" / "m1_x" / "quote.pdf")
+    two = blob_store.link_blob(blob, tmp_path / "ops" / "m2_y" / "quote.pdf")
+
+    assert os.path.samefile(one, blob) and os.path.samefile(two, blob)
+    assert blob_store.link_blob(blob, one) == one
+
+
+def test_link_blob_falls_back_to_manifest(tmp_path: Path, monkeypatch) -> None:
+    blob = blob_store.commit_blob(_stage(tmp_path, b"%PDF"), blob_store.blob_path(tmp_path, "ef" * 32, ".pdf"))
+
+    def no_links(src, dst):
+        raise OSError("hardlinks not supported")
+
+    monkeypatch.setattr(blob_store.os, "link", no_links)
+    recorded = blob_store.link_blob(blob, tmp_path / "ops" / "m1_x" / "quote.pdf")
+
+    assert recorded == blob
+    manifest = json.loads((tmp_path / "ops" / "m1_x" / blob_store.MANIFEST_NAME).read_text(encoding="utf-8"))
+    assert manifest == {"quote.pdf": str(blob)}
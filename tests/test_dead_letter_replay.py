@@ -1,24 +1,99 @@
-from datetime import datetime, timezone
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
+import httpx
 from sqlalchemy import create_engine, select
 from sqlalchemy.orm import Session
 
-from mail_scraper.db_schema import Base, DeadLetter
-from mail_scraper.pipeline_attachments import replay_dead_letters
+from mail_scraper.config import MailboxConfig
+from mail_scraper.db_schema import Base, DeadLetter, Mailbox, Message
+from mail_scraper.pipeline_replay import replay_backoff, replay_dead_letters
 
 
-def test_replay_dead_letters_marks_resolved() -> None:
+class _StubGraph:
+    """Serves m1, reports m-gone as deleted and fails m-down as if Graph were still unavailable."""
+
+    def __init__(self) -> None:
+        self.urls: list[str] = []
+
+    async def batched_get(self, url: str) -> dict:
+        self.urls.append(url)
+        message_id = url.split("/messages/")[1].split("?")[0]
+        if message_id == "m-down":
+            raise httpx.HTTPStatusError("unavailable", request=httpx.Request("GET", url), response=httpx.Response(503))
+        if message_id == "m-gone":
+            raise httpx.HTTPStatusError("gone", request=httpx.Request("GET", url), response=httpx.Response(404))
+        return {"id": message_id, "subject": "Quote", "hasAttachments": False, "parentFolderId": "f1"}
+
+
+def test_replay_reingests_messages_and_backs_off_failures(tmp_path: Path) -> None:
     engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
     Base.metadata.create_all(engine)
+    client = _StubGraph()
+    now = datetime(2026, 10, 17, tzinfo=timezone.utc)
 
     with Session(engine) as session:
-        session.add(DeadLetter(stage="ingest-message", error_message="boom", attempts=1))
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        for message_id in ("m1", "m-gone", "m-down"):
+            session.add(
+                DeadLetter(
+                    mailbox_id=mailbox.id, stage="ingest-message", payload_json={"id": message_id}, error_message="boom"
+                )
+            )
+        session.add(DeadLetter(mailbox_id=mailbox.id, stage="mystery", payload_json={}, error_message="boom"))
         session.commit()
+        configs = {mailbox.id: MailboxConfig(key="ops", user_id="ops@example.com")}
+
+        result = asyncio.run(replay_dead_letters(client, session, configs, limit=10, output_root=tmp_path, now=now))
+
+        assert (result.resolved, result.failed, result.skipped) == (2, 1, 1)
+        assert len(client.urls) == 3
+        assert session.execute(select(Message.graph_message_id)).scalars().all() == ["m1"]
+        letters = {
+            (row.payload_json or {}).get("id"): row
+            for row in session.execute(select(DeadLetter).where(DeadLetter.stage == "ingest-message")).scalars()
+        }
+        assert letters["m1"].resolved_at is not None and letters["m-gone"].resolved_at is not None
+        down = letters["m-down"]
+        assert down.resolved_at is None and down.attempts == 2
+        assert down.next_retry_at.replace(tzinfo=timezone.utc) == now + replay_backoff(2)
+
+        # Not due yet: a second pass right away leaves it alone.
+        again = asyncio.run(replay_dead_letters(client, session, configs, limit=10, output_root=tmp_path, now=now))
+        assert (again.resolved, again.failed) == (0, 0)
+
 
-        replayed = replay_dead_letters(session, stage="ingest-message", limit=10)
+def test_unreplayable_letters_do_not_fill_the_limit(tmp_path: Path) -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    client = _StubGraph()
+
+    with Session(engine) as session:
+        ops = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        other = Mailbox(mailbox_key="sales", user_id="sales@example.com")
+        session.add_all([ops, other])
+        session.flush()
+        # Oldest first: letters this run cannot replay, then the due one behind them.
+        for _ in range(3):
+            session.add(DeadLetter(mailbox_id=ops.id, stage="mystery", payload_json={}, error_message="boom"))
+            session.add(
+                DeadLetter(mailbox_id=other.id, stage="ingest-message", payload_json={"id": "m9"}, error_message="boom")
+            )
+        session.add(DeadLetter(mailbox_id=ops.id, stage="ingest-message", payload_json={"id": "m1"}, error_message="boom"))
         session.commit()
+        configs = {ops.id: MailboxConfig(key="ops", user_id="ops@example.com")}
+
+        result = asyncio.run(replay_dead_letters(client, session, configs, limit=2, output_root=tmp_path))
+
+        assert (result.resolved, result.failed, result.skipped) == (1, 0, 6)
+        assert len(client.urls) == 1 and "/users/ops@example.com/messages/m1?" in client.urls[0]
+        assert session.execute(select(Message.graph_message_id)).scalars().all() == ["m1"]
+
 
-        row = session.execute(select(DeadLetter)).scalar_one()
-        assert replayed == 1
-        assert row.resolved_at is not None
-        assert row.attempts == 2
+def test_replay_backoff_doubles_and_caps() -> None:
+    assert replay_backoff(1) == timedelta(seconds=60)
+    assert replay_backoff(3) == timedelta(seconds=240)
+    assert replay_backoff(30) == timedelta(hours=6)
@@ -0,0 +1,40 @@
+import os
+from pathlib import Path
+
+from mail_scraper.extract_cache import ExtractionCache, sha256_file
+
+
+def test_results_are_keyed_by_content_and_extractor_version(tmp_path: Path) -> None:
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4 one")
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(b"%PDF-1.4 one")
+    fields = ("PO-1", "12345", "10.00", "01/02/2026")
+
+    with ExtractionCache(tmp_path / "cache.sqlite", "1") as cache:
+        sha = cache.file_sha256(pdf)
+        assert sha == sha256_file(pdf)
+        assert cache.get(sha) is None
+        cache.put(sha, fields)
+        assert cache.get(cache.file_sha256(copy)) == fields
+
+    with ExtractionCache(tmp_path / "cache.sqlite", "1") as cache:
+        assert cache.get(sha) == fields
+        assert (cache.hits, cache.misses) == (1, 0)
+    with ExtractionCache(tmp_path / "cache.sqlite", "2") as cache:
+        assert cache.get(sha) is None
+
+
+def test_file_hash_is_recomputed_only_when_size_or_mtime_changes(tmp_path: Path) -> None:
+    pdf = tmp_path / "a.pdf"
+    pdf.write_bytes(b"%PDF-1.4 one")
+    with ExtractionCache(tmp_path / "cache.sqlite", "1") as cache:
+        first = cache.file_sha256(pdf)
+        # Same size and mtime: the memoised hash is trusted without reading the file.
+        stat = pdf.stat()
+        pdf.write_bytes(b"%PDF-1.4 two")
+        os.utime(pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        assert cache.file_sha256(pdf) == first
+
+        os.utime(pdf, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert cache.file_sha256(pdf) == sha256_file(pdf) != first
@@ -0,0 +1,51 @@
+import os
+from pathlib import Path
+import time
+
+from mail_scraper.extract_pool import _WorkerPool, extract_parallel
+
+
+def _flaky_extract(path: Path) -> str:
+    """Runs in the worker: hangs, kills its process, or raises for the files named after that."""
+    if path.name.startswith("hang"):
+        time.sleep(60)
+    if path.name.startswith("crash"):
+        os._exit(3)
+    if path.name.startswith("bad"):
+        raise ValueError("corrupt xref table")
+    return path.name.upper()
+
+
+def test_hung_and_crashing_files_fail_alone_and_the_rest_are_extracted() -> None:
+    good = [Path(f"ok{index}.pdf") for index in range(12)]
+    paths = good[:5] + [Path("hang.pdf"), Path("crash.pdf")] + good[5:] + [Path("bad.pdf")]
+
+    started = time.monotonic()
+    outcomes = {path: (value, error) for path, value, error in extract_parallel(paths, _flaky_extract, 3, timeout=2)}
+
+    assert time.monotonic() - started < 30
+    assert set(outcomes) == set(paths)
+    errors = {path.name: error for path, (_, error) in outcomes.items() if error}
+    assert set(errors) == {"hang.pdf", "crash.pdf", "bad.pdf"}
+    assert errors["hang.pdf"] == "timed out after 2s"
+    assert errors["crash.pdf"].startswith("worker crashed")
+    assert errors["bad.pdf"] == "ValueError: corrupt xref table"
+    assert all(outcomes[path] == (path.name.upper(), None) for path in good)
+
+
+def test_worker_pool_finds_its_processes_without_the_private_attribute() -> None:
+    pool = _WorkerPool(2)
+    try:
+        assert pool.executor.submit(os.getpid).result(timeout=30) != os.getpid()
+        private = pool.processes()
+        assert private
+
+        saved = pool.executor._processes
+        pool.executor._processes = None
+        try:
+            assert {proc.pid for proc in pool.processes()} == {proc.pid for proc in private}
+        finally:
+            pool.executor._processes = saved
+    finally:
+        pool.kill()
+    assert not any(proc.is_alive() for proc in private)
@@ -0,0 +1,71 @@
+import asyncio
+from pathlib import Path
+
+import httpx
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from mail_scraper.config import MailboxConfig
+from mail_scraper.db_schema import Attachment, Base, Mailbox, Message, PipelineRun
+from mail_scraper.fake_graph import FakeGraph, SyntheticMailbox
+from mail_scraper.graph_client import GraphClient, GraphRecorder
+from mail_scraper.pipeline_attachments import download_attachments_for_mailbox
+from mail_scraper.pipeline_ingest import ingest_mailbox
+
+
+def test_ingest_and_download_against_synthetic_mailbox(tmp_path: Path) -> None:
+    fake = FakeGraph(
+        [SyntheticMailbox("ops@example.com", folders=3, messages_per_folder=120, attachment_every=4, attachment_bytes=2048)],
+        throttle_rate=0.02,
+        error_rate=0.02,
+        retry_after_seconds=0,
+    )
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com")
+
+    async def scenario(session: Session, mailbox: Mailbox, run: PipelineRun) -> tuple:
+        async with fake.client() as client:
+            ingested = await ingest_mailbox(client, session, mailbox_cfg, mailbox, run)
+            downloaded = await download_attachments_for_mailbox(client, session, mailbox_cfg, mailbox, run, tmp_path)
+        return ingested, downloaded
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+
+        ingested, downloaded = asyncio.run(scenario(session, mailbox, run))
+
+        assert ingested.processed == 360 and ingested.errors == 0
+        assert downloaded == (90, 0, 0)
+        assert session.execute(select(func.count()).select_from(Message)).scalar_one() == 360
+        sizes = set(session.execute(select(Attachment.size_bytes)).scalars())
+        assert sizes == {2048}
+    assert fake.stats.throttled > 0 and fake.stats.errors > 0
+
+
+def test_recorded_calls_replay_through_fake_graph(tmp_path: Path) -> None:
+    live = FakeGraph([SyntheticMailbox("ops@example.com", folders=1, messages_per_folder=3)])
+    recorder = GraphRecorder(tmp_path / "graph.jsonl")
+    url = "/users/ops@example.com/mailFolders/f0/messages?$top=2&$filter=receivedDateTime ge 2025-12-31T23:58:00Z"
+
+    async def fetch(client: GraphClient) -> tuple[dict, dict]:
+        async with client:
+            return await client._get(url), await client.batched_get("/users/ops@example.com/messages/f0-m1/attachments")
+
+    recording_client = GraphClient(
+        http_client=httpx.AsyncClient(transport=live.transport(), event_hooks={"response": [recorder]})
+    )
+    recorded = asyncio.run(fetch(recording_client))
+    lines = (tmp_path / "graph.jsonl").read_text(encoding="utf-8")
+    assert "fake-token" not in lines and "login.microsoftonline.com" not in lines
+
+    # No synthetic mailbox: every answer has to come from the recording.
+    replay = FakeGraph(recordings=[tmp_path / "graph.jsonl"])
+    assert asyncio.run(fetch(replay.client())) == recorded
+    assert replay.stats.replayed == 2
+    assert [message["id"] for message in recorded[0]["value"]] == ["f0-m0", "f0-m1"]
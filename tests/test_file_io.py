@@ -0,0 +1,30 @@
+import asyncio
+from pathlib import Path
+import threading
+
+import pytest
+
+from mail_scraper import file_io
+
+
+def test_run_io_runs_off_the_event_loop_thread() -> None:
+    async def scenario() -> str:
+        return await file_io.run_io(lambda: threading.current_thread().name)
+
+    assert asyncio.run(scenario()).startswith("mail-scraper-io")
+
+
+def test_fsync_paths_flushes_files_and_directories(tmp_path: Path) -> None:
+    target = tmp_path / "nested" / "a.pdf"
+    target.parent.mkdir()
+    target.write_bytes(b"%PDF")
+
+    file_io.fsync_paths([target])
+
+
+def test_fsync_mode_rejects_unknown_values(monkeypatch) -> None:
+    monkeypatch.setattr(file_io.settings, "attachment_fsync", "Batch")
+    assert file_io.fsync_mode() == "batch"
+    monkeypatch.setattr(file_io.settings, "attachment_fsync", "always")
+    with pytest.raises(ValueError):
+        file_io.fsync_mode()
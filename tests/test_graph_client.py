@@ -1,4 +1,11 @@
-from mail_scraper.graph_client import GraphClient
+import asyncio
+import json
+import time
+
+import httpx
+
+from mail_scraper.config import settings
+from mail_scraper.graph_client import GraphClient, build_http_client
 
 
 def test_normalize_graph_path_absolute_next_link() -> None:
@@ -11,3 +18,93 @@ def test_normalize_graph_path_relative_path() -> None:
     relative = "/users/abc/mailFolders"
     normalized = GraphClient._normalize_graph_path(relative)
     assert normalized == relative
+
+
+def _client_with_transport(handler) -> GraphClient:
+    client = GraphClient(http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    client._token = "token"
+    client._token_expires_at = time.time() + 3600
+    return client
+
+
+def test_batched_get_fans_out_items_and_retries_throttled_ones() -> None:
+    batches: list[list[str]] = []
+    throttled: set[str] = set()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path.endswith("/$batch")
+        items = json.loads(request.content)["requests"]
+        batches.append([item["url"] for item in items])
+        responses = []
+        for item in items:
+            if item["url"] == "/missing":
+                responses.append({"id": item["id"], "status": 404, "body": {"error": {"code": "NotFound"}}})
+            elif item["url"] == "/busy" and item["url"] not in throttled:
+                throttled.add(item["url"])
+                responses.append({"id": item["id"], "status": 429, "headers": {"Retry-After": "1"}})
+            else:
+                responses.append({"id": item["id"], "status": 200, "body": {"path": item["url"]}})
+        return httpx.Response(200, json={"responses": responses})
+
+    async def scenario() -> list:
+        async with _client_with_transport(handler) as client:
+            paths = [f"/users/u/messages/{i}/attachments" for i in range(25)] + ["/busy", "/missing"]
+            return await asyncio.gather(*(client.batched_get(path) for path in paths), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert [len(batch) for batch in batches[:2]] == [20, 7]
+    assert batches[-1] == ["/busy"]
+    assert results[3] == {"path": "/users/u/messages/3/attachments"}
+    assert results[25] == {"path": "/busy"}
+    assert isinstance(results[26], httpx.HTTPStatusError)
+    assert results[26].response.status_code == 404
+
+
+def test_build_http_client_uses_split_timeouts_and_pool_limits(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "graph_connect_timeout_seconds", 5.0)
+    monkeypatch.setattr(settings, "graph_read_timeout_seconds", 45.0)
+    monkeypatch.setattr(settings, "graph_max_connections", 7)
+
+    client = build_http_client()
+
+    assert client.timeout.connect == 5.0
+    assert client.timeout.read == 45.0
+    asyncio.run(client.aclose())
+
+
+def test_shared_http_client_outlives_graph_client() -> None:
+    shared = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={})))
+
+    async def scenario() -> None:
+        async with GraphClient(http_client=shared):
+            pass
+        assert not shared.is_closed
+        await shared.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_download_to_streams_into_place_and_cleans_up_on_failure(tmp_path) -> None:
+    payload = b"%PDF-" + b"x" * 300_000
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/gone/$value"):
+            return httpx.Response(404)
+        return httpx.Response(200, content=payload)
+
+    async def scenario() -> tuple[int, Exception | None]:
+        async with _client_with_transport(handler) as client:
+            written = await client.download_to("/users/u/messages/m/attachments/a/$value", tmp_path / "a.pdf", 4096)
+            try:
+                await client.download_to("/users/u/messages/m/attachments/gone/$value", tmp_path / "b.pdf")
+            except httpx.HTTPStatusError as exc:
+                return written, exc
+            return written, None
+
+    written, failure = asyncio.run(scenario())
+
+    assert written == len(payload)
+    assert (tmp_path / "a.pdf").read_bytes() == payload
+    assert failure is not None and failure.response.status_code == 404
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.pdf"]
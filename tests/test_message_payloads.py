@@ -0,0 +1,55 @@
+from sqlalchemy import create_engine, inspect, select
+from sqlalchemy.orm import Session
+
+from mail_scraper import message_payloads
+from mail_scraper.db_schema import Base, Mailbox, Message, MessagePayload
+from mail_scraper.pipeline_ingest import _upsert_messages
+
+
+def _payload(subject: str) -> dict:
+    return {"id": "m1", "subject": subject, "hasAttachments": False, "body": {"content": "x" * 2000}}
+
+
+def test_compressed_storage_moves_payload_to_side_table(monkeypatch) -> None:
+    monkeypatch.setattr(message_payloads.settings, "message_payload_storage", "compressed")
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+
+        _upsert_messages(session, mailbox.id, [_payload("Quote")])
+        stored = session.execute(select(MessagePayload)).scalar_one()
+        assert len(stored.payload) < len(message_payloads._canonical_json(_payload("Quote")))
+
+        # Same payload again: nothing to rewrite. A changed one replaces the stored copy.
+        assert message_payloads.store_message_payloads(session, mailbox.id, [_payload("Quote")]) == 0
+        _upsert_messages(session, mailbox.id, [_payload("Quote v2")])
+        session.commit()
+
+        message = session.execute(select(Message)).scalar_one()
+        assert "raw_json" not in inspect(message).dict
+        assert message.raw_json is None
+        assert message_payloads.load_message_payload(session, message)["subject"] == "Quote v2"
+
+
+def test_load_message_payload_falls_back_to_inline_column() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        _upsert_messages(session, mailbox.id, [_payload("Quote")])
+
+        message = session.execute(select(Message)).scalar_one()
+        assert session.execute(select(MessagePayload)).first() is None
+        assert message_payloads.load_message_payload(session, message)["subject"] == "Quote"
+
+
+def test_decode_round_trips_with_zlib() -> None:
+    data = message_payloads.decode_payload("zlib", message_payloads.zlib.compress(b'{"id": "m1"}'))
+    assert data == {"id": "m1"}
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from mail_scraper import operations
+from mail_scraper.config import settings
+from mail_scraper.db_schema import DeadLetter, IngestWorkUnit, Mailbox, PipelineRun
+from mail_scraper.fake_graph import FakeGraph, SyntheticMailbox
+from mail_scraper.pipeline_ingest import IngestResult
+
+_STUB_CLIENT = SimpleNamespace(limiter=SimpleNamespace(max_concurrency=4))
+
+
+def _two_mailboxes(monkeypatch) -> None:
+    monkeypatch.setattr(
+        settings,
+        "mailboxes_json",
+        json.dumps([{"key": "ops", "user_id": "ops@example.com"}, {"key": "sales", "user_id": "sales@example.com"}]),
+    )
+
+
+def test_run_ingest_gives_each_concurrent_mailbox_its_own_run(sqlite_db, monkeypatch) -> None:
+    _two_mailboxes(monkeypatch)
+    started: set[str] = set()
+    both_started = asyncio.Event()
+
+    async def fake_ingest_mailbox(*, mailbox, run, **kwargs) -> IngestResult:
+        started.add(mailbox.key)
+        if len(started) == 2:
+            both_started.set()
+        # Only returns once the other mailbox is in flight too, so a serial run would hang here.
+        await asyncio.wait_for(both_started.wait(), timeout=5)
+        if mailbox.key == "sales":
+            raise RuntimeError("mailbox not found")
+        return IngestResult(processed=7, errors=1, max_received_at=None, updated=2)
+
+    monkeypatch.setattr(operations, "ingest_mailbox", fake_ingest_mailbox)
+
+    processed = asyncio.run(operations.run_ingest(mailbox_concurrency=2, client=_STUB_CLIENT))
+
+    assert processed == 7
+    with Session(sqlite_db) as session:
+        runs = {
+            key: run
+            for key, run in session.execute(
+                select(Mailbox.mailbox_key, PipelineRun).join(Mailbox, Mailbox.id == PipelineRun.mailbox_id)
+            ).all()
+        }
+        assert set(runs) == {"ops", "sales"}
+        ops, sales = runs["ops"], runs["sales"]
+        assert (ops.status, ops.processed_count, ops.error_count) == ("partial_success", 7, 1)
+        assert ops.metadata_json["updated_messages"] == 2
+        assert (sales.status, sales.processed_count, sales.error_count) == ("failed", 0, 1)
+        letters = session.execute(select(DeadLetter.mailbox_id, DeadLetter.stage)).all()
+        assert letters == [(sales.mailbox_id, "ingest-mailbox")]
+
+
+class _ThreadProcess:
+    """Stands in for a spawned worker process so workers share the test's in-memory database."""
+
+    exitcode: int | None = None
+
+    def __init__(self, target, args) -> None:
+        self._thread = threading.Thread(target=target, args=args)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def join(self) -> None:
+        self._thread.join()
+        self.exitcode = 0
+
+
+class _KilledProcess(_ThreadProcess):
+    """A worker the OOM killer took down before it did anything."""
+
+    def start(self) -> None:
+        pass
+
+    def join(self) -> None:
+        self.exitcode = -9
+
+
+def test_sharded_ingest_reports_messages_processed_by_workers(sqlite_db, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "mailboxes_json", json.dumps([{"key": "ops", "user_id": "ops@example.com"}]))
+    fake = FakeGraph([SyntheticMailbox("ops@example.com", folders=3, messages_per_folder=9, attachments_per_message=0)])
+    monkeypatch.setattr(operations.multiprocessing, "get_context", lambda method: SimpleNamespace(Process=_ThreadProcess))
+    # Workers open their own client; give them one wired to the fake too.
+    monkeypatch.setattr(operations, "GraphClient", lambda: fake.client())
+
+    async def scenario() -> int:
+        async with fake.client() as client:
+            return await operations.run_ingest(workers=1, client=client)
+
+    processed = asyncio.run(scenario())
+
+    assert processed == 27
+    with Session(sqlite_db) as session:
+        units = session.execute(select(IngestWorkUnit.graph_folder_id, IngestWorkUnit.processed_count)).all()
+        assert sorted(units) == [("f0", 9), ("f1", 9), ("f2", 9), ("root", 0)]
+        run = session.execute(select(PipelineRun).where(PipelineRun.pipeline_name == "ingest")).scalar_one()
+        assert (run.status, run.processed_count) == ("success", 27)
+        assert session.execute(select(func.sum(IngestWorkUnit.processed_count))).scalar_one() == processed
+
+
+def test_sharded_ingest_fails_when_a_worker_process_dies(sqlite_db, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "mailboxes_json", json.dumps([{"key": "ops", "user_id": "ops@example.com"}]))
+    fake = FakeGraph([SyntheticMailbox("ops@example.com", folders=2, messages_per_folder=3, attachments_per_message=0)])
+    monkeypatch.setattr(operations.multiprocessing, "get_context", lambda method: SimpleNamespace(Process=_KilledProcess))
+
+    async def scenario() -> int:
+        async with fake.client() as client:
+            return await operations.run_ingest(workers=1, client=client)
+
+    with pytest.raises(RuntimeError, match=r"exit code -9"):
+        asyncio.run(scenario())
+    with Session(sqlite_db) as session:
+        statuses = set(session.execute(select(IngestWorkUnit.status)).scalars())
+        assert statuses == {"pending"}
@@ -1,6 +1,30 @@
+import asyncio
+import hashlib
 from pathlib import Path
 
-from mail_scraper.pipeline_attachments import _make_attachment_filename, _make_message_dir
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import Session
+
+from mail_scraper.config import MailboxConfig
+from mail_scraper.db_schema import (
+    Attachment,
+    AttachmentWorkItem,
+    Base,
+    DeadLetter,
+    Mailbox,
+    Message,
+    PipelineCheckpoint,
+    PipelineRun,
+)
+from mail_scraper.pipeline_attachments import (
+    _attachment_filter_reason,
+    _make_attachment_filename,
+    _make_message_dir,
+    download_attachments_for_mailbox,
+    download_work_items,
+    enqueue_attachment_work,
+)
+from mail_scraper.work_queue import claim_work_items
 
 
 def test_make_message_dir_is_short_and_stable() -> None:
@@ -30,3 +54,241 @@ def test_make_attachment_filename_sanitizes_and_bounds_length() -> None:
     assert ">" not in safe
     assert safe.endswith(".pdf")
     assert len(safe) <= 80
+
+
+class _StubGraph:
+    def __init__(self) -> None:
+        self.downloads: list[str] = []
+
+    async def batched_get(self, url: str) -> dict:
+        return {"value": [{"id": "a1", "name": "quote.pdf", "@odata.type": "#microsoft.graph.fileAttachment"}]}
+
+    async def download_to(
+        self, url: str, destination: Path, chunk_size: int = 1 << 20, digest=None, fsync: bool = False
+    ) -> int:
+        self.downloads.append(url)
+        destination.write_bytes(b"%PDF")
+        if digest is not None:
+            digest.update(b"%PDF")
+        return 4
+
+
+def test_download_skips_attachments_already_on_disk_unless_forced(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'db.sqlite'}", future=True)
+    Base.metadata.create_all(engine)
+    client = _StubGraph()
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com")
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        session.add(Message(mailbox_id=mailbox.id, graph_message_id="m1", has_attachments=True))
+        run = PipelineRun(pipeline_name="download_attachments", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.commit()
+
+        def download(force: bool = False) -> tuple[int, int, int]:
+            # Reset the cursor so every run revisits the same message.
+            session.execute(delete(PipelineCheckpoint))
+            return asyncio.run(
+                download_attachments_for_mailbox(client, session, mailbox_cfg, mailbox, run, tmp_path, force=force)
+            )
+
+        assert download() == (1, 0, 0)
+        assert download() == (0, 0, 1)
+        assert len(client.downloads) == 1
+        assert download(force=True) == (1, 0, 0)
+        assert len(client.downloads) == 2
+
+        row = session.execute(select(Attachment)).scalar_one()
+        assert row.content_sha256 == hashlib.sha256(b"%PDF").hexdigest()
+
+
+class _OutOfOrderGraph(_StubGraph):
+    """Finishes later messages first and fails the listing for m2."""
+
+    async def batched_get(self, url: str) -> dict:
+        message_id = url.split("/messages/")[1].split("/")[0]
+        await asyncio.sleep({"m1": 0.02, "m2": 0.01, "m3": 0.0}[message_id])
+        if message_id == "m2":
+            raise RuntimeError("listing failed")
+        return {"value": [{"id": f"{message_id}-a", "name": "quote.pdf"}]}
+
+
+def test_download_cursor_only_advances_past_completed_prefix(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'db.sqlite'}", future=True)
+    Base.metadata.create_all(engine)
+    client = _OutOfOrderGraph()
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com")
+    events: list[dict] = []
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        messages = [Message(mailbox_id=mailbox.id, graph_message_id=f"m{n}", has_attachments=True) for n in (1, 2, 3)]
+        session.add_all(messages)
+        run = PipelineRun(pipeline_name="download_attachments", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.commit()
+
+        result = asyncio.run(
+            download_attachments_for_mailbox(
+                client, session, mailbox_cfg, mailbox, run, tmp_path, progress_cb=events.append, max_concurrency=3
+            )
+        )
+
+        assert result == (2, 1, 0)
+        progress = [event for event in events if event["stage"] == "attachments-progress"]
+        assert [event["current_message_id"] for event in progress] == ["m3", "m2", "m1"]
+        # m3 finished first but the cursor waits until m1 and m2 are done too.
+        assert [event["resume_after_message_pk"] for event in progress] == [0, 0, messages[2].id]
+        stored = session.execute(select(Attachment.graph_attachment_id).order_by(Attachment.id)).scalars().all()
+        assert sorted(stored) == ["m1-a", "m3-a"]
+
+
+class _SharedQuoteGraph(_StubGraph):
+    """Every message carries its own attachment id for the same quote PDF."""
+
+    async def batched_get(self, url: str) -> dict:
+        message_id = url.split("/messages/")[1].split("/")[0]
+        return {"value": [{"id": f"{message_id}-a", "name": "quote.pdf"}]}
+
+
+def test_content_addressed_mode_stores_shared_attachment_once(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'db.sqlite'}", future=True)
+    Base.metadata.create_all(engine)
+    client = _SharedQuoteGraph()
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com")
+    output_root = tmp_path / "raw_data"
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        session.add_all(
+            [Message(mailbox_id=mailbox.id, graph_message_id=f"m{n}", has_attachments=True) for n in (1, 2)]
+        )
+        run = PipelineRun(pipeline_name="download_attachments", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.commit()
+
+        result = asyncio.run(
+            download_attachments_for_mailbox(
+                client, session, mailbox_cfg, mailbox, run, output_root, content_addressed=True
+            )
+        )
+        hashes = set(session.execute(select(Attachment.content_sha256)).scalars())
+
+    assert result == (2, 0, 0)
+    assert hashes == {hashlib.sha256(b"%PDF").hexdigest()}
+
+    blobs = [p for p in (output_root / "_blobs").rglob("*.pdf")]
+    assert len(blobs) == 1
+    assert blobs[0].name == f"{hashlib.sha256(b'%PDF').hexdigest()}.pdf"
+    links = [p for p in (output_root / "ops").rglob("*.pdf")]
+    assert len(links) == 2
+    assert all(p.stat().st_ino == blobs[0].stat().st_ino for p in links)
+
+
+def test_attachment_filter_reason_applies_mailbox_rules() -> None:
+    mailbox = MailboxConfig(
+        key="ops",
+        user_id="ops@example.com",
+        attachment_include_content_types=["application/pdf"],
+        attachment_include_extensions=["XLSX"],
+        attachment_exclude_extensions=[".tmp.pdf", "p7s"],
+        attachment_min_size_bytes=1024,
+        attachment_max_size_bytes=10_000_000,
+    )
+
+    assert _attachment_filter_reason(mailbox, "quote.pdf", "application/pdf", 50_000) is None
+    assert _attachment_filter_reason(mailbox, "prices.xlsx", "application/octet-stream", 50_000) is None
+    assert _attachment_filter_reason(mailbox, "logo.png", "image/png", 50_000).startswith("not included")
+    assert _attachment_filter_reason(mailbox, "smime.p7s", "application/pdf", 50_000).startswith("excluded")
+    assert _attachment_filter_reason(mailbox, "tiny.pdf", "application/pdf", 10).startswith("smaller")
+    assert _attachment_filter_reason(mailbox, "huge.pdf", "application/pdf", 20_000_000).startswith("larger")
+
+    images_out = MailboxConfig(key="ops", user_id="ops@example.com", attachment_exclude_content_types=["image/*"])
+    assert _attachment_filter_reason(images_out, "logo.png", "image/png", None) == "excluded content type image/png"
+    assert _attachment_filter_reason(images_out, "invite.ics", "text/calendar", None) is None
+
+
+class _MixedGraph(_StubGraph):
+    async def batched_get(self, url: str) -> dict:
+        return {
+            "value": [
+                {"id": "a1", "name": "quote.pdf", "contentType": "application/pdf", "size": 4},
+                {"id": "a2", "name": "logo.png", "contentType": "image/png", "size": 900},
+            ]
+        }
+
+
+def test_filtered_attachments_are_recorded_without_fetching(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'db.sqlite'}", future=True)
+    Base.metadata.create_all(engine)
+    client = _MixedGraph()
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com", attachment_exclude_content_types=["image/*"])
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        session.add(Message(mailbox_id=mailbox.id, graph_message_id="m1", has_attachments=True))
+        run = PipelineRun(pipeline_name="download_attachments", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.commit()
+
+        result = asyncio.run(download_attachments_for_mailbox(client, session, mailbox_cfg, mailbox, run, tmp_path))
+        statuses = dict(session.execute(select(Attachment.name, Attachment.download_status)).all())
+
+    assert result == (1, 0, 1)
+    assert len(client.downloads) == 1 and client.downloads[0].endswith("/a1/$value")
+    assert statuses == {"quote.pdf": "success", "logo.png": "filtered"}
+
+
+def test_attachment_work_items_complete_or_release_per_message(tmp_path: Path) -> None:
+    engine = create_engine(f"sqlite+pysqlite:///{tmp_path / 'db.sqlite'}", future=True)
+    Base.metadata.create_all(engine)
+    client = _OutOfOrderGraph()
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com")
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        session.add_all(
+            [Message(mailbox_id=mailbox.id, graph_message_id=f"m{n}", has_attachments=True) for n in (1, 2, 3)]
+        )
+        session.add(Message(mailbox_id=mailbox.id, graph_message_id="plain", has_attachments=False))
+        run = PipelineRun(pipeline_name="download_attachments", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.commit()
+
+        assert enqueue_attachment_work(session, mailbox) == 3
+        assert enqueue_attachment_work(session, mailbox) == 0
+
+        def attempt() -> tuple[int, int, int]:
+            items = claim_work_items(session, AttachmentWorkItem, "w1", lease_seconds=60, limit=10)
+            return asyncio.run(
+                download_work_items(client, session, mailbox_cfg, mailbox, run, tmp_path, items, max_attempts=2)
+            )
+
+        assert attempt() == (2, 1, 0)
+        assert session.execute(select(DeadLetter)).scalars().all() == []
+        # Only m2 is back in the queue; its second failure uses up the attempts.
+        assert attempt() == (0, 1, 0)
+        assert attempt() == (0, 0, 0)
+
+        statuses = {
+            item.message_id: (item.status, item.processed_count)
+            for item in session.execute(select(AttachmentWorkItem)).scalars()
+        }
+        message_ids = dict(session.execute(select(Message.graph_message_id, Message.id)).all())
+        assert statuses == {
+            message_ids["m1"]: ("done", 1),
+            message_ids["m2"]: ("failed", 0),
+            message_ids["m3"]: ("done", 1),
+        }
+        assert len(session.execute(select(DeadLetter)).scalars().all()) == 1
@@ -1,6 +1,26 @@
+import asyncio
 from datetime import datetime, timezone
+import json
+from pathlib import Path
 
-from mail_scraper.pipeline_ingest import _path_matches, _to_dt
+import pytest
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from mail_scraper.config import MailboxConfig, settings
+from mail_scraper.db_schema import Base, Folder, Mailbox, Message, PipelineCheckpoint, PipelineRun
+from mail_scraper.fake_graph import FakeGraph, SyntheticMailbox
+from mail_scraper.pipeline_ingest import (
+    _FolderPage,
+    _IngestWriter,
+    _list_all_folders,
+    _path_matches,
+    _remove_message,
+    _to_dt,
+    _upsert_messages,
+    ingest_mailbox,
+)
 
 
 def test_to_dt_iso8601() -> None:
@@ -16,3 +36,436 @@ def test_path_matches_include_exclude() -> None:
     assert not _path_matches(path, ["sales"], [])
     assert not _path_matches(path, [], ["invoices"])
     assert _path_matches(path, [], [])
+
+
+def test_remove_message_only_drops_rows_still_in_folder() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        session.add(Message(mailbox_id=mailbox.id, graph_message_id="m1", graph_folder_id="folder-b"))
+        session.flush()
+
+        # A move from folder-a reports a removal there after the add already landed in folder-b.
+        assert not _remove_message(session, mailbox.id, "folder-a", "m1")
+        assert _remove_message(session, mailbox.id, "folder-b", "m1")
+        assert session.execute(select(Message)).scalar_one_or_none() is None
+
+
+def test_writer_drops_buffered_adds_removed_in_the_same_window() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+
+    async def scenario(writer: _IngestWriter) -> None:
+        writer.add_folder({"id": "f1", "total_item_count": 2}, None, None)
+        await writer._accept(_FolderPage("f1", [{"id": "m1"}, {"id": "m2"}]))
+        # Removed before the buffer is flushed: m1 must not be written back afterwards.
+        await writer._accept(_FolderPage("f1", [], removed_ids=["m1"], final=True))
+        await writer._flush()
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+        writer = _IngestWriter(session, run, mailbox.id, hard_limit=None)
+
+        asyncio.run(scenario(writer))
+
+        assert set(session.execute(select(Message.graph_message_id)).scalars()) == {"m2"}
+        assert writer.folders["f1"].inserted == 1
+
+
+def test_upsert_messages_counts_inserts_and_updates() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+
+        page = [
+            {"id": "m1", "subject": "first", "receivedDateTime": "2026-02-23T12:00:00Z"},
+            {"id": "m2", "subject": "second", "hasAttachments": True},
+        ]
+        assert _upsert_messages(session, mailbox.id, page) == (2, 0)
+
+        page = [{"id": "m2", "subject": "second (edited)"}, {"id": "m3"}, {"id": "m3", "subject": "dup"}]
+        assert _upsert_messages(session, mailbox.id, page) == (1, 1)
+
+        rows = {row.graph_message_id: row for row in session.execute(select(Message)).scalars()}
+        assert rows["m2"].source_subject == "second (edited)"
+        assert rows["m3"].source_subject == "dup"
+        assert rows["m1"].source_received_at is not None
+
+
+class _StubGraph:
+    def __init__(self, pages: dict[str, dict]) -> None:
+        self.pages = pages
+
+    async def _get(self, url: str, params=None, extra_headers=None) -> dict:
+        for prefix, page in self.pages.items():
+            if url.startswith(prefix):
+                return page
+        raise AssertionError(f"unexpected Graph call: {url}")
+
+    async def batched_get(self, url: str) -> dict:
+        return await self._get(url)
+
+
+def test_ingest_mailbox_writes_pages_through_single_writer() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    client = _StubGraph(
+        {
+            "/users/ops@example.com/mailFolders/Inbox/childFolders": {"value": []},
+            "/users/ops@example.com/mailFolders/Inbox": {"id": "inbox-id", "displayName": "Inbox"},
+            "/users/ops@example.com/mailFolders/inbox-id/childFolders": {"value": []},
+            "/users/ops@example.com/mailFolders/inbox-id/messages?": {
+                "value": [{"id": "m1", "receivedDateTime": "2026-02-23T12:00:00Z"}],
+                "@odata.nextLink": "https://graph.microsoft.com/v1.0/page-2",
+            },
+            "/page-2": {"value": [{"id": "m2", "receivedDateTime": "2026-02-24T08:00:00Z"}]},
+        }
+    )
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com", root_folder_name="Inbox")
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+
+        result = asyncio.run(ingest_mailbox(client, session, mailbox_cfg, mailbox, run))
+
+        assert result.processed == 2
+        assert result.stats["pages_fetched"] == 2
+        assert result.stats["rows_written"] == 2
+        assert result.max_received_at is not None and result.max_received_at.day == 24
+        assert {row.graph_message_id for row in session.execute(select(Message)).scalars()} == {"m1", "m2"}
+        folder = session.execute(select(Folder)).scalar_one()
+        assert folder.last_max_received_at.day == 24
+        assert folder.last_synced_at is not None
+
+
+def test_ingest_mailbox_hard_limit_caps_rows_per_folder() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    # One folder of four 50-message pages; the cap lands inside the second page.
+    fake = FakeGraph([SyntheticMailbox("ops@example.com", folders=1, messages_per_folder=200)])
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com")
+
+    async def scenario(session: Session, mailbox: Mailbox, run: PipelineRun):
+        async with fake.client() as client:
+            return await ingest_mailbox(client, session, mailbox_cfg, mailbox, run, hard_limit=60)
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+
+        result = asyncio.run(scenario(session, mailbox, run))
+
+        assert result.processed == 60
+        assert result.stats["rows_written"] == 60
+        assert len(session.execute(select(Message.id)).all()) == 60
+
+
+@pytest.mark.parametrize(("messages_per_folder", "fully_synced"), [(50, True), (200, False)])
+def test_hard_limit_stops_only_folders_it_cut_short(messages_per_folder: int, fully_synced: bool) -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    fake = FakeGraph([SyntheticMailbox("ops@example.com", folders=1, messages_per_folder=messages_per_folder)])
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com")
+
+    async def scenario(session: Session, mailbox: Mailbox, run: PipelineRun):
+        async with fake.client() as client:
+            return await ingest_mailbox(client, session, mailbox_cfg, mailbox, run, hard_limit=50)
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+
+        first = asyncio.run(scenario(session, mailbox, run))
+        assert first.processed == 50
+
+        # A folder that ended exactly at the limit keeps its counts, so the next run skips it.
+        folder = session.execute(select(Folder).where(Folder.graph_folder_id == "f0")).scalar_one()
+        assert (folder.last_synced_item_count == messages_per_folder) is fully_synced
+        second = asyncio.run(scenario(session, mailbox, run))
+        assert ("f0" not in second.folder_processed) is fully_synced
+
+
+def test_ingest_mailbox_skips_folders_with_unchanged_counts() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    folders = {
+        "/users/ops@example.com/mailFolders/Inbox": {"id": "inbox-id", "displayName": "Inbox", "totalItemCount": 1},
+        "/users/ops@example.com/mailFolders/inbox-id/childFolders": {"value": []},
+    }
+    messages = {
+        "/users/ops@example.com/mailFolders/inbox-id/messages?": {
+            "value": [{"id": "m1", "receivedDateTime": "2026-02-23T12:00:00Z"}],
+        },
+    }
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com", root_folder_name="Inbox")
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+
+        first = asyncio.run(ingest_mailbox(_StubGraph({**folders, **messages}), session, mailbox_cfg, mailbox, run))
+        assert first.processed == 1 and first.skipped_folders == 0
+
+        # Same counts: the messages endpoint must not be called at all.
+        second = asyncio.run(ingest_mailbox(_StubGraph(folders), session, mailbox_cfg, mailbox, run))
+        assert second.processed == 0 and second.skipped_folders == 1
+
+        folders["/users/ops@example.com/mailFolders/Inbox"]["totalItemCount"] = 2
+        third = asyncio.run(ingest_mailbox(_StubGraph({**folders, **messages}), session, mailbox_cfg, mailbox, run))
+        assert third.skipped_folders == 0 and third.updated == 1
+
+
+def test_list_all_folders_walks_breadth_first_and_skips_leaves() -> None:
+    client = _StubGraph(
+        {
+            "/users/ops@example.com/mailFolders/Jobs": {"id": "root", "displayName": "Jobs", "childFolderCount": 2},
+            "/users/ops@example.com/mailFolders/root/childFolders?$top=999": {
+                "value": [
+                    {"id": "nc", "displayName": "NC", "childFolderCount": 1},
+                    {"id": "va", "displayName": "VA", "childFolderCount": 0},
+                ]
+            },
+            "/users/ops@example.com/mailFolders/nc/childFolders?$top=999": {
+                "value": [{"id": "j1", "displayName": "10001", "childFolderCount": 0, "totalItemCount": 7}]
+            },
+        }
+    )
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com", root_folder_name="Jobs")
+    seen: list[str] = []
+
+    folders = asyncio.run(_list_all_folders(client, mailbox_cfg, on_folder=lambda item: seen.append(item["id"])))
+
+    by_id = {folder["id"]: folder for folder in folders}
+    assert seen == ["root", "nc", "va", "j1"]
+    assert by_id["j1"]["path_parts"] == ["Jobs", "NC", "10001"]
+    assert by_id["j1"]["parent_id"] == "nc" and by_id["j1"]["total_item_count"] == 7
+
+
+def test_ingest_mailbox_uses_fresh_cached_folder_tree(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "folder_tree_ttl_minutes", 60)
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    folders = {
+        "/users/ops@example.com/mailFolders/Inbox": {
+            "id": "inbox-id",
+            "displayName": "Inbox",
+            "childFolderCount": 0,
+            "totalItemCount": 1,
+        },
+    }
+    counts = {"/users/ops@example.com/mailFolders/inbox-id?$select": {"id": "inbox-id", "totalItemCount": 1}}
+    messages = {
+        "/users/ops@example.com/mailFolders/inbox-id/messages?": {
+            "value": [{"id": "m1", "receivedDateTime": "2026-02-23T12:00:00Z"}],
+        },
+    }
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com", root_folder_name="Inbox")
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+
+        asyncio.run(ingest_mailbox(_StubGraph({**folders, **messages}), session, mailbox_cfg, mailbox, run))
+
+        # Within the TTL no folder listing is made; one count refresh shows the folder unchanged,
+        # so its messages are not requested either.
+        second = asyncio.run(ingest_mailbox(_StubGraph(counts), session, mailbox_cfg, mailbox, run))
+        assert second.synced_folders == 0 and second.skipped_folders == 1
+
+        counts["/users/ops@example.com/mailFolders/inbox-id?$select"]["totalItemCount"] = 2
+        third = asyncio.run(ingest_mailbox(_StubGraph({**counts, **messages}), session, mailbox_cfg, mailbox, run))
+        assert third.synced_folders == 1 and third.updated == 1
+        assert session.execute(select(Folder.total_item_count)).scalar_one() == 2
+
+        # Past the TTL the walk re-lists the folder too, but it is still judged (and skipped) once.
+        folders["/users/ops@example.com/mailFolders/Inbox"]["totalItemCount"] = 2
+        tree = session.execute(
+            select(PipelineCheckpoint).where(PipelineCheckpoint.pipeline_name == "folder_tree")
+        ).scalar_one()
+        tree.last_successful_sync_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        fourth = asyncio.run(ingest_mailbox(_StubGraph({**counts, **folders}), session, mailbox_cfg, mailbox, run))
+        assert fourth.synced_folders == 0 and fourth.skipped_folders == 1
+
+
+def test_cached_folder_tree_evicts_folders_deleted_in_graph(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "folder_tree_ttl_minutes", 60)
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    synthetic = SyntheticMailbox("ops@example.com", folders=2, messages_per_folder=3)
+    fake = FakeGraph([synthetic])
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com")
+
+    async def scenario(session: Session, mailbox: Mailbox, run: PipelineRun):
+        async with fake.client() as client:
+            return await ingest_mailbox(client, session, mailbox_cfg, mailbox, run)
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+
+        asyncio.run(scenario(session, mailbox, run))
+        # f1 is deleted in Exchange: its count refresh 404s once, and it leaves the cached tree.
+        synthetic.folders = 1
+        second = asyncio.run(scenario(session, mailbox, run))
+        assert second.errors == 0 and second.skipped_folders == 2
+        assert set(session.execute(select(Folder.graph_folder_id)).scalars()) == {"root", "f0"}
+
+        items_before = fake.stats.batch_items
+        third = asyncio.run(scenario(session, mailbox, run))
+        assert third.skipped_folders == 2
+        assert fake.stats.batch_items - items_before == 2
+
+
+def _logged_fake_graph(mailbox: SyntheticMailbox) -> tuple[FakeGraph, list[str]]:
+    """A FakeGraph that also records the path of every top-level request it answers."""
+    fake = FakeGraph([mailbox])
+    calls: list[str] = []
+    handle = fake.handle
+
+    async def logged(request):
+        calls.append(request.url.raw_path.decode("ascii").replace("%24", "$"))
+        return await handle(request)
+
+    fake.handle = logged
+    return fake, calls
+
+
+def _write_recording(path: Path, entries: list[tuple[str, int, dict]]) -> Path:
+    with path.open("w", encoding="utf-8") as handle:
+        for url, status, body in entries:
+            handle.write(json.dumps({"method": "GET", "path": url, "status": status, "json": body}) + "\n")
+    return path
+
+
+def test_delta_ingest_keeps_folder_links_applies_removals_and_resyncs_on_410(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    # Re-pull every folder on every run so the delta rounds themselves are exercised.
+    monkeypatch.setattr(settings, "folder_recheck_hours", 0)
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    fake, calls = _logged_fake_graph(SyntheticMailbox("ops@example.com", folders=2, messages_per_folder=120))
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com", ingest_mode="delta")
+    token_path = "/users/ops@example.com/mailFolders/{}/messages/delta?$deltatoken=synthetic"
+
+    async def scenario(session: Session, mailbox: Mailbox, run: PipelineRun):
+        async with fake.client() as client:
+            return await ingest_mailbox(client, session, mailbox_cfg, mailbox, run)
+
+    def message_calls() -> list[str]:
+        return [call for call in calls if "/messages" in call]
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+
+        first = asyncio.run(scenario(session, mailbox, run))
+        assert first.processed == 240
+        links = dict(session.execute(select(Folder.graph_folder_id, Folder.last_delta_link)).all())
+        assert links["f0"].endswith(token_path.format("f0")) and links["f1"].endswith(token_path.format("f1"))
+
+        # The second round only replays each folder's stored deltaLink.
+        calls.clear()
+        second = asyncio.run(scenario(session, mailbox, run))
+        assert second.processed == 0 and second.updated == 0
+        assert message_calls() and all("$deltatoken=" in call for call in message_calls())
+
+        fake.load_recording(
+            _write_recording(
+                tmp_path / "removed.jsonl",
+                [(token_path.format("f0"), 200, {"value": [{"id": "f0-m3", "@removed": {"reason": "deleted"}}]})],
+            )
+        )
+        third = asyncio.run(scenario(session, mailbox, run))
+        assert third.removed == 1
+        ids = set(session.execute(select(Message.graph_message_id)).scalars())
+        assert "f0-m3" not in ids and len(ids) == 239
+
+        # Graph expired f1's sync state: that folder starts a fresh initial round instead.
+        fake.load_recording(
+            _write_recording(
+                tmp_path / "gone.jsonl",
+                [(token_path.format("f1"), 410, {"error": {"code": "SyncStateNotFound"}})],
+            )
+        )
+        calls.clear()
+        fourth = asyncio.run(scenario(session, mailbox, run))
+        assert fourth.errors == 0
+        f1_calls = [call for call in message_calls() if "/mailFolders/f1/" in call]
+        assert "$deltatoken=" in f1_calls[0] and "$deltatoken=" not in f1_calls[1]
+        assert fourth.folder_processed["f1"] == 0 and fourth.updated > 0
+
+
+def test_delta_ingest_resumes_from_saved_next_link_after_a_limit_stop() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    fake, calls = _logged_fake_graph(SyntheticMailbox("ops@example.com", folders=1, messages_per_folder=200))
+    mailbox_cfg = MailboxConfig(key="ops", user_id="ops@example.com", ingest_mode="delta")
+
+    async def scenario(session: Session, mailbox: Mailbox, run: PipelineRun, hard_limit: int | None):
+        async with fake.client() as client:
+            return await ingest_mailbox(client, session, mailbox_cfg, mailbox, run, hard_limit=hard_limit)
+
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        run = PipelineRun(pipeline_name="ingest", mailbox_id=mailbox.id, status="running")
+        session.add(run)
+        session.flush()
+
+        # The limit cuts the second page short, so only the first page's nextLink is kept.
+        first = asyncio.run(scenario(session, mailbox, run, 60))
+        assert first.processed == 60
+        folder = session.execute(select(Folder).where(Folder.graph_folder_id == "f0")).scalar_one()
+        assert folder.last_delta_link.endswith("$skiptoken=50")
+
+        calls.clear()
+        second = asyncio.run(scenario(session, mailbox, run, None))
+        f0_calls = [call for call in calls if "/mailFolders/f0/messages/delta" in call]
+        assert f0_calls[0].endswith("$skiptoken=50")
+        assert second.processed == 140
+        assert len(session.execute(select(Message.id)).all()) == 200
+        assert folder.last_delta_link.endswith("$deltatoken=synthetic")
@@ -0,0 +1,33 @@
+import asyncio
+
+from mail_scraper.rate_limit import AimdGate, GraphRateLimiter, mailbox_scope
+
+
+def test_mailbox_scope_from_graph_paths() -> None:
+    assert mailbox_scope("/users/Ops@Example.com/mailFolders/abc/messages") == "ops@example.com"
+    assert mailbox_scope("/$batch") is None
+
+
+def test_aimd_gate_grows_on_success_and_halves_on_throttle() -> None:
+    gate = AimdGate(initial=4, ceiling=8)
+    for _ in range(40):
+        gate.on_success()
+    assert gate.limit == 8
+
+    gate.on_throttle(pause_seconds=5)
+    assert gate.limit == 4
+    assert gate.pause_remaining() > 4
+
+
+def test_mailbox_throttle_pauses_only_that_scope() -> None:
+    limiter = GraphRateLimiter(initial=4, ceiling=16, per_mailbox=4)
+
+    limiter.throttled("ops@example.com", 30)
+
+    async def acquire_other_mailbox() -> None:
+        async with limiter.slot("sales@example.com") as slot:
+            slot.record(200, None)
+
+    asyncio.run(asyncio.wait_for(acquire_other_mailbox(), timeout=1))
+    assert limiter.snapshot()["throttled_scopes"] == 1
+    assert limiter.snapshot()["global_limit"] < 4
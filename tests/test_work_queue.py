@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from mail_scraper.db_schema import Base, IngestWorkUnit, Mailbox
+from mail_scraper.pipeline_ingest import enqueue_folder_work
+from mail_scraper.work_queue import claim_work_items, complete_work_item, release_work_item
+
+
+def _folders(*ids: str) -> list[dict]:
+    return [
+        {
+            "id": folder_id,
+            "path_parts": ["Inbox", folder_id],
+            "display_name": folder_id,
+            "parent_id": None,
+            "total_item_count": 0,
+        }
+        for folder_id in ids
+    ]
+
+
+def test_claim_leases_each_unit_once_and_reclaims_stale_leases() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        assert enqueue_folder_work(session, mailbox, _folders("f1", "f2", "f3")) == ["f1", "f2", "f3"]
+        session.commit()
+
+        first = claim_work_items(session, IngestWorkUnit, "w1", lease_seconds=60, limit=2)
+        second = claim_work_items(session, IngestWorkUnit, "w2", lease_seconds=60, limit=2)
+        assert [unit.graph_folder_id for unit in first] == ["f1", "f2"]
+        assert [unit.graph_folder_id for unit in second] == ["f3"]
+        assert claim_work_items(session, IngestWorkUnit, "w3", lease_seconds=60) == []
+
+        # w1 stops heartbeating; its units become claimable again.
+        for unit in first:
+            unit.heartbeat_at = datetime.now(timezone.utc) - timedelta(minutes=5)
+        session.commit()
+        reclaimed = claim_work_items(session, IngestWorkUnit, "w3", lease_seconds=60, limit=5)
+        assert {unit.graph_folder_id for unit in reclaimed} == {"f1", "f2"}
+        assert all(unit.attempts == 2 for unit in reclaimed)
+
+        # A re-enqueue leaves live leases alone.
+        assert enqueue_folder_work(session, mailbox, _folders("f1", "f2", "f3")) == []
+
+
+def test_release_retries_until_max_attempts() -> None:
+    engine = create_engine("sqlite+pysqlite:///:memory:", future=True)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        mailbox = Mailbox(mailbox_key="ops", user_id="ops@example.com")
+        session.add(mailbox)
+        session.flush()
+        enqueue_folder_work(session, mailbox, _folders("f1", "f2"))
+        session.commit()
+
+        done, flaky = claim_work_items(session, IngestWorkUnit, "w1", lease_seconds=60, limit=2)
+        complete_work_item(done)
+        release_work_item(flaky, error="boom", max_attempts=2)
+        session.commit()
+        assert flaky.status == "pending"
+
+        (flaky,) = claim_work_items(session, IngestWorkUnit, "w1", lease_seconds=60)
+        release_work_item(flaky, error="boom", max_attempts=2)
+        session.commit()
+
+        statuses = {unit.graph_folder_id: unit.status for unit in session.execute(select(IngestWorkUnit)).scalars()}
+        assert statuses == {"f1": "done", "f2": "failed"}
+        assert claim_work_items(session, IngestWorkUnit, "w1", lease_seconds=60) == []